@@ -96,6 +96,28 @@ class CLI:
         except FetchError:
             print('There appears to be no local server at port %i' % port)
     
+    def cmd_build(self, module=None, dirname='build', workers=None):
+        """ build the assets of an app ahead of time, for production.
+        flexx build <module> [dirname] [workers]
+        Transpiles the Model classes in the module (a module name or .py
+        file) using multiple processes, and writes the minified and
+        fingerprinted bundles plus a manifest to dirname (default "build").
+        Set flexx.config.build_dir (e.g. FLEXX_BUILD_DIR) to that directory
+        to serve these bundles.
+        """
+        if module is None:
+            return self.cmd_help('build')
+        # Configure before flexx.app is imported, so that all JS gets cached
+        import os
+        from flexx import config
+        dirname = os.path.abspath(os.path.expanduser(dirname))
+        config.pyscript_cache = os.path.join(dirname, 'pyscript_cache')
+        config.lazy_js = True
+        from flexx.app._build import build
+        manifest = build(module, dirname, int(workers) if workers else None)
+        print('built %i assets for %s to %s' % (len(manifest['assets']), module,
+                                                dirname))
+    
     def cmd_log(self, port=None, level='info'):
         """ Start listening to log messages from a server process - STUB
         flexx log port level
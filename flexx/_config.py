@@ -16,7 +16,50 @@ config = Config('flexx', '~appdata/.flexx.cfg',
         ssl_certfile=('', str, 'The cert file for https server.'),
         ssl_keyfile=('', str, 'The key file for https server.'),
         cookie_secret=('flexx_secret', str, 'The secret key to encode cookies.'),
-        
+        lazy_js=(False, bool, 'Generate the JS code of Model classes when it is '
+                 'first needed, rather than when the class is defined. This '
+                 'makes importing faster, but errors in the JS code show up '
+                 'later.'),
+        session_pool_size=(0, int, 'The number of sessions to instantiate '
+                           'in advance for each app, so that pages can be '
+                           'served without waiting for the app to be created.'),
+        inline_init=(False, bool, 'Embed the assets and initial commands '
+                     'of a session in the served page, so that the app can be '
+                     'rendered before the websocket is connected.'),
+        ws_high_water_mark=(2**22, int, 'The number of bytes that may be '
+                            'waiting to be written to a websocket. Above it, '
+                            'commands are held back until the client catches '
+                            'up, and only the latest value of each property '
+                            'is sent.'),
+        ws_drop_events=(False, bool, 'Drop events (but not property updates) '
+                        'for clients that are above the high water mark.'),
+        ws_binary=(False, bool, 'Use a binary protocol (msgpack) for the '
+                   'websocket, if the client supports it.'),
+        loop_time_budget=(0.0, float, 'The maximum time in seconds that an '
+                          'iteration of the flexx.event loop may take on the '
+                          'server, so that a storm of events does not block '
+                          'the websockets. Zero means no limit.'),
+        minify_js=(0, int, 'Minify the JS bundles that are served: 0 means no '
+                   'minification, 1 removes comments and whitespace, 2 also '
+                   'shortens the names of local variables.'),
+        tree_shake_std=(False, bool, 'Serve a pyscript-std.js that contains '
+                        'only the PyScript std functions and methods that are '
+                        'used by the known modules when it is first served. '
+                        'This makes flexx-core.js smaller, but modules that '
+                        'are defined later (e.g. in the notebook) can only use '
+                        'these.'),
+        build_dir=('', str, 'Directory with assets that were built ahead of '
+                   'time with "python -m flexx build". The server then serves '
+                   'the bundles from this directory, and uses the PyScript '
+                   'cache in it.'),
+
+        # flexx.pyscript
+        pyscript_cache=('', str, 'Directory to cache transpiled PyScript across '
+                        'processes, e.g. "~appdata/pyscript_cache". Empty means '
+                        'no caching.'),
+        pyscript_cache_size=(64, int, 'The maximum size of the PyScript cache '
+                             'in MiB.'),
+
         # flexx.webruntime
         webruntime=('', str, 'The default web runtime to use. '
                     'Default is "app or browser".'),
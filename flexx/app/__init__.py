@@ -202,7 +202,8 @@ Futher, it is possible to send data from Python to JS within a model class:
                 ...  # handle the data
 
 In this case, ``binary_blob`` can also be a URL where the client should
-download the binary data from.
+download the binary data from. Blobs are pushed over the websocket using
+binary frames if the client supports it.
 
 
 Some background info on the server process
@@ -249,7 +250,7 @@ del logging
 from ._app import App, manager
 from ._asset import Asset, Bundle
 from ._model import Model, get_active_model, get_active_models
-from ._model import get_model_classes
+from ._model import get_model_classes, typed_array
 from ._funcs import run, start, stop
 from ._funcs import init_interactive, init_notebook, serve, launch, export
 from ._server import call_later, create_server, current_server
@@ -4,13 +4,15 @@ Definition of the App class and app manager.
 
 import os
 import time
+import heapq
 import weakref
+from collections import OrderedDict
 from base64 import encodestring as encodebytes
 
-from .. import event, webruntime
+from .. import event, webruntime, config
 
 from ._model import Model
-from ._server import current_server
+from ._server import current_server, call_later
 from ._session import Session, get_page_for_export
 from ._assetstore import assets
 from . import logger
@@ -56,6 +58,7 @@ class App:
         self.kwargs = kwargs
         self._path = cls.__name__  # can be overloaded by serve()
         self._is_served = False
+        self._pool_size = 0
 
         # Handle good defaults
         if hasattr(cls, 'title') and self.kwargs.get('title', None) is None:
@@ -113,7 +116,15 @@ class App:
         """
         return self._path or '__main__'
 
-    def serve(self, name=None):
+    @property
+    def pool_size(self):
+        """ The number of sessions that are instantiated in advance, so
+        that a page can be served without waiting for the app to be
+        created. Set via ``serve()``.
+        """
+        return self._pool_size
+
+    def serve(self, name=None, pool_size=None):
         """ Start serving this app.
 
         This registers the given class with the internal app manager. The
@@ -122,12 +133,20 @@ class App:
         Arguments:
             name (str, optional): the relative URL path to serve the app on.
                 If this is ``''`` (the empty string), this will be the main app.
+            pool_size (int, optional): the number of sessions to instantiate
+                in advance. The pool is refilled in the background when
+                sessions are handed out. Since pooled apps are created before
+                the request comes in, they cannot depend on e.g. the cookies
+                in their ``init()``. Default ``flexx.config.session_pool_size``.
         """
         # Note: this talks to the manager; it has nothing to do with the server
         if self._is_served:
             raise RuntimeError('This app (%s) is already served.' % self.name)
         if name is not None:
             self._path = name
+        if pool_size is None:
+            pool_size = config.session_pool_size
+        self._pool_size = max(0, int(pool_size))
         manager.register_app(self)
         self._is_served = True
 
@@ -251,12 +270,21 @@ class AppManager(event.HasEvents):
 
     total_sessions = 0  # Keep track how many sessesions we've served in total
 
+    pending_timeout = 30  # seconds after which a pending session is cleared
+
     def __init__(self):
         super().__init__()
-        # name -> (app, pending, connected) - lists contain Session objects
+        # name -> (app, pending, connected) - dicts map id -> Session object,
+        # in the order that the sessions were added
         self._appinfo = {}
+        # lowercase name -> name
+        self._app_names = {}
         self._session_map = weakref.WeakValueDictionary()
-        self._last_check_time = time.time()
+        # heap of (expiry_time, session_id, name) for pending sessions
+        self._pending_expiry = []
+        # name -> list of pre-instantiated sessions not yet handed out
+        self._session_pools = {}
+        self._refill_scheduled = False
 
     def register_app(self, app):
         """ Register an app (an object that wraps a model class plus init args).
@@ -267,12 +295,16 @@ class AppManager(event.HasEvents):
         name = app.name
         if not valid_app_name(name):
             raise ValueError('Given app does not have a valid name %r' % name)
-        pending, connected = [], []
+        pending, connected = OrderedDict(), OrderedDict()
         if name in self._appinfo:
             old_app, pending, connected = self._appinfo[name]
             if app is not old_app:
                 logger.warn('Re-registering app class %r' % name)
         self._appinfo[name] = app, pending, connected
+        self._app_names[name.lower()] = name
+        self._session_pools[name] = []
+        if app.pool_size:
+            self._schedule_pool_refill()
 
     def create_default_session(self, cls=None):
         """ Create a default session for interactive use (e.g. the notebook).
@@ -294,7 +326,7 @@ class AppManager(event.HasEvents):
         session = Session('__default__')
         self._session_map[session.id] = session
         _, pending, connected = self._appinfo['__default__']
-        pending.append(session)
+        pending[session.id] = session
 
         # Instantiate the model
         model_instance = app(session=session, is_app=True)
@@ -314,24 +346,24 @@ class AppManager(event.HasEvents):
             return None
         else:
             _, pending, connected = x
-            sessions = pending + connected
-            if sessions:
-                return sessions[-1]
+            for sessions in (connected, pending):
+                if sessions:
+                    return next(reversed(sessions.values()))
 
     def _clear_old_pending_sessions(self):
+        # Pop the expired sessions from the heap. Sessions that connected
+        # in the meantime are no longer pending, and are skipped.
         try:
 
             count = 0
-            for name in self._appinfo:
-                if name == '__default__':
-                    continue
-                _, pending, _ = self._appinfo[name]
-                to_remove = [s for s in pending
-                             if (time.time() - s._creation_time) > 30]
-                for s in to_remove:
-                    self._session_map.pop(s.id, None)
-                    pending.remove(s)
-                count += len(to_remove)
+            now = time.time()
+            heap = self._pending_expiry
+            while heap and heap[0][0] < now:
+                _, id, name = heapq.heappop(heap)
+                session = self._appinfo[name][1].pop(id, None)
+                if session is not None:
+                    self._session_map.pop(id, None)
+                    count += 1
             if count:
                 logger.warn('Cleared %i old pending sessions' % count)
 
@@ -348,9 +380,7 @@ class AppManager(event.HasEvents):
         # Called by the server when a client connects, and from the
         # launch and export functions.
 
-        if time.time() - self._last_check_time > 5:
-            self._last_check_time = time.time()
-            self._clear_old_pending_sessions()
+        self._clear_old_pending_sessions()
 
         if name == '__default__':
             raise RuntimeError('There can be only one __default__ session.')
@@ -358,37 +388,71 @@ class AppManager(event.HasEvents):
             raise ValueError('Can only instantiate a session with a valid app name.')
 
         app, pending, connected = self._appinfo[name]
+        pool = self._session_pools[name]
+
+        # Take a session from the pool, or create the session
+        if pool and id is None:
+            session = pool.pop(0)
+            session._creation_time = time.time()  # for pending session expiry
+            if request is not None:
+                session._request = request
+                session._set_cookies(request.cookies or {})
+            self._schedule_pool_refill()
+            logger.debug('Take app client %s from pool' % session.app_name)
+        else:
+            session = self._instantiate_session(app, name, request)
+            if id is not None:
+                session._id = id  # used by app.export
+            logger.debug('Instantiate app client %s' % session.app_name)
+        self._session_map[session.id] = session
 
-        # Create the session
+        # Now wait for the client to connect. The client will be served
+        # a page that contains the session_id. Upon connecting, the id
+        # will be communicated, so it connects to the correct session.
+        pending[session.id] = session
+        heapq.heappush(self._pending_expiry,
+                       (session._creation_time + self.pending_timeout,
+                        session.id, name))
+        return session
+
+    def _instantiate_session(self, app, name, request=None):
         session = Session(name, request=request)
-        if id is not None:
-            session._id = id  # used by app.export
-        self._session_map[session.id] = session
         # Instantiate the model
         # This represents the "instance" of the App object (Model class + args)
         model_instance = app(session=session, is_app=True)
         # Session and app model need each-other, thus the _set_app()
         session._set_app(model_instance)
-
-        # Now wait for the client to connect. The client will be served
-        # a page that contains the session_id. Upon connecting, the id
-        # will be communicated, so it connects to the correct session.
-        pending.append(session)
-
-        logger.debug('Instantiate app client %s' % session.app_name)
         return session
 
+    def _schedule_pool_refill(self):
+        if not self._refill_scheduled:
+            self._refill_scheduled = True
+            call_later(0, self._refill_session_pools)
+
+    def _refill_session_pools(self):
+        # Instantiate one session per event loop iteration, so that
+        # handling requests is not delayed much by filling the pools.
+        self._refill_scheduled = False
+        for name, pool in self._session_pools.items():
+            app = self._appinfo[name][0]
+            if len(pool) < app.pool_size:
+                try:
+                    pool.append(self._instantiate_session(app, name))
+                except Exception as err:
+                    logger.error('Could not instantiate %s for the session pool: %s' %
+                                 (name, err))
+                else:
+                    self._schedule_pool_refill()
+                break
+
     def connect_client(self, ws, name, session_id, cookies=None):
         """ Connect a client to a session that was previously created.
         """
         _, pending, connected = self._appinfo[name]
 
-        # Search for the session with the specific id
-        for session in pending:
-            if session.id == session_id:
-                pending.remove(session)
-                break
-        else:
+        # Get the session with the specific id
+        session = pending.pop(session_id, None)
+        if session is None:
             raise RuntimeError('Asked for session id %r, but could not find it' %
                                session_id)
 
@@ -397,7 +461,7 @@ class AppManager(event.HasEvents):
         logger.info('New session %s %s' % (name, session_id))
         session._set_cookies(cookies)
         session._set_ws(ws)
-        connected.append(session)
+        connected[session.id] = session
         AppManager.total_sessions += 1
         self.connections_changed(session.app_name)
         return session  # For the ws
@@ -414,10 +478,7 @@ class AppManager(event.HasEvents):
             return  # The default session awaits a re-connect
 
         _, pending, connected = self._appinfo[session.app_name]
-        try:
-            connected.remove(session)
-        except ValueError:
-            pass
+        connected.pop(session.id, None)
         logger.info('Session closed %s %s' %(session.app_name, session.id))
         session.close()
         self.connections_changed(session.app_name)
@@ -427,12 +488,7 @@ class AppManager(event.HasEvents):
         a registered appliciation (case insensitive). Returns None if the
         given name does not match any applications.
         """
-        name = name.lower()
-        for key in self._appinfo.keys():
-            if key.lower() == name:
-                return key
-        else:
-            return None
+        return self._app_names.get(name.lower(), None)
 
     def get_app_names(self):
         """ Get a list of registered application names.
@@ -448,7 +504,23 @@ class AppManager(event.HasEvents):
         """ Given an app name, return the session connected objects.
         """
         _, pending, connected = self._appinfo[name]
-        return list(connected)
+        return list(connected.values())
+
+    def get_pending_sessions(self, name):
+        """ Given an app name, return the session objects that have no
+        client connected yet (pooled and pending).
+        """
+        _, pending, connected = self._appinfo[name]
+        pool = self._session_pools.get(name, ())
+        return list(pool) + list(pending.values())
+
+    def get_session_counts(self, name):
+        """ Given an app name, return a dict with the number of sessions
+        that are pooled, pending, and connected.
+        """
+        _, pending, connected = self._appinfo[name]
+        return dict(pooled=len(self._session_pools.get(name, ())),
+                    pending=len(pending), connected=len(connected))
 
     @event.emitter
     def connections_changed(self, name):
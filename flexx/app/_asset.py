@@ -3,10 +3,14 @@ Definition of the Asset class to represent JS and CSS assets, and a derived
 class used as a container for one or more JSModule classes.
 """
 
+import re
 import sys
 import types
+import hashlib
 from urllib.request import urlopen
 
+from .. import config
+from ..util.minify import minify
 from . import logger
 
 # The pyscript package does not deal with license headers,
@@ -16,8 +20,28 @@ HEADER = '/* %s */\n\n' % HEADER
 
 url_starts = 'https://', 'http://'
 
+# Fingerprinted asset names have a content hash before the extension
+fingerprint_re = re.compile(r'^(.+)\.([0-9a-f]{16})(\.js|\.css)$', re.IGNORECASE)
+
+
+def split_fingerprint(filename):
+    """ Split a fingerprinted asset name (as produced by
+    ``Asset.fingerprinted_name``) into the plain asset name and the
+    content hash. Returns (filename, '') if the name has no fingerprint.
+    """
+    m = fingerprint_re.match(filename)
+    if m is None:
+        return filename, ''
+    return m.group(1) + m.group(3), m.group(2).lower()
+
 
 # Although these two funcs are better off in modules.py, that causes circular refs.
+def get_code_hash(code):
+    """ Get a hash (as a 16 character hex string) of the given code.
+    """
+    return hashlib.sha1(code.encode()).hexdigest()[:16]
+
+
 def get_mod_name(ob):
     """ Get the module name of an object (the name of a module object or
     the name of the module in which the object is defined). Our naming
@@ -104,6 +128,7 @@ class Asset:
         self._remote = False
         self._source_str = None
         self._source = source
+        self._hash = None, ''  # (source_str, hash)
         if source is None:
             raise TypeError('Asset needs a source.')
         elif isinstance(source, str):
@@ -141,7 +166,29 @@ class Asset:
         """
         return self._remote
     
-    def to_html(self, path='{}', link=3):
+    @property
+    def content_hash(self):
+        """ A hash of the source of this asset (as a 16 character hex
+        string). Changes when the source changes, so it can be used to
+        fingerprint the URL of the asset. Note that for remote assets,
+        this causes the asset to be downloaded.
+        """
+        source_str = self.to_string()
+        if self._hash[0] is not source_str:
+            h = hashlib.sha1(source_str.encode()).hexdigest()[:16]
+            self._hash = source_str, h
+        return self._hash[1]
+    
+    @property
+    def fingerprinted_name(self):
+        """ The name of this asset with the content hash inserted
+        before the extension, e.g. "foo.0123456789abcdef.js". Links
+        using this name can be cached by the browser indefinitely.
+        """
+        base, ext = self.name.rsplit('.', 1)
+        return '%s.%s.%s' % (base, self.content_hash, ext)
+    
+    def to_html(self, path='{}', link=3, fingerprint=False):
         """ Get HTML element tag to include in the document.
         
         Parameters:
@@ -153,8 +200,15 @@ class Asset:
                 * 1: normal assets are embedded, remote assets remain remote.
                 * 2: the asset is linked (and served by our server).
                 * 3: (default) normal assets are linked, remote assets remain remote.
+            fingerprint (bool): if True, use the fingerprinted name in the
+                path of linked assets that are served by our server.
+                Default False.
         """
-        path = path.replace('{}', self.name)
+        served = link == 2 or (link == 3 and not self.remote)
+        if fingerprint and served:
+            path = path.replace('{}', self.fingerprinted_name)
+        else:
+            path = path.replace('{}', self.name)
         
         if self.name.lower().endswith('.js'):
             if self.remote and link in (1, 3):
@@ -211,11 +265,16 @@ class Bundle(Asset):
     
     def __init__(self, name):
         super().__init__(name, '')
+        self._source_str = None  # cache for to_string()
         self._assets = []
         self._module_name = name.rsplit('.', 1)[0].split('-')[0]
         self._modules = []
         self._deps = set()
         self._need_sort = False
+        self._module_sources = None  # to check whether _source_str is valid
+        self._prebuilt = None  # (module_names, source, hashes), see set_prebuilt()
+        self._prebuilt_checked = None  # module sources that match the hashes
+        self._minify_js = 0  # the minification level of _source_str
     
     def __repr__(self):
         t = '<%s %r with %i assets and %i modules at 0x%0x>'
@@ -232,6 +291,7 @@ class Bundle(Asset):
         if isinstance(a, Bundle):
             raise TypeError('Bundles can contain assets and modules, but not bundles.')
         self._assets.append(a)
+        self._source_str = None
     
     def add_module(self, m):
         """ Add a module to the bundle. This will (lazily) invoke a
@@ -249,6 +309,7 @@ class Bundle(Asset):
         # Add module
         self._modules.append(m)
         self._need_sort = True
+        self._source_str = None
         
         # Add deps for this module
         deps = set()
@@ -277,6 +338,7 @@ class Bundle(Asset):
         if self._need_sort:
             f = lambda m: m.name
             self._modules = solve_dependencies(sorted(self._modules, key=f))
+            self._need_sort = False
         return tuple(self._modules)
     
     @property
@@ -285,17 +347,63 @@ class Bundle(Asset):
         """
         return self._deps
     
+    def set_prebuilt(self, module_names, source, module_hashes=None):
+        """ Set the source of this bundle, as produced by an ahead-of-time
+        build. It is used instead of the code of the modules, as long as
+        the bundle consists of exactly the given modules. If
+        ``module_hashes`` is given (a dict that maps module names to the
+        ``get_code_hash()`` of their code), the code of the modules must
+        also be unchanged since the build.
+        """
+        self._prebuilt = tuple(sorted(module_names)), source, module_hashes
+        self._prebuilt_checked = None
+    
+    def _prebuilt_matches(self, modules, module_sources):
+        """ Get whether the prebuilt source is up to date with the given
+        modules, and warn if it is not.
+        """
+        names, _, hashes = self._prebuilt
+        if names != tuple(sorted(m.name for m in modules)):
+            return False
+        if hashes is None or (self._prebuilt_checked is not None and
+                              all(s1 is s2 for s1, s2 in
+                                  zip(module_sources, self._prebuilt_checked))):
+            return True
+        for m, s in zip(modules, module_sources):
+            if hashes.get(m.name, None) != get_code_hash(s):
+                logger.warn('Not using prebuilt %s, because the code of module '
+                            '%s changed after the build. Rebuild it with '
+                            '"python -m flexx build".' % (self.name, m.name))
+                self._prebuilt = None
+                return False
+        self._prebuilt_checked = module_sources
+        return True
+    
     def to_string(self):
-        # Concatenate code strings and add TOC. Module objects do/cache the work.
         isjs = self.name.lower().endswith('.js')
+        modules = self.modules
+        module_sources = [m.get_js() if isjs else m.get_css() for m in modules]
+        # Use the prebuilt source if it matches our modules
+        if (self._prebuilt is not None and
+                self._prebuilt_matches(modules, module_sources)):
+            return self._prebuilt[1]
+        # The module objects cache their code, and return the same string
+        # object until their cache is reset. We cache the result as long
+        # as no assets/modules are added and all module code is unchanged.
+        minify_js = config.minify_js if isjs else 0
+        if (self._source_str is not None and self._minify_js == minify_js and
+                len(module_sources) == len(self._module_sources) and
+                all(s1 is s2 for s1, s2 in
+                    zip(module_sources, self._module_sources))):
+            return self._source_str
+        # Concatenate code strings and add TOC
         toc = []
         source = []
         for a in self.assets:
             toc.append('- asset ' + a.name)
             source.append('/* ' + (' %s ' % a.name).center(70, '=') + '*/')
             source.append(a.to_string())
-        for m in self.modules:
-            s = m.get_js() if isjs else m.get_css()
+        for m, s in zip(modules, module_sources):
             toc.append('- module ' + m.name)
             source.append('/* ' + (' %s ' % m.name).center(70, '=') + '*/')
             source.append(HEADER)
@@ -304,4 +412,9 @@ class Bundle(Asset):
             source.insert(0, '/* Bundle contents:\n' + '\n'.join(toc) + '\n*/\n')
         #if isjs:
         #    source.append('window.flexx.spin("%s");' % ('*' * len(self.modules)))
-        return '\n\n'.join(source)
+        self._source_str = '\n\n'.join(source)
+        if minify_js > 0:
+            self._source_str = HEADER + minify(self._source_str, True, minify_js > 1)
+        self._module_sources = module_sources
+        self._minify_js = minify_js
+        return self._source_str
@@ -5,9 +5,13 @@ etc.) needed by the applications.
 """
 
 import os
+import json
 import shutil
 
-from ..pyscript import create_js_module, get_all_std_names, get_full_std_lib
+from .. import config
+from ..pyscript import create_js_module
+from ..pyscript.stdlib import (FUNCTIONS, METHODS, FUNCTION_PREFIX, METHOD_PREFIX,
+                               get_partial_std_lib)
 
 from ._model import Model
 from ._asset import Asset, Bundle, HEADER
@@ -213,14 +217,13 @@ class AssetStore:
         self._associated_assets = {}
         self._data = {}
         self._used_assets = set()  # between all sessions (for export)
+        self._prebuilt = {}  # bundle name -> (module_names, source, hashes)
+        self._std_names = None  # (func_names, method_names) if tree-shaken
         
         # Create standard assets
         asset_reset = Asset('reset.css', RESET)
         asset_loader = Asset('flexx-loader.js', LOADER)
-        func_names, method_names = get_all_std_names()
-        mod = create_js_module('pyscript-std.js', get_full_std_lib(),
-                               [], func_names + method_names, 'amd-flexx')
-        asset_pyscript = Asset('pyscript-std.js', HEADER + mod)
+        asset_pyscript = Asset('pyscript-std.js', self._get_std_js)
         
         # Add them
         for a in [asset_reset, asset_loader, asset_pyscript]:
@@ -237,6 +240,10 @@ class AssetStore:
         asset_core.add_module(self.modules['flexx.app._clientcore'])
         asset_core.add_module(self.modules['flexx.app._model'])
         self.add_shared_asset(asset_core)
+        
+        # Use prebuilt bundles if available
+        if config.build_dir:
+            self.load_build(config.build_dir)
     
     def __repr__(self):
         t = '<AssetStore with %i assets, and %i data>'
@@ -298,10 +305,79 @@ class AssetStore:
                     bundle_name = name + suffix
                     if bundle_name not in self._assets:
                         self._assets[bundle_name] = Bundle(bundle_name)
+                        if bundle_name in self._prebuilt:
+                            self._assets[bundle_name].set_prebuilt(
+                                *self._prebuilt[bundle_name])
                     self._assets[bundle_name].add_module(mod)
         
         if mcount:
             logger.info('Asset store collected %i new modules.' % mcount)
+            new_modules = set(self._modules).difference(current_module_names)
+            self._check_std_names([self._modules[n] for n in sorted(new_modules)])
+    
+    def get_std_names(self):
+        """ Get the names of the PyScript std functions and methods that
+        are used by the known modules, as a tuple of two sorted lists.
+        """
+        func_names, method_names = set(), set()
+        for mod in self._modules.values():
+            func_names.update(mod.std_functions)
+            method_names.update(mod.std_methods)
+        return sorted(func_names), sorted(method_names)
+    
+    def _get_std_js(self):
+        """ Get the code for pyscript-std.js. Called when it is first used.
+        """
+        if config.tree_shake_std:
+            func_names, method_names = self.get_std_names()
+            self._std_names = set(func_names), set(method_names)
+        else:
+            func_names, method_names = sorted(FUNCTIONS), sorted(METHODS)
+        exports = ([FUNCTION_PREFIX + n for n in func_names] +
+                   [METHOD_PREFIX + n for n in method_names])
+        mod = create_js_module('pyscript-std.js',
+                               get_partial_std_lib(func_names, method_names),
+                               [], exports, 'amd-flexx')
+        return HEADER + mod
+    
+    def _check_std_names(self, modules):
+        """ Warn if any of the given modules uses std functions or methods
+        that are not in the tree-shaken pyscript-std.js.
+        """
+        if self._std_names is None:
+            return
+        for mod in modules:
+            missing = sorted(mod.std_functions.difference(self._std_names[0]) |
+                             mod.std_methods.difference(self._std_names[1]))
+            if missing:
+                logger.warn('Module %s uses PyScript std functions that are not '
+                            'in the served pyscript-std.js: %s. Unset '
+                            'flexx.config.tree_shake_std or import this module '
+                            'earlier.' % (mod.name, ', '.join(missing)))
+    
+    def load_build(self, dirname):
+        """ Use the bundles in the given directory, as produced by
+        ``python -m flexx build``, instead of generating them. A bundle is
+        only used if it contains the same modules as at build time, and
+        the code of these modules has not changed since then. Note
+        that the PyScript cache in the directory is used only if
+        ``flexx.config.build_dir`` is set.
+        """
+        dirname = os.path.abspath(os.path.expanduser(dirname))
+        with open(os.path.join(dirname, 'manifest.json'), 'rb') as f:
+            manifest = json.loads(f.read().decode())
+        for name, info in manifest['assets'].items():
+            if not info['modules']:
+                continue  # not a bundle
+            with open(os.path.join(dirname, info['filename']), 'rb') as f:
+                self._prebuilt[name] = (info['modules'], f.read().decode(),
+                                        info.get('module_hashes', None))
+            if isinstance(self._assets.get(name, None), Bundle):
+                self._assets[name].set_prebuilt(*self._prebuilt[name])
+        if 'std_names' in manifest:
+            self._std_names = tuple(set(names) for names in manifest['std_names'])
+        logger.info('Loaded %i prebuilt bundles from %r.' %
+                    (len(self._prebuilt), dirname))
     
     def get_asset(self, name):
         """ Get the asset instance corresponding to the given name or None
@@ -0,0 +1,138 @@
+"""
+Ahead-of-time build of the assets of an app, see ``python -m flexx build``.
+
+Normally, the JS of Model classes is generated in the server process,
+and bundles are created when they are first requested. The build does
+this in advance: the Model classes are transpiled in a pool of processes,
+which fill a shared PyScript cache in the build directory. The bundles
+are then created from the cache, minified, and written to the build
+directory with a fingerprinted name, together with a manifest.
+
+A server that has ``flexx.config.build_dir`` set to this directory serves
+the prebuilt bundles and uses the PyScript cache in it, so that it does
+not need to transpile anything at runtime.
+"""
+
+import os
+import sys
+import json
+import time
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
+from .. import config, __version__
+from ..util.minify import minify
+
+
+MANIFEST_NAME = 'manifest.json'
+CACHE_NAME = 'pyscript_cache'
+
+
+def import_app_module(module_name):
+    """ Import the module with the given name, or from the given .py file.
+    """
+    if module_name.endswith('.py'):
+        filename = os.path.abspath(module_name)
+        sys.path.insert(0, os.path.dirname(filename))
+        module_name = os.path.basename(filename)[:-3]
+    return importlib.import_module(module_name)
+
+
+def _transpile_shard(module_name, cache_dir, shard, nshards):
+    # Runs in a worker process. The result ends up in the shared cache.
+    config.pyscript_cache = cache_dir
+    config.lazy_js = True
+    import_app_module(module_name)
+    from ._model import get_model_classes
+    classes = sorted(get_model_classes(), key=lambda c: (c.__module__, c.__name__))
+    for cls in classes[shard::nshards]:
+        cls.JS.CODE
+    return len(classes[shard::nshards])
+
+
+def build(module_name, dirname, workers=None):
+    """ Build the assets for the Model classes in the given module (a
+    module name or a .py filename) and write them to the given directory.
+    Note that this sets ``flexx.config.pyscript_cache`` and
+    ``flexx.config.lazy_js`` for the current process. The JS is minified
+    at least at level 1 of ``flexx.config.minify_js``, and pyscript-std.js
+    only contains the std functions that the app uses (see
+    ``flexx.config.tree_shake_std``).
+    
+    Parameters:
+        module_name (str): the module that defines the app.
+        dirname (str): the directory to write the build to. It is created
+            if necessary.
+        workers (int, optional): the number of processes to use for
+            transpiling. Default is the number of CPUs.
+    
+    Returns:
+        manifest (dict): the manifest that is also written to
+        ``manifest.json``. It maps each asset name to the name of the file
+        and the names (and code hashes) of the modules in it, and lists the
+        names of the std functions and methods in pyscript-std.js.
+    """
+    t0 = time.perf_counter()
+    dirname = os.path.abspath(os.path.expanduser(dirname))
+    cache_dir = os.path.join(dirname, CACHE_NAME)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    
+    # Import the app, but generate the JS later. Worker processes that are
+    # spawned (rather than forked) pick up the config via the environment.
+    config.pyscript_cache = os.environ['FLEXX_PYSCRIPT_CACHE'] = cache_dir
+    config.lazy_js = True
+    os.environ['FLEXX_LAZY_JS'] = '1'
+    config.minify_js = max(1, config.minify_js)  # bundles are minified
+    config.tree_shake_std = True  # we know all modules of the app
+    from ._assetstore import assets
+    from ._asset import Asset, Bundle, get_code_hash
+    from . import logger
+    import_app_module(module_name)
+    
+    # Transpile in parallel, each process does a part of the Model classes
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_transpile_shard, module_name, cache_dir,
+                                       i, workers) for i in range(workers)]
+            count = sum(f.result() for f in futures)
+        logger.info('Transpiled %i Model classes in %i processes.' %
+                    (count, workers))
+    
+    # Collect modules and create bundles. This uses the cache.
+    assets.update_modules()
+    
+    # Write the assets that we serve, minified and fingerprinted
+    manifest = dict(flexx_version=__version__, module=module_name, assets={},
+                    std_names=assets.get_std_names())
+    for name in sorted(assets.get_asset_names()):
+        asset = assets.get_asset(name)
+        if asset.remote:
+            continue  # loaded from elsewhere
+        elif callable(asset.source) and name != 'pyscript-std.js':
+            continue  # only loaded when used
+        code = asset.to_string()
+        if name.lower().endswith('.js') and not isinstance(asset, Bundle):
+            code = minify(code, True, config.minify_js > 1)
+        built = Asset(name, code)
+        filename = os.path.join(dirname, built.fingerprinted_name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'wb') as f:
+            f.write(code.encode())
+        info = dict(filename=built.fingerprinted_name, modules=[])
+        manifest['assets'][name] = info
+        if isinstance(asset, Bundle):
+            # The hashes let the server detect changes to the code of the app
+            isjs = name.lower().endswith('.js')
+            info['modules'] = [m.name for m in asset.modules]
+            info['module_hashes'] = dict(
+                (m.name, get_code_hash(m.get_js() if isjs else m.get_css()))
+                for m in asset.modules)
+    
+    with open(os.path.join(dirname, MANIFEST_NAME), 'wb') as f:
+        f.write(json.dumps(manifest, indent=2, sort_keys=True).encode())
+    logger.info('Built %i assets to %r in %0.2f s.' %
+                (len(manifest['assets']), dirname, time.perf_counter() - t0))
+    return manifest
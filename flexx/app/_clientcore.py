@@ -23,6 +23,7 @@ class Flexx:
         self.app_name = ''
         self.session_id = ''
         self.ws_url = ''
+        self.init_commands = []  # can be embedded in the page
         # Copy attributes from temporary flexx object
         if window.flexx.init:
             raise RuntimeError('Should not create Flexx object more than once.')
@@ -42,10 +43,15 @@ class Flexx:
         self._init_time = time()
         self._pending_commands = []
         self._asset_count = 0
+        self._decoder = None
+        self._data_chunks = {}
         self.ws = None
         self.last_msg = None
         self.classes = {}
         self.instances = {}
+        self.loop = None  # the loop of the event system, set by the Model module
+        self._profile_timer = None
+        self._profile_stats = {}
         # Note: flexx.init() is not auto-called when Flexx is embedded
         window.addEventListener('load', self.init, False)
         window.addEventListener('unload', self.exit, False)  # not beforeunload
@@ -69,6 +75,12 @@ class Flexx:
                 self._remove_querystring()
             self.initSocket()
             self.initLogging()
+            # Process commands embedded in the page without waiting for
+            # the websocket. Commands from the server are queued behind them.
+            if len(self.init_commands):
+                for msg in self.init_commands:
+                    self._pending_commands.push(msg)
+                self._process_commands()
     
     def _remove_querystring(self):
         # remove querystring ?session=x
@@ -99,6 +111,45 @@ class Flexx:
         if ob is not undefined:
             ob.dispose()  # Model.dispose() removes itself from flexx.instances
     
+    def profile_handlers(self, interval):
+        """ Report the time spent in event handlers to the server every
+        interval seconds (see ``Session.profile_js_handlers()``). An
+        interval of zero stops profiling.
+        """
+        if self._profile_timer is not None:
+            window.clearInterval(self._profile_timer)
+            self._profile_timer = None
+            self.loop._handler_observers.remove(self._on_handler_call)
+        if interval > 0:
+            self._profile_stats = {}
+            self.loop._handler_observers.append(self._on_handler_call)
+            self._profile_timer = window.setInterval(self._send_profile,
+                                                     interval * 1000)
+    
+    def _on_handler_call(self, handler, events, duration):
+        # Aggregate stats per handler, like event.HandlerProfiler
+        ob = handler._ob1()
+        name = handler._name
+        if ob:
+            name = ob._class_name.split('.')[-1] + '.' + name
+        stats = self._profile_stats.get(name, None)
+        if stats is None:
+            stats = [name, 0, 0, 0.0, 0.0, {}]
+            self._profile_stats[name] = stats
+        stats[1] += 1
+        stats[2] += len(events)
+        stats[3] += duration
+        stats[4] = max(stats[4], duration)
+        for ev in events:
+            trigger = handler._get_connection_string(ev)
+            stats[5][trigger] = stats[5].get(trigger, 0) + 1
+    
+    def _send_profile(self):
+        stats = self._profile_stats.values()
+        self._profile_stats = {}
+        if len(stats) and self.ws is not None:
+            self.ws.send('PROFILE ' + JSON.stringify(stats))
+    
     def spin(self, text='*'):
         RawJS("""
         if (!window.document.body) {return;}
@@ -130,25 +181,50 @@ class Flexx:
             if window.location.port:
                 address += ':' + window.location.port
             self.ws_url = '%s://%s/flexx/ws/%s' % (proto, address, self.app_name)
+            # The session id lets a multi-process server route the connection
+            if self.session_id:
+                self.ws_url += '?session_id=' + self.session_id
         # Resolve public hostname
         self.ws_url = self.ws_url.replace('0.0.0.0', window.location.hostname)
-        # Open web socket in binary mode
+        # Open web socket, binary frames are received as ArrayBuffer
         self.ws = ws = WebSocket(self.ws_url)
-        #ws.binaryType = "arraybuffer"  # would need utf-decoding -> slow
+        ws.binaryType = "arraybuffer"
+        # Queue messages that are sent before the socket is open, e.g.
+        # while processing the commands embedded in the page
+        send_queue = []
+        ws.send = lambda msg: send_queue.push(msg)
         
         def on_ws_open(evt):
             window.console.info('Socket opened with session id ' + self.session_id)
-            ws.send('hiflexx ' + self.session_id)
+            del ws.send  # use WebSocket.send() again
+            # Announce the codecs that we support for binary frames
+            ws.send('hiflexx ' + self.session_id + ' msgpack')
+            for msg in send_queue:
+                ws.send(msg)
         def on_ws_message(evt):
             self.last_msg = msg = evt.data or evt
+            # The codec applies to the next frame, so set it right away,
+            # even if other commands are still pending
+            if isinstance(msg, str) and msg.startswith('CODEC '):
+                self._set_codec(msg[6:])
+                return
+            # The server bundles commands issued in one iteration
+            if not isinstance(msg, str):
+                msgs = self._decoder.decode(msg)
+            elif msg.startswith('MULTI '):
+                msgs = JSON.parse(msg[6:])
+            else:
+                msgs = [msg]
             if self._pending_commands is None:
                 # Direct mode
-                self.command(msg)
+                for msg in msgs:
+                    self.command(msg)
             else:
                 # Indirect mode, to give browser draw-time during loading
                 if len(self._pending_commands) == 0:
                     window.setTimeout(self._process_commands, 0)
-                self._pending_commands.push(msg)
+                for msg in msgs:
+                    self._pending_commands.push(msg)
         def on_ws_close(evt):
             self.ws = None
             msg = 'Lost connection with server'
@@ -231,15 +307,36 @@ class Flexx:
             except Exception as err:
                 window.setTimeout(self._process_commands, 0)
                 raise err
-            if msg.startswith('DEFINE-'):
+            if isinstance(msg, str) and msg.startswith('DEFINE-'):
                 self._asset_count += 1
                 if (self._asset_count % 3) == 0:
                     if len(self._pending_commands):
                         window.setTimeout(self._process_commands, 0)
                     break
     
+    def _set_codec(self, name):
+        """ Set the codec for the binary frames that the server sends
+        from now on.
+        """
+        if name == 'msgpack':
+            self._decoder = MsgpackDecoder(serializer.revive)
+        else:
+            window.console.warn('Invalid codec: "' + name + '"')
+    
     def command(self, msg):
-        if msg.startswith('PING '):
+        if not isinstance(msg, str):
+            # Structured command [kind, items] from a binary frame
+            if msg[0] == 'SET_PROPS':
+                self._set_props(msg[1])
+            elif msg[0] == 'EMIT':
+                self._emit_events(msg[1])
+            elif msg[0] == 'MUTATE':
+                self._mutate_props(msg[1])
+            elif msg[0] == 'DATA':
+                self._receive_data(msg[1])
+            else:
+                window.console.warn('Invalid command: "' + msg[0] + '"')
+        elif msg.startswith('PING '):
             self.ws.send('PONG ' + msg[5:])
         elif msg == 'INIT-DONE':
             self.spin(None)
@@ -247,6 +344,9 @@ class Flexx:
                 self.command(self._pending_commands.pop(0))
             self._pending_commands = None
             # print('init took', time() - self._init_time)
+        elif msg.startswith('MULTI '):
+            for m in JSON.parse(msg[6:]):
+                self.command(m)
         elif msg.startswith('PRINT '):
             window.console.ori_log(msg[6:])
         elif msg.startswith('EVAL '):
@@ -254,6 +354,14 @@ class Flexx:
             self.ws.send('RET ' + window._)  # send back result
         elif msg.startswith('EXEC '):
             eval(msg[5:])  # like eval, but do not return result
+        elif msg.startswith('SET_PROPS '):
+            self._set_props(serializer.loads(msg[10:]))
+        elif msg.startswith('EMIT '):
+            self._emit_events(serializer.loads(msg[5:]))
+        elif msg.startswith('MUTATE '):
+            self._mutate_props(serializer.loads(msg[7:]))
+        elif msg.startswith('CODEC '):
+            self._set_codec(msg[6:])
         elif msg.startswith('DEFINE-JS ') or msg.startswith('DEFINE-JS-EVAL '):
             self.spin()
             cmd, name, code = msg.split(' ', 2)
@@ -292,6 +400,202 @@ class Flexx:
             window.win1 = window.open(msg[5:], 'new', 'chrome')
         else:
             window.console.warn('Invalid command: "' + msg + '"')
+    
+    def _set_props(self, items):
+        # List of (id, name, value) tuples
+        for item in items:
+            ob = self.instances[item[0]]
+            if ob is not undefined:
+                ob._set_prop_from_py(item[1], item[2])
+    
+    def _emit_events(self, items):
+        # List of (id, type, event) tuples
+        for item in items:
+            ob = self.instances[item[0]]
+            if ob is not undefined:
+                ob._emit_from_py(item[1], item[2])
+    
+    def _mutate_props(self, items):
+        # List of (id, name, mutation, index, objects) tuples
+        for item in items:
+            ob = self.instances[item[0]]
+            if ob is not undefined:
+                ob._mutate_prop_from_py(item[1], item[2], item[3], item[4])
+    
+    def _receive_data(self, item):
+        # A chunk of data: (key, index, count, id, meta, ArrayBuffer)
+        key, i, n = item[0], item[1], item[2]
+        if i == 0:
+            self._data_chunks[key] = []
+        chunks = self._data_chunks[key]
+        chunks.push(item[5])
+        if i < n - 1:
+            return
+        del self._data_chunks[key]
+        # Join the chunks
+        data = chunks[0]
+        if n > 1:
+            size = 0
+            for chunk in chunks:
+                size += chunk.byteLength
+            joined = window.Uint8Array(size)
+            size = 0
+            for chunk in chunks:
+                joined.set(window.Uint8Array(chunk), size)
+                size += chunk.byteLength
+            data = joined.buffer
+        ob = self.instances[item[3]]
+        if ob is not undefined:
+            ob.receive_data(data, item[4])
+
+
+class MsgpackDecoder:
+    """ Decoder for binary frames encoded with the msgpack codec (see
+    _codec.py). Typed arrays are decoded as e.g. Float64Array objects,
+    dicts are passed through the given reviver.
+    """
+    
+    def __init__(self, reviver=None):
+        self._reviver = reviver
+        self._typed_arrays = [window.Int8Array, window.Uint8Array,
+                              window.Int16Array, window.Uint16Array,
+                              window.Int32Array, window.Uint32Array,
+                              window.Float32Array, window.Float64Array]
+        self._text_decoder = None
+        if window.TextDecoder is not undefined:
+            self._text_decoder = window.TextDecoder('utf-8')
+    
+    def decode(self, buffer):
+        """ Decode the given ArrayBuffer.
+        """
+        self._buffer = buffer
+        self._view = window.DataView(buffer)
+        self._pos = 0
+        try:
+            return self._decode()
+        finally:
+            self._buffer = self._view = None
+    
+    def _decode(self):
+        tag = self._view.getUint8(self._pos)
+        self._pos += 1
+        if tag < 0x80:
+            return tag
+        elif tag < 0x90:
+            return self._map(tag & 0x0f)
+        elif tag < 0xa0:
+            return self._array(tag & 0x0f)
+        elif tag < 0xc0:
+            return self._str(tag & 0x1f)
+        elif tag >= 0xe0:
+            return tag - 0x100
+        elif tag == 0xc0:
+            return None
+        elif tag == 0xc2:
+            return False
+        elif tag == 0xc3:
+            return True
+        elif tag >= 0xc4 and tag <= 0xc6:
+            return self._bin(self._size(tag - 0xc4))
+        elif tag >= 0xc7 and tag <= 0xc9:
+            return self._ext(self._size(tag - 0xc7))
+        elif tag >= 0xca and tag <= 0xd3:
+            return self._number(tag)
+        elif tag >= 0xd4 and tag <= 0xd8:
+            return self._ext(1 << (tag - 0xd4))
+        elif tag >= 0xd9 and tag <= 0xdb:
+            return self._str(self._size(tag - 0xd9))
+        elif tag == 0xdc or tag == 0xdd:
+            return self._array(self._size(tag - 0xdb))
+        elif tag == 0xde or tag == 0xdf:
+            return self._map(self._size(tag - 0xdd))
+        else:
+            raise ValueError('Invalid msgpack tag ' + tag)
+    
+    def _size(self, i):
+        # i is 0, 1, 2 for 8, 16, 32 bit sizes
+        pos = self._pos
+        if i == 0:
+            self._pos += 1
+            return self._view.getUint8(pos)
+        elif i == 1:
+            self._pos += 2
+            return self._view.getUint16(pos)
+        else:
+            self._pos += 4
+            return self._view.getUint32(pos)
+    
+    def _number(self, tag):
+        view, pos = self._view, self._pos
+        if tag == 0xca:
+            self._pos += 4
+            return view.getFloat32(pos)
+        elif tag == 0xcb:
+            self._pos += 8
+            return view.getFloat64(pos)
+        elif tag == 0xcc:
+            self._pos += 1
+            return view.getUint8(pos)
+        elif tag == 0xcd:
+            self._pos += 2
+            return view.getUint16(pos)
+        elif tag == 0xce:
+            self._pos += 4
+            return view.getUint32(pos)
+        elif tag == 0xcf:
+            self._pos += 8
+            return view.getUint32(pos) * 4294967296 + view.getUint32(pos + 4)
+        elif tag == 0xd0:
+            self._pos += 1
+            return view.getInt8(pos)
+        elif tag == 0xd1:
+            self._pos += 2
+            return view.getInt16(pos)
+        elif tag == 0xd2:
+            self._pos += 4
+            return view.getInt32(pos)
+        else:
+            self._pos += 8
+            return view.getInt32(pos) * 4294967296 + view.getUint32(pos + 4)
+    
+    def _str(self, n):
+        data = self._buffer.slice(self._pos, self._pos + n)
+        self._pos += n
+        if self._text_decoder is not None:
+            return self._text_decoder.decode(data)
+        return decodeUtf8(data)
+    
+    def _bin(self, n):
+        data = self._buffer.slice(self._pos, self._pos + n)
+        self._pos += n
+        return data
+    
+    def _array(self, n):
+        ob = []
+        for i in range(n):
+            ob.push(self._decode())
+        return ob
+    
+    def _map(self, n):
+        ob = {}
+        for i in range(n):
+            key = self._decode()
+            ob[key] = self._decode()
+        if self._reviver is not None:
+            ob = self._reviver(ob)
+        return ob
+    
+    def _ext(self, n):
+        # The payload of a typed array is the element type plus the data
+        ext_type = self._view.getUint8(self._pos)
+        code = self._view.getUint8(self._pos + 1)
+        start = self._pos + 2
+        self._pos += 1 + n
+        if ext_type != 1:
+            raise ValueError('Unknown msgpack extension type ' + ext_type)
+        # Copy the data, since typed arrays must be aligned
+        Cls = self._typed_arrays[code]
+        return Cls(self._buffer.slice(start, self._pos))
 
 
 def decodeUtf8(arrayBuffer):
@@ -390,15 +694,23 @@ class Serializer:
                 try:
                     return obj.__json__()  # same as in Pyramid
                 except AttributeError:
+                    if hasattr(obj, 'tolist'):  # e.g. numpy or array.array
+                        return obj.tolist()
                     raise TypeError('Cannot serialize object to JSON: %r' % obj)
             else:  # JS - pragma: no cover
                 if (val is not None) and val.__json__ is not undefined:
                     return val.__json__()
+                if (val is not None) and val.BYTES_PER_ELEMENT:  # typed array
+                    res = []
+                    for i in range(val.length):
+                        res.push(val[i])
+                    return res
                 return val
         
         self.loads = loads
         self.saves = saves
         self.add_reviver = add_reviver
+        self.revive = _reviver
 
 
 ## Instantiate
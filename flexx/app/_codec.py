@@ -0,0 +1,311 @@
+"""
+Binary codecs for the websocket connection. By default commands are sent
+as text, but if enabled (``flexx.config.ws_binary``) and supported by the
+client, the server sends binary frames encoded with a codec that is
+negotiated during the handshake.
+
+The "msgpack" codec implements (a subset of) the MessagePack format, plus
+an extension type for typed arrays. Numpy arrays, ``array.array`` objects
+and ``memoryview`` objects of a numeric type are sent as raw little-endian
+buffers, and become typed arrays (e.g. ``Float64Array``) in JavaScript.
+The corresponding decoder for the client is in ``_clientcore.py``.
+"""
+
+import sys
+import struct
+from array import array
+
+from . import logger
+
+
+# Extension type for typed arrays. The payload is one byte for the
+# element type (an index in TYPED_ARRAY_TYPES), followed by the data.
+EXT_TYPED_ARRAY = 1
+
+# Element types that JS typed arrays support: (name, kind, itemsize)
+TYPED_ARRAY_TYPES = [('int8', 'i', 1), ('uint8', 'u', 1),
+                     ('int16', 'i', 2), ('uint16', 'u', 2),
+                     ('int32', 'i', 4), ('uint32', 'u', 4),
+                     ('float32', 'f', 4), ('float64', 'f', 8)]
+
+# Map struct/array format chars to element type codes
+_format_kinds = dict(b='i', h='i', i='i', l='i', q='i',
+                     B='u', H='u', I='u', L='u', Q='u', f='f', d='f')
+
+IS_BIG_ENDIAN = sys.byteorder == 'big'
+
+_pack_float = struct.Struct('>d').pack
+_pack_uint16 = struct.Struct('>H').pack
+_pack_uint32 = struct.Struct('>I').pack
+
+
+def get_typed_array_code(kind, itemsize):
+    """ Get the element type code for the given kind ('i', 'u' or 'f')
+    and itemsize, or None if there is no matching JS typed array.
+    """
+    for i, (name, kind2, itemsize2) in enumerate(TYPED_ARRAY_TYPES):
+        if kind == kind2 and itemsize == itemsize2:
+            return i
+
+
+class MsgpackCodec:
+    """ Codec that encodes objects using the MessagePack format.
+
+    Supported are None, bool, int, float, str, bytes, list/tuple, dict,
+    and typed arrays (numpy arrays, ``array.array`` and ``memoryview``).
+    Ints outside the 32 bit range are encoded as floats, since that is
+    what they become in JavaScript anyway. Other objects are passed to
+    the ``default`` function, which should convert them to an object that
+    can be encoded. Decoded dicts are passed to the ``reviver`` function
+    (if given).
+    """
+
+    name = 'msgpack'
+
+    def __init__(self, default=None, reviver=None):
+        self._default = default
+        self._reviver = reviver
+
+    def encode(self, ob):
+        """ Encode the given object into bytes.
+        """
+        parts = []
+        self._encode(ob, parts)
+        return b''.join(parts)
+
+    def decode(self, data):
+        """ Decode the given bytes into an object.
+        """
+        data = memoryview(data)
+        ob, pos = self._decode(data, 0)
+        if pos != len(data):
+            raise ValueError('Data has %i bytes of trailing garbage.' %
+                             (len(data) - pos))
+        return ob
+
+    def _encode(self, ob, parts):
+
+        if ob is None:
+            parts.append(b'\xc0')
+        elif ob is True:
+            parts.append(b'\xc3')
+        elif ob is False:
+            parts.append(b'\xc2')
+        elif isinstance(ob, int):
+            if 0 <= ob < 0x80:
+                parts.append(bytes((ob, )))
+            elif -0x20 <= ob < 0:
+                parts.append(bytes((ob + 0x100, )))
+            elif 0 <= ob <= 0xff:
+                parts.append(bytes((0xcc, ob)))
+            elif 0 <= ob <= 0xffff:
+                parts.append(struct.pack('>BH', 0xcd, ob))
+            elif 0 <= ob <= 0xffffffff:
+                parts.append(struct.pack('>BI', 0xce, ob))
+            elif -0x80 <= ob < 0:
+                parts.append(struct.pack('>Bb', 0xd0, ob))
+            elif -0x8000 <= ob < 0:
+                parts.append(struct.pack('>Bh', 0xd1, ob))
+            elif -0x80000000 <= ob < 0:
+                parts.append(struct.pack('>Bi', 0xd2, ob))
+            else:
+                parts.append(b'\xcb' + _pack_float(ob))
+        elif isinstance(ob, float):
+            parts.append(b'\xcb' + _pack_float(ob))
+        elif isinstance(ob, str):
+            b = ob.encode()
+            n = len(b)
+            if n < 32:
+                parts.append(bytes((0xa0 + n, )))
+            elif n <= 0xff:
+                parts.append(bytes((0xd9, n)))
+            elif n <= 0xffff:
+                parts.append(b'\xda' + _pack_uint16(n))
+            else:
+                parts.append(b'\xdb' + _pack_uint32(n))
+            parts.append(b)
+        elif isinstance(ob, (list, tuple)):
+            n = len(ob)
+            if n < 16:
+                parts.append(bytes((0x90 + n, )))
+            elif n <= 0xffff:
+                parts.append(b'\xdc' + _pack_uint16(n))
+            else:
+                parts.append(b'\xdd' + _pack_uint32(n))
+            for x in ob:
+                self._encode(x, parts)
+        elif isinstance(ob, dict):
+            n = len(ob)
+            if n < 16:
+                parts.append(bytes((0x80 + n, )))
+            elif n <= 0xffff:
+                parts.append(b'\xde' + _pack_uint16(n))
+            else:
+                parts.append(b'\xdf' + _pack_uint32(n))
+            for key, val in ob.items():
+                self._encode(key if isinstance(key, str) else str(key), parts)
+                self._encode(val, parts)
+        elif isinstance(ob, (bytes, bytearray)):
+            self._encode_bin(ob, parts)
+        elif not self._encode_typed_array(ob, parts):
+            if self._default is None:
+                raise TypeError('Cannot encode object %r' % ob)
+            self._encode(self._default(ob), parts)
+
+    def _encode_bin(self, b, parts):
+        n = len(b)
+        if n <= 0xff:
+            parts.append(bytes((0xc4, n)))
+        elif n <= 0xffff:
+            parts.append(b'\xc5' + _pack_uint16(n))
+        else:
+            parts.append(b'\xc6' + _pack_uint32(n))
+        parts.append(b)
+
+    def _encode_typed_array(self, ob, parts):
+        """ Try encoding the object as a typed array. Returns False if
+        it is not an array-like object that we can encode as such.
+        """
+        np = sys.modules.get('numpy', None)
+        if np is not None and isinstance(ob, np.ndarray):
+            code = get_typed_array_code(ob.dtype.kind, ob.dtype.itemsize)
+            if code is None:
+                logger.debug('Encoding %s array as list.' % ob.dtype.name)
+                self._encode(ob.tolist(), parts)
+                return True
+            ob = np.ascontiguousarray(ob.ravel(), ob.dtype.newbyteorder('<'))
+            b = memoryview(ob).cast('B')
+        elif isinstance(ob, (array, memoryview)):
+            if isinstance(ob, array):
+                format, itemsize = ob.typecode, ob.itemsize
+            else:
+                format, itemsize = ob.format.lstrip('@=<'), ob.itemsize
+            code = get_typed_array_code(_format_kinds.get(format, ''), itemsize)
+            if code is None:
+                logger.debug('Encoding array of type %r as list.' % format)
+                self._encode(ob.tolist(), parts)
+                return True
+            if IS_BIG_ENDIAN and itemsize > 1:  # pragma: no cover
+                ob = array(format, ob.tolist())
+                ob.byteswap()
+            m = memoryview(ob)
+            b = m.cast('B') if m.c_contiguous else m.tobytes()
+        else:
+            return False
+        # Write ext header; the payload is the type code plus data
+        n = len(b) + 1
+        if n <= 0xff:
+            parts.append(bytes((0xc7, n, EXT_TYPED_ARRAY, code)))
+        elif n <= 0xffff:
+            parts.append(b'\xc8' + _pack_uint16(n) + bytes((EXT_TYPED_ARRAY, code)))
+        else:
+            parts.append(b'\xc9' + _pack_uint32(n) + bytes((EXT_TYPED_ARRAY, code)))
+        parts.append(b)
+        return True
+
+    def _decode(self, data, pos):
+
+        tag = data[pos]
+        pos += 1
+
+        if tag < 0x80:
+            return tag, pos
+        elif tag < 0x90:
+            return self._decode_map(data, pos, tag & 0x0f)
+        elif tag < 0xa0:
+            return self._decode_array(data, pos, tag & 0x0f)
+        elif tag < 0xc0:
+            n = tag & 0x1f
+            return data[pos:pos + n].tobytes().decode(), pos + n
+        elif tag >= 0xe0:
+            return tag - 0x100, pos
+        elif tag == 0xc0:
+            return None, pos
+        elif tag == 0xc2:
+            return False, pos
+        elif tag == 0xc3:
+            return True, pos
+        elif tag in (0xc4, 0xc5, 0xc6):
+            n, pos = self._decode_size(data, pos, tag - 0xc4)
+            return data[pos:pos + n].tobytes(), pos + n
+        elif tag in (0xc7, 0xc8, 0xc9):
+            n, pos = self._decode_size(data, pos, tag - 0xc7)
+            return self._decode_ext(data, pos, n)
+        elif tag in (0xd4, 0xd5, 0xd6, 0xd7, 0xd8):
+            return self._decode_ext(data, pos, 2 ** (tag - 0xd4))
+        elif tag in _number_formats:
+            fmt = _number_formats[tag]
+            return fmt.unpack_from(data, pos)[0], pos + fmt.size
+        elif tag in (0xd9, 0xda, 0xdb):
+            n, pos = self._decode_size(data, pos, tag - 0xd9)
+            return data[pos:pos + n].tobytes().decode(), pos + n
+        elif tag in (0xdc, 0xdd):
+            n, pos = self._decode_size(data, pos, tag - 0xdc + 1)
+            return self._decode_array(data, pos, n)
+        elif tag in (0xde, 0xdf):
+            n, pos = self._decode_size(data, pos, tag - 0xde + 1)
+            return self._decode_map(data, pos, n)
+        else:
+            raise ValueError('Invalid msgpack tag 0x%x' % tag)
+
+    def _decode_size(self, data, pos, i):
+        # i is 0, 1, 2 for 8, 16, 32 bit sizes
+        fmt = _size_formats[i]
+        return fmt.unpack_from(data, pos)[0], pos + fmt.size
+
+    def _decode_array(self, data, pos, n):
+        ob = []
+        for i in range(n):
+            x, pos = self._decode(data, pos)
+            ob.append(x)
+        return ob, pos
+
+    def _decode_map(self, data, pos, n):
+        ob = {}
+        for i in range(n):
+            key, pos = self._decode(data, pos)
+            val, pos = self._decode(data, pos)
+            ob[key] = val
+        if self._reviver is not None:
+            ob = self._reviver(ob)
+        return ob, pos
+
+    def _decode_ext(self, data, pos, n):
+        ext_type = data[pos]
+        payload = data[pos + 1:pos + 1 + n]
+        pos += 1 + n
+        if ext_type != EXT_TYPED_ARRAY:
+            raise ValueError('Unknown msgpack extension type %i' % ext_type)
+        name, kind, itemsize = TYPED_ARRAY_TYPES[payload[0]]
+        for typecode in 'bBhHiIlLqQfd':
+            if (_format_kinds[typecode] == kind and
+                    array(typecode).itemsize == itemsize):
+                break
+        ob = array(typecode)
+        ob.frombytes(payload[1:].tobytes())
+        if IS_BIG_ENDIAN and itemsize > 1:  # pragma: no cover
+            ob.byteswap()
+        return ob, pos
+
+
+_number_formats = {0xca: struct.Struct('>f'), 0xcb: struct.Struct('>d'),
+                   0xcc: struct.Struct('>B'), 0xcd: struct.Struct('>H'),
+                   0xce: struct.Struct('>I'), 0xcf: struct.Struct('>Q'),
+                   0xd0: struct.Struct('>b'), 0xd1: struct.Struct('>h'),
+                   0xd2: struct.Struct('>i'), 0xd3: struct.Struct('>q')}
+
+_size_formats = struct.Struct('>B'), struct.Struct('>H'), struct.Struct('>I')
+
+
+# The available codecs, by name. The client announces the codecs that
+# it supports, and the server selects the first one that is available.
+CODECS = {MsgpackCodec.name: MsgpackCodec}
+
+
+def select_codec(names):
+    """ Given a list of codec names announced by the client, return the
+    class of the first one that we support, or None.
+    """
+    for name in names:
+        if name in CODECS:
+            return CODECS[name]
@@ -8,6 +8,7 @@ import json
 from .. import webruntime, config, set_log_level
 
 from ._app import App, manager
+from ._session import command_to_text
 from ._model import Model
 from ._server import current_server
 from ._assetstore import assets
@@ -135,7 +136,8 @@ class NoteBookHelper:
         self._real_ws = None
         if self._commands:
             from IPython.display import display, Javascript
-            commands = ['flexx.command(%s);' % reprs(msg) for msg in self._commands]
+            commands = ['flexx.command(%s);' % reprs(command_to_text(msg))
+                        for msg in self._commands]
             self._commands = []
             display(Javascript('\n'.join(commands)))
     
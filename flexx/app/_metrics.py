@@ -0,0 +1,197 @@
+"""
+Counters and histograms that describe the state of the server, served
+in the Prometheus text format at ``/flexx/metrics``.
+
+The metrics are updated at the places where things happen (e.g. when a
+websocket frame is written), which only costs a dict update. Metrics that
+describe the current state (e.g. the number of sessions) are collected
+when the metrics are requested.
+"""
+
+from bisect import bisect_left
+
+from ..event._handler import add_handler_observer
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values):
+    """ Get the label part of a sample, e.g. ``{app="foo"}``.
+    """
+    if not names:
+        return ''
+    table = {ord('\\'): '\\\\', ord('"'): '\\"', ord('\n'): '\\n'}
+    return '{%s}' % ','.join(['%s="%s"' % (name, str(value).translate(table))
+                              for name, value in zip(names, values)])
+
+
+def format_value(value):
+    if isinstance(value, float) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """ Base class for metrics. A metric has a name, a help text, and
+    optional label names. Samples are stored per tuple of label values.
+    """
+
+    TYPE = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def clear(self):
+        """ Remove all samples.
+        """
+        self._values.clear()
+
+    def get(self, *labels):
+        """ Get the value for the given label values (or None).
+        """
+        return self._values.get(labels, None)
+
+    def render(self):
+        """ Get the lines that represent this metric.
+        """
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s %s' % (self.name, self.TYPE)]
+        for labels in sorted(self._values):
+            lines.extend(self._render_sample(labels, self._values[labels]))
+        return lines
+
+    def _render_sample(self, labels, value):
+        return ['%s%s %s' % (self.name, format_labels(self.labels, labels),
+                             format_value(value))]
+
+
+class Counter(Metric):
+    """ A value that only goes up, e.g. the number of frames sent.
+    """
+
+    TYPE = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        """ Increase the counter for the given tuple of label values.
+        """
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """ A value that can go up and down, e.g. the number of sessions.
+    Gauges are typically set when the metrics are collected.
+    """
+
+    TYPE = 'gauge'
+
+    def set(self, labels=(), value=0):
+        """ Set the gauge for the given tuple of label values.
+        """
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """ Counts observed values (e.g. durations) in buckets, and keeps
+    track of their sum.
+    """
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        """ Add an observation for the given tuple of label values.
+        """
+        sample = self._values.get(labels, None)
+        if sample is None:
+            # counts per bucket (non-cumulative), plus sum and count
+            sample = self._values[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+        sample[0][bisect_left(self.buckets, value)] += 1
+        sample[1] += value
+        sample[2] += 1
+
+    def _render_sample(self, labels, sample):
+        lines = []
+        names = self.labels + ('le', )
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf', ), sample[0]):
+            cumulative += count
+            bound = bound if isinstance(bound, str) else format_value(bound)
+            lines.append('%s_bucket%s %i' % (self.name,
+                                             format_labels(names, labels + (bound, )),
+                                             cumulative))
+        label_str = format_labels(self.labels, labels)
+        lines.append('%s_sum%s %s' % (self.name, label_str, format_value(sample[1])))
+        lines.append('%s_count%s %i' % (self.name, label_str, sample[2]))
+        return lines
+
+
+class Metrics:
+    """ The collection of metrics of the Flexx server. There is one
+    instance, ``flexx.app._metrics.metrics``.
+    """
+
+    def __init__(self):
+        self.ws_frames = Counter('flexx_ws_frames_total',
+                                 'Number of websocket frames.',
+                                 ('app', 'direction'))
+        self.ws_bytes = Counter('flexx_ws_bytes_total',
+                                'Number of bytes sent over websockets '
+                                '(characters for text frames).',
+                                ('app', 'direction'))
+        self.asset_cache = Counter('flexx_asset_cache_requests_total',
+                                   'Number of requests to the asset cache.',
+                                   ('result', ))
+        self.prop_syncs = Counter('flexx_prop_syncs_total',
+                                  'Number of property changes synced between '
+                                  'Python and JavaScript, per Model class.',
+                                  ('model', 'direction'))
+        self.handler_duration = Histogram('flexx_handler_duration_seconds',
+                                          'Time spent in event handlers.')
+        self.loop_lag = Histogram('flexx_ioloop_lag_seconds',
+                                  'Delay of a periodic callback on the IOLoop.')
+        self.sessions = Gauge('flexx_sessions', 'Number of sessions.',
+                              ('app', 'state'))
+        self.ws_buffered = Gauge('flexx_ws_buffered_bytes',
+                                 'Bytes waiting to be written to websockets.',
+                                 ('app', ))
+        self.ws_held = Gauge('flexx_ws_held_commands',
+                             'Commands held back because of backpressure.',
+                             ('app', ))
+        self.pending_commands = Gauge('flexx_pending_commands',
+                                      'Commands waiting for a client to connect.',
+                                      ('app', ))
+        self.sessions_served = Gauge('flexx_sessions_served',
+                                     'Number of sessions served in total.')
+        self.uptime = Gauge('flexx_uptime_seconds',
+                            'Time since flexx.app was imported.')
+
+        add_handler_observer(self._on_handler_call)
+
+    def _on_handler_call(self, handler, events, duration):
+        self.handler_duration.observe(duration)
+
+    def __iter__(self):
+        return iter([self.sessions, self.sessions_served, self.uptime,
+                     self.ws_frames, self.ws_bytes, self.ws_buffered,
+                     self.ws_held, self.pending_commands,
+                     self.asset_cache, self.prop_syncs,
+                     self.handler_duration, self.loop_lag])
+
+    def render(self):
+        """ Get the metrics in the Prometheus text format.
+        """
+        lines = []
+        for metric in self:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -68,16 +68,18 @@ attributes and handlers can be created here.
 import sys
 import json
 import threading
+from array import array
 
-from .. import event
+from .. import event, config
 from ..event._hasevents import (with_metaclass, new_type, HasEventsMeta,
                                 finalize_hasevents_class)
 from ..event._emitters import Emitter
 from ..event._js import create_js_hasevents_class, HasEventsJS
-from ..pyscript import js_rename, window, JSString, undefined
+from ..pyscript import js_rename, window, JSString, undefined, this_is_js
 
 from ._asset import get_mod_name
 from ._server import call_later
+from ._metrics import metrics
 from . import logger
 
 # The clientcore module is a PyScript module that forms the core of the
@@ -140,10 +142,88 @@ def get_active_model():
             return session.app
 
 
+def typed_array(v, dtype='float64'):
+    """ Normalize a value to a flat array of floats, for use in array-valued
+    properties. The ``dtype`` can be 'float32' or 'float64'.
+    
+    In Python, the value is always copied, so that changing the given
+    array in-place and setting it again is seen as a change. A
+    ``memoryview`` of the right type stays a ``memoryview``. Other values
+    become a numpy array if numpy is imported, and an ``array.array``
+    otherwise. In JavaScript, the value
+    becomes a ``Float32Array`` or ``Float64Array``. If the websocket uses
+    a binary codec (``flexx.config.ws_binary``) the data is sent as a raw
+    buffer, otherwise as a list. This function can be used in the property
+    functions of both Python and JS::
+    
+        from flexx.app import typed_array
+        
+        class Both:
+            @event.prop
+            def data(self, v=()):
+                return typed_array(v)
+    """
+    if this_is_js():
+        if dtype == 'float32':
+            Cls = window.Float32Array
+        else:
+            Cls = window.Float64Array
+        if isinstance(v, Cls):
+            return v
+        return Cls(v)
+    else:
+        typecode = 'f' if dtype == 'float32' else 'd'
+        if isinstance(v, memoryview):
+            if v.format == typecode and v.ndim == 1 and v.c_contiguous:
+                return memoryview(bytearray(v)).cast(typecode)
+        np = sys.modules.get('numpy', None)
+        if np is not None:
+            return np.array(v, dtype, order='C').ravel()
+        return array(typecode, v)
+
+
+def snapshot_value(v):
+    """ Get a shallow copy of a list, dict or array value, so that a
+    command that is queued with it is not affected by later in-place
+    mutations of the property (see ``_mutate_prop()``).
+    """
+    if isinstance(v, list):
+        return list(v)
+    elif isinstance(v, dict):
+        return dict(v)
+    elif isinstance(v, array):
+        return array(v.typecode, v)
+    elif hasattr(v, 'dtype') and hasattr(v, 'copy'):
+        return v.copy()
+    return v
+
+
 def stub_emitter_func_py(self, *args):
     raise RuntimeError('This emitter can only be called from JavaScript')
 
 
+class ModelJSMeta(type):
+    """ Meta class for the JS "subclass" of Model classes. Provides
+    the ``CODE`` attribute, which is generated on first access.
+    """
+    
+    # Map JS classes to their Model class. Not stored as an attribute on
+    # the JS class, because callables on it would be transpiled.
+    MODEL_CLASSES = {}
+    
+    @property
+    def CODE(cls):
+        """ The JS code for the corresponding Model class. The
+        ``meta`` attribute of this string contains the meta info about
+        the code.
+        """
+        code = cls.__dict__.get('__jscode__', None)
+        if code is None:
+            code = ModelJSMeta.MODEL_CLASSES[cls]._get_js()
+            cls.__jscode__ = code
+        return code
+
+
 class ModelMeta(HasEventsMeta):
     """ Meta class for Model
     Set up proxy properties in Py/JS.
@@ -167,7 +247,7 @@ class ModelMeta(HasEventsMeta):
         
         # Implicit inheritance for JS "subclass"
         jsbases = [getattr(b, 'JS') for b in cls.__bases__ if hasattr(b, 'JS')]
-        JS = new_type('JS', tuple(jsbases), {})
+        JS = ModelJSMeta('JS', tuple(jsbases), {})
         if 'JS' in cls.__dict__:
             if '__init__' in cls.JS.__dict__:
                 JS.__init__ = cls.JS.__init__
@@ -219,8 +299,12 @@ class ModelMeta(HasEventsMeta):
         # Write __jsmodule__; an optimization for our module/asset system
         cls.__jsmodule__ = get_mod_name(sys.modules[cls.__module__])
         
-        # Set JS, META, and CSS for this class
-        cls.JS.CODE = cls._get_js()
+        # Set JS, META, and CSS for this class. The JS is generated
+        # when first needed if config.lazy_js is set.
+        ModelJSMeta.MODEL_CLASSES[cls.JS] = cls
+        cls.JS.__jscode__ = None
+        if not config.lazy_js:
+            cls.JS.CODE
         cls.CSS = cls.__dict__.get('CSS', '')
     
     def _get_js(cls):
@@ -244,8 +328,11 @@ class ModelMeta(HasEventsMeta):
                               'var %s = flexx.classes.%s =' % (cls_name, cls_name),
                               1))
         if cls.mro()[1] is event.HasEvents:
+            for key in ('std_functions', 'std_methods'):
+                meta[key].update(HasEventsJS.JSCODE.meta[key])
             code.append('flexx.serializer.add_reviver("Flexx-Model",'
                         ' flexx.classes.Model.prototype.__from_json__);\n')
+            code.append('flexx.loop = loop;\n')  # e.g. for profile_handlers()
         # Return with meta info
         js = JSString('\n'.join(code))
         js.meta = meta
@@ -383,6 +470,7 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
         self.__event_types_js = event_types_js
         self.__pending_events_from_js = []
         self.__pending_props_from_js = []
+        self.__pending_props_to_js = {}  # coalesced props to sync
         
         # Instantiate JavaScript version of this class
         clsname = 'flexx.classes.' + self.__class__.__name__
@@ -505,17 +593,29 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
     
     def _set_prop_from_js(self, name, text):
         value = serializer.loads(text)
+        metrics.prop_syncs.inc((self.__class__.__name__, 'js2py'))
         #self._set_prop(name, value, True)
         if not self.__pending_props_from_js:
             call_later(0.01, self.__set_prop_from_js_pending)
-        self.__pending_props_from_js.append((name, value))
+        self.__pending_props_from_js.append((name, value, None))
+
+    def _mutate_prop_from_js(self, name, text):
+        mutation = serializer.loads(text)  # [mutation, index, objects]
+        metrics.prop_syncs.inc((self.__class__.__name__, 'js2py'))
+        if not self.__pending_props_from_js:
+            call_later(0.01, self.__set_prop_from_js_pending)
+        self.__pending_props_from_js.append((name, None, mutation))
 
     def __set_prop_from_js_pending(self):
         # Collect near-simultaneous prop settings in one handler call,
-        # see __emit_from_js_pending
+        # see __emit_from_js_pending. Mutations are in the same list
+        # to retain the order.
         pending, self.__pending_props_from_js = self.__pending_props_from_js, []
-        for name, value in pending:
-            self._set_prop(name, value, False, True)
+        for name, value, mutation in pending:
+            if mutation is None:
+                self._set_prop(name, value, False, True)
+            else:
+                self._mutate_prop(name, mutation[0], mutation[1], mutation[2], True)
     
     def _set_prop(self, name, value, _initial=False, fromjs=False):
         # This method differs from the JS version in that we *do
@@ -528,11 +628,39 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
         ischanged = super()._set_prop(name, value, _initial)
         
         if ischanged and issyncable and not fromjs and not self._disposed:
-            value = getattr(self, name)  # use normalized value
-            txt = serializer.saves(value)
-            cmd = 'flexx.instances.%s._set_prop_from_py(%s, %s);' % (
-                self._id, reprs(name), reprs(txt))
-            self._session._exec(cmd)
+            if self.get_coalesce(name):
+                # Sync once per iteration, the value is obtained at that time
+                if not self.__pending_props_to_js:
+                    call_later(0, self.__set_prop_to_js_pending)
+                self.__pending_props_to_js[name] = True
+            else:
+                value = snapshot_value(getattr(self, name))  # use normalized value
+                self._session._send_command(('SET_PROPS', [[self._id, name, value]]))
+                metrics.prop_syncs.inc((self.__class__.__name__, 'py2js'))
+    
+    def __set_prop_to_js_pending(self):
+        pending, self.__pending_props_to_js = self.__pending_props_to_js, {}
+        if self._disposed or not pending:
+            return
+        items = [[self._id, name, snapshot_value(getattr(self, name))]
+                 for name in pending]
+        self._session._send_command(('SET_PROPS', items))
+        metrics.prop_syncs.inc((self.__class__.__name__, 'py2js'), len(items))
+    
+    def _mutate_prop(self, name, mutation, index=0, objects=None, fromjs=False):
+        # Like _set_prop(), but we only send the mutation
+        islocal = name in self.__local_properties__
+        
+        logger.debug('Mutating prop %r on %s, fromjs=%s' % (name, self.id, fromjs))
+        issyncable = not islocal and not fromjs and not self._disposed
+        if issyncable and name in self.__pending_props_to_js:
+            self.__set_prop_to_js_pending()  # retain order, and send old value
+        super()._mutate_prop(name, mutation, index, objects)
+        
+        if issyncable:
+            item = [self._id, name, mutation, index, objects]
+            self._session._send_command(('MUTATE', [item]))
+            metrics.prop_syncs.inc((self.__class__.__name__, 'py2js'))
     
     def _register_handler(self, *args):
         event_type = args[0].split(':')[0]
@@ -573,9 +701,7 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
         isprop = type in self.__properties__ and type not in self.__local_properties__
         if not fromjs and not isprop and type in self.__event_types_js:
             if not self._disposed:
-                cmd = 'flexx.instances.%s._emit_from_py(%s, %r);' % (
-                    self._id, serializer.saves(type), serializer.saves(ev))
-                self._session._exec(cmd)
+                self._session._send_command(('EMIT', [[self._id, type, ev]]))
     
     def call_js(self, call):
         if self._disposed:
@@ -585,20 +711,23 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
         self._session._exec(cmd)
     
     def send_data(self, data, meta=None):
-        """ Send data to the JS side, where ``retreive_data()`` will be called,
-        which will eventually call ``receive_data()`` with the corresponding
-        data and meta data.
+        """ Send data to the JS side, where ``receive_data()`` will be
+        called with the corresponding data and meta data.
         
-        AJAX is used to retrieve the data. In the future we may want to use
-        a dedicated binary websocket for better performance.
+        If the client supports binary websocket frames, a blob is pushed
+        over the websocket (in chunks if it is large). In this case a
+        Future is returned that resolves when the data has been written,
+        which can be used to limit the rate at which data is produced.
+        Otherwise ``retrieve_data()`` is called in JS, which uses AJAX
+        to retrieve the data.
         
         Parameters:
-            data (bytes, str): the data blob. Can also be a URL (a string
-                starting with "http://", "https://", "/flexx/data/" or "_data/")
-                where the client can download the data from.
+            data (bytes, memoryview, str): the data blob. Can also be a URL
+                (a string starting with "http://", "https://", "/flexx/data/"
+                or "_data/") where the client can download the data from.
             meta (dict, optional): information associated with the data
                 that the JS side can use to interpret the data. This function
-                will add an "id" field to the meta data.
+                will add a "byteLength" field to the meta data for blobs.
         """
         # Note that when send_data() is used from the init(), on the JS side
         # retrieve_data() is called before init(), unless we use call-later.
@@ -635,6 +764,7 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
             self._ws = window.flexx.ws
             
             self._event_listeners = []  # JS event listeners
+            self._pending_props_to_py = {}  # coalesced props to sync
             
             # Init HasEvents, but delay initialization of handlers
             super().__init__(False)
@@ -682,14 +812,30 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
             """
             pass
         
-        def _set_prop_from_py(self, name, text):
-            value = serializer.loads(text)
+        def _set_prop_from_py(self, name, value):
             # Trick for when value is e.g. x.children with disposed children,
             # causing "sparse" arrays.
             if isinstance(value, list):
                 value = [v for v in value if v is not undefined]
             self._set_prop(name, value, False, True)
         
+        def _mutate_prop_from_py(self, name, mutation, index, objects):
+            self._mutate_prop(name, mutation, index, objects, True)
+        
+        def _mutate_prop(self, name, mutation, index=0, objects=None, frompy=False):
+            
+            islocal = self.__local_properties__.indexOf(name) >= 0
+            issyncable = not islocal and self._sync_props
+            issyncable = issyncable and not frompy and self._ws is not None
+            
+            if issyncable and self._pending_props_to_py[name]:
+                self._set_prop_to_py_pending()  # retain order, and send old value
+            super()._mutate_prop(name, mutation, index, objects)
+            
+            if issyncable:
+                txt = serializer.saves([mutation, index, objects])
+                self._ws.send('MUTATE_PROP ' + [self.id, name, txt].join(' '))
+        
         def _set_prop(self, name, value, _initial=False, frompy=False):
             
             # Note: there is quite a bit of _pyfunc_truthy in the ifs here
@@ -704,8 +850,23 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
             ischanged = super()._set_prop(name, value, _initial)
             
             if ischanged and issyncable:
-                value = self[name]
-                txt = serializer.saves(value)
+                if self.get_coalesce(name):
+                    # Sync once per iteration, like in Python
+                    if not len(self._pending_props_to_py.keys()):
+                        window.setTimeout(self._set_prop_to_py_pending, 0)
+                    self._pending_props_to_py[name] = True
+                else:
+                    value = self[name]
+                    txt = serializer.saves(value)
+                    self._ws.send('SET_PROP ' + [self.id, name, txt].join(' '))
+        
+        def _set_prop_to_py_pending(self):
+            pending = self._pending_props_to_py
+            self._pending_props_to_py = {}
+            if self._ws is None:
+                return
+            for name in pending.keys():
+                txt = serializer.saves(self[name])
                 self._ws.send('SET_PROP ' + [self.id, name, txt].join(' '))
         
         def _handlers_changed_hook(self):
@@ -718,8 +879,7 @@ class Model(with_metaclass(ModelMeta, event.HasEvents)):
         def _set_event_types_py(self, event_types):
             self.__event_types_py = event_types
         
-        def _emit_from_py(self, type, text):
-            ev = serializer.loads(text)
+        def _emit_from_py(self, type, ev):
             self.emit(type, ev, True)
         
         def emit(self, type, info=None, frompy=False):
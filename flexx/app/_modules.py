@@ -9,7 +9,8 @@ import json
 import time
 import types
 
-from ..pyscript import py2js, RawJS, JSConstant, create_js_module, get_all_std_names
+from ..pyscript import py2js, RawJS, JSConstant, create_js_module
+from ..pyscript.stdlib import FUNCTION_PREFIX, METHOD_PREFIX
 
 from ._model import Model
 from ._asset import Asset, get_mod_name, module_is_package
@@ -158,6 +159,20 @@ class JSModule:
         """
         return set(self._model_classes.values())
     
+    @property
+    def std_functions(self):
+        """ The names of the PyScript std functions used by the JS of
+        this module (and by the std functions and methods that it uses).
+        """
+        return set().union(*[js.meta['std_functions'] for js in self._get_js_parts()])
+    
+    @property
+    def std_methods(self):
+        """ The names of the PyScript std methods used by the JS of
+        this module (and by the std functions and methods that it uses).
+        """
+        return set().union(*[js.meta['std_methods'] for js in self._get_js_parts()])
+    
     def _import(self, mod_name, name, as_name):
         """ Import a name from another module. This also ensures that the
         other module exists.
@@ -331,15 +346,20 @@ class JSModule:
             m = self._import(get_mod_name(base_cls), None, None)
             m.add_variable(base_cls.__name__)  # note: m can be self, which is ok
     
+    def _get_js_parts(self):
+        """ Get the pieces of transpiled JS that this module defines.
+        """
+        js = [cls.JS.CODE for cls in self._model_classes.values()]
+        js += list(self._pyscript_code.values())
+        return js
+    
     def get_js(self):
         """ Get the JS code for this module.
         """
         if self._js_cache is None:
             # Collect JS and sort by linenr
-            js = [cls.JS.CODE for cls in self._model_classes.values()]
-            js += list(self._pyscript_code.values())
+            js = self._get_js_parts()
             js.sort(key=lambda x: x.meta['linenr'])
-            # todo: collect stdlib funcs here
             # Insert serialized values
             value_lines = []
             for key in sorted(self._js_values):
@@ -360,12 +380,13 @@ class JSModule:
                         name, _, as_name = name.partition(' as ')
                     pieces = ['%s = %s.%s' % (as_name, mod_name, name)]
                     js.insert(0, 'var ' + (', '.join(pieces)) + ';')
-            # Import stdlib
-            # todo: either include only std of what we use, or use _py.xxx
-            func_names, method_names = get_all_std_names()
-            pre1 = ', '.join(['%s = _py.%s' % (n, n) for n in func_names])
-            pre2 = ', '.join(['%s = _py.%s' % (n, n) for n in method_names])
-            js.insert(0, 'var %s;\nvar %s;' % (pre1, pre2))
+            # Import the used part of the stdlib
+            for prefix, names in [(METHOD_PREFIX, self.std_methods),
+                                  (FUNCTION_PREFIX, self.std_functions)]:
+                if names:
+                    names = [prefix + n for n in sorted(names)]
+                    pre = ', '.join(['%s = _py.%s' % (n, n) for n in names])
+                    js.insert(0, 'var %s;' % pre)
             # Create module
             self._js_cache = create_js_module(self.name, '\n\n'.join(js),
                                               imports, exports, 'amd-flexx')
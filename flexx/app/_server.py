@@ -12,7 +12,7 @@ _current_server = None
 
 
 def create_server(host=None, port=None, new_loop=False, backend='tornado',
-                  **server_kwargs):
+                  workers=None, **server_kwargs):
     """
     Create a new server object. This is automatically called; users generally
     don't need this, unless they want to explicitly specify host/port,
@@ -34,6 +34,14 @@ def create_server(host=None, port=None, new_loop=False, backend='tornado',
             which is made current when ``start()`` is called. If ``False``
             (default) will use the current IOLoop for this thread.
         backend (str): Stub argument; only Tornado is currently supported.
+        workers (int, optional): If given, fork this many worker processes
+            that share the listening socket, so that the sessions are spread
+            over multiple cores (zero means one per CPU). The id of a session
+            encodes the worker that owns it, and requests for a session
+            (e.g. the websocket connection) are routed to that worker. The
+            calling process becomes a supervisor that restarts workers that
+            exit unexpectedly; this function only returns in the workers.
+            Not supported on Windows or in combination with SSL.
         **server_kwargs: keyword arguments passed to the server constructor.
     
     Returns:
@@ -55,8 +63,9 @@ def create_server(host=None, port=None, new_loop=False, backend='tornado',
     if _current_server:
         _current_server.close()
     # Start hosting
-    _current_server = TornadoServer(host, port, new_loop, **server_kwargs)
+    _current_server = TornadoServer(host, port, new_loop, workers, **server_kwargs)
     assert isinstance(_current_server, AbstractServer)
+    _loop.loop.set_time_budget(config.loop_time_budget)
     # Schedule pending calls
     _current_server.call_later(0, _loop.loop.iter)
     while _pending_call_laters:
@@ -13,16 +13,29 @@ from http.cookies import SimpleCookie
 
 from ._server import call_later
 from ._model import Model, new_type
+from ._clientcore import serializer
 from ._asset import Asset, Bundle, solve_dependencies
 from ._assetstore import AssetStore, export_assets_and_data, INDEX
 from ._assetstore import assets as assetstore
 from . import logger
 
 from .. import config
+from ..event._profiler import add_js_handler_stats
 
 reprs = json.dumps
 
 
+def command_to_text(command):
+    """ Get the text form of a command. Most commands are strings, but
+    commands that hold a list of items (e.g. SET_PROPS) are
+    (kind, items) tuples, so that the websocket can merge them and choose
+    how to encode them.
+    """
+    if isinstance(command, tuple):
+        return command[0] + ' ' + serializer.saves(command[1])
+    return command
+
+
 # Use the system PRNG for session id generation (if possible)
 # NOTE: secure random string generation implementation is adapted
 #       from the Django project.
@@ -46,6 +59,28 @@ def get_random_string(length=24, allowed_chars=None):
     return ''.join(srandom.choice(allowed_chars) for i in range(length))
 
 
+# In multi-process mode (see create_server()) each worker process appends
+# its index to the ids of the sessions that it creates, so that requests
+# for a session can be routed to the process that owns it.
+_worker_id = None
+
+def set_worker_id(worker_id):
+    """ Set the index of the worker process that this process is, or
+    None when not running in multi-process mode.
+    """
+    global _worker_id
+    _worker_id = worker_id
+
+
+def get_session_worker(session_id):
+    """ Get the index of the worker process that owns the session with
+    the given id, or None if the id does not specify a worker.
+    """
+    _, sep, worker_id = session_id.rpartition('_')
+    if sep and worker_id.isdigit():
+        return int(worker_id)
+
+
 class Session:
     """ A session between Python and the client runtime.
     This class is what holds together the app widget, the web runtime,
@@ -71,6 +106,8 @@ class Session:
 
         # Id and name of the app
         self._id = get_random_string()
+        if _worker_id is not None:
+            self._id += '_%i' % _worker_id
         self._app_name = app_name
 
         # To keep track of what modules are defined at the client
@@ -99,6 +136,7 @@ class Session:
         # While the client is not connected, we keep a queue of
         # commands, which are send to the client as soon as it connects
         self._pending_commands = []
+        self._init_commands = []  # pending commands embedded in the page
 
         # request related information
         self._request = request
@@ -158,6 +196,13 @@ class Session:
         else:
             return self.STATUS.CLOSED  # connection closed
 
+    @property
+    def pending_commands(self):
+        """ The number of commands that wait to be sent until the client
+        connects.
+        """
+        return len(self._pending_commands)
+
     @property
     def present_modules(self):
         """ The set of module names that is (currently) available at the client.
@@ -316,6 +361,7 @@ class Session:
         """ Send data to a model on the JS side. The corresponding object's
         receive_data() method is called when the data is available in JS.
         This is called by ``Model.send_data()`` and works in the same way.
+        Returns a Future if the data is pushed over the websocket.
         """
         # Check id
         if not isinstance(id, str):
@@ -337,18 +383,23 @@ class Session:
             else:
                 raise TypeError('session.send_data() got a string, but does '
                                 'not look like a URL: %r' % data)
-        elif isinstance(data, bytes):
-            # Blob: store it, and tell client to retieve it with AJAX
-            # todo: have a second ws connection for pushing data
-            meta['byteLength'] = len(data)
+        elif isinstance(data, (bytes, memoryview)):
+            meta['byteLength'] = memoryview(data).nbytes
+            # Blob: if the client supports binary frames, push it over the
+            # websocket, otherwise store it and let the client retrieve it
+            if (self.status == self.STATUS.CONNECTED and not self._closing and
+                    getattr(self._ws, 'codec', None) is not None):
+                return self._ws.send_data(id, data, meta)
+            if isinstance(data, memoryview):
+                data = data.tobytes()
             data_name = 'blob-' + get_random_string()
             url = '/flexx/data/%s/%s' % (self.id, data_name)
             self._data_volatile[data_name] = data
             if self.id == self.app_name:  # Maintain data if we're being exported
                 self._data[data_name] = data
         else:
-            raise TypeError('session.send_data() data must be a bytes or a URL, '
-                            'not %s.' % data.__class__.__name__)
+            raise TypeError('session.send_data() data must be a bytes, memoryview '
+                            'or a URL, not %s.' % data.__class__.__name__)
 
         # Tell JS to retrieve data
         t = 'window.flexx.instances.%s.retrieve_data("%s", %s);'
@@ -568,7 +619,8 @@ class Session:
     ## Communication with the client
 
     def _send_command(self, command):
-        """ Send the command, add to pending queue.
+        """ Send the command, add to pending queue. The command is a
+        string or a (kind, items) tuple (see ``command_to_text()``).
         """
         if self._closing:
             pass
@@ -580,6 +632,15 @@ class Session:
             #raise RuntimeError('Cannot send commands; app is closed')
             logger.warn('Cannot send commands; app is closed')
 
+    def _take_init_commands(self):
+        """ Take the pending commands, to embed them in the page rather
+        than sending them over the websocket. Returns all commands taken
+        so far, so that the page can be served more than once.
+        """
+        self._init_commands.extend(self._pending_commands)
+        self._pending_commands = []
+        return list(self._init_commands)
+
     def _receive_command(self, command):
         """ Received a command from JS.
         """
@@ -599,6 +660,11 @@ class Session:
             ob = self._model_instances.get(id, None)
             if ob is not None:
                 ob._set_prop_from_js(name, txt)
+        elif command.startswith('MUTATE_PROP '):
+            _, id, name, txt = command.split(' ', 3)
+            ob = self._model_instances.get(id, None)
+            if ob is not None:
+                ob._mutate_prop_from_js(name, txt)
         elif command.startswith('SET_EVENT_TYPES '):
             _, id, txt = command.split(' ', 3)
             ob = self._model_instances.get(id, None)
@@ -609,6 +675,8 @@ class Session:
             ob = self._model_instances.get(id, None)
             if ob is not None:
                 ob._emit_from_js(name, txt)
+        elif command.startswith('PROFILE '):
+            add_js_handler_stats(json.loads(command[8:]))
         else:
             logger.warn('Unknown command received from JS:\n%s' % command)
 
@@ -633,6 +701,13 @@ class Session:
         """
         self._send_command('EXEC ' + code)
 
+    def profile_js_handlers(self, interval=2.0):
+        """ Let the client report the time spent in event handlers every
+        interval seconds. The stats are collected by the active
+        ``event.HandlerProfiler`` objects. Set interval to 0 to stop.
+        """
+        self._exec('flexx.profile_handlers(%f);' % interval)
+
     def eval(self, code):
         """ Evaluate the given JavaScript code in the client
 
@@ -652,7 +727,24 @@ def get_page(session):
     """
     css_assets = [assetstore.get_asset('reset.css')]
     js_assets = [assetstore.get_asset('flexx-core.js')]
-    return _get_page(session, js_assets, css_assets, 3, False)
+    if not config.inline_init:
+        return _get_page(session, js_assets, css_assets, 3, False)
+    # Embed the pending commands, and link to the assets that would be
+    # defined over the websocket, so that they can be loaded (and cached)
+    # while the page loads.
+    commands = []
+    for command in session._take_init_commands():
+        command = command_to_text(command)
+        if command.startswith('DEFINE-'):
+            name = command.split(' ', 2)[1]
+            asset = session._store.get_asset(name)
+            if name.lower().endswith('.css'):
+                css_assets.append(asset)
+            else:
+                js_assets.append(asset)
+        else:
+            commands.append(command)
+    return _get_page(session, js_assets, css_assets, 3, False, commands)
 
 
 def get_page_for_export(session, commands, link=0):
@@ -687,6 +779,7 @@ def get_page_for_export(session, commands, link=0):
     lines = []
     lines.append('flexx.is_exported = true;\n')
     lines.append('flexx.runExportedApp = function () {')
+    commands = [command_to_text(c) for c in commands]
     lines.extend(['    flexx.command(%s);' % reprs(c) for c in commands
                   if not c.startswith('DEFINE-')])
     lines.append('};\n')
@@ -697,7 +790,7 @@ def get_page_for_export(session, commands, link=0):
     return _get_page(session, js_assets, css_assets, link, True)
 
 
-def _get_page(session, js_assets, css_assets, link, export):
+def _get_page(session, js_assets, css_assets, link, export, init_commands=None):
     """ Compose index page.
     """
     pre_path = '_assets' if export else '/flexx/assets'
@@ -705,7 +798,12 @@ def _get_page(session, js_assets, css_assets, link, export):
     codes = []
 
     t = 'var flexx = {app_name: "%s", session_id: "%s"};'
-    codes.append('<script>%s</script>\n' % t % (session.app_name, session.id))
+    t = t % (session.app_name, session.id)
+    if init_commands:
+        # Escape "</" so that commands cannot end the script tag
+        commands = reprs(init_commands).replace('</', '<\\/')
+        t = t[:-2] + ', init_commands: %s};' % commands
+    codes.append('<script>%s</script>\n' % t)
 
     for assets in [css_assets, js_assets]:
         for asset in assets:
@@ -715,7 +813,8 @@ def _get_page(session, js_assets, css_assets, link, export):
                 if asset.name.endswith(('-info.js', '-export.js')):
                     html = asset.to_html('', 0)
                 else:
-                    html = asset.to_html(pre_path + '/shared/{}', link)
+                    html = asset.to_html(pre_path + '/shared/{}', link,
+                                         fingerprint=not export)
             codes.append(html)
             if export and assets is js_assets:
                 codes.append('<script>window.flexx.spin();</script>')
@@ -2,26 +2,39 @@
 Serve web page and handle web sockets using Tornado.
 """
 
+import io
+import gzip
+import zlib
 import json
 import time
 import socket
+import hashlib
 import mimetypes
 import traceback
+import weakref
 import threading
-from urllib.parse import urlparse
-# from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from array import array
+from urllib.parse import urlparse, parse_qs
 
 import tornado
-from tornado import gen, netutil
-from tornado.web import Application, RequestHandler
+from tornado import gen, netutil, process
+from tornado.concurrent import Future
+from tornado.locks import Event
+from tornado.iostream import StreamClosedError
+from tornado.web import Application, RequestHandler, OutputTransform
 from tornado.ioloop import IOLoop
-from tornado.websocket import WebSocketHandler
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
 from tornado.httpserver import HTTPServer
 
 from ._app import manager
-from ._session import get_page
+from ._session import get_page, command_to_text
+from ._session import set_worker_id, get_session_worker
 from ._server import AbstractServer
 from ._assetstore import assets
+from ._asset import split_fingerprint
+from ._codec import select_codec
+from ._metrics import metrics
 
 from . import logger
 from .. import config
@@ -29,12 +42,6 @@ from .. import config
 if tornado.version_info < (4, ):
     raise RuntimeError('Flexx requires Tornado v4.0 or higher.')
 
-# todo: threading, or even multi-process
-#executor = ThreadPoolExecutor(4)
-
-# Use a binary websocket or not?
-BINARY = False
-
 IMPORT_TIME = time.time()
 
 
@@ -47,11 +54,16 @@ class TornadoServer(AbstractServer):
     """ Flexx Server implemented in Tornado.
     """
 
-    def __init__(self, host, port, new_loop, **kwargs):
+    def __init__(self, host, port, new_loop, workers=None, **kwargs):
         self._new_loop = new_loop
+        self._workers = workers
+        self._worker_id = None
         self._app = None
         self._server = None
-        self._get_io_loop()
+        if workers is None:
+            self._get_io_loop()
+        elif host is False:
+            raise ValueError('Cannot run multiple workers if host is False.')
         super().__init__(host, port, **kwargs)
 
     def _get_io_loop(self):
@@ -88,39 +100,68 @@ class TornadoServer(AbstractServer):
         self._app = Application([(r"/flexx/ws/(.*)", WSHandler),
                                  (r"/flexx/(.*)", MainHandler),
                                  (r"/(.*)", AppHandler), ], **app_kwargs)
-        # Create tornado server, bound to our own ioloop
-        self._server = HTTPServer(self._app, io_loop=self._loop, **kwargs)
 
-        # Start server (find free port number if port not given)
+        # Bind sockets (find free port number if port not given)
         if port:
             # Turn port into int, use hashed port number if a string was given
             try:
                 port = int(port)
             except ValueError:
                 port = port_hash(port)
-            self._server.listen(port, host)
+            sockets = netutil.bind_sockets(port, host)
         else:
             # Try N ports in a repeatable range (easier, browser history, etc.)
             prefered_port = port_hash('Flexx')
             for i in range(8):
                 port = prefered_port + i
                 try:
-                    self._server.listen(port, host)
+                    sockets = netutil.bind_sockets(port, host)
                     break
                 except (OSError, IOError):
                     pass  # address already in use
             else:
                 # Ok, let Tornado figure out a port
-                [sock] = netutil.bind_sockets(None, host, family=socket.AF_INET)
-                self._server.add_sockets([sock])
-                port = sock.getsockname()[1]
+                sockets = netutil.bind_sockets(None, host, family=socket.AF_INET)
+                port = sockets[0].getsockname()[1]
+
+        # Create tornado server, bound to our own ioloop
+        if self._workers is None:
+            self._server = HTTPServer(self._app, io_loop=self._loop, **kwargs)
+        else:
+            self._server = self._fork_workers(**kwargs)
+        self._server.add_sockets(sockets)
 
         # Notify address, so its easy to e.g. copy and paste in the browser
         self._serving = self._app._flexx_serving = host, port
         proto = 'http'
         if 'ssl_options' in kwargs:
             proto = 'https'
-        logger.info('Serving apps at %s://%s:%i/' % (proto, host, port))
+        worker = '' if self._worker_id is None else ' (worker %i)' % self._worker_id
+        logger.info('Serving apps at %s://%s:%i/%s' % (proto, host, port, worker))
+
+        self._lag_timeout = None
+        self._measure_loop_lag()
+
+    def _fork_workers(self, **kwargs):
+        # Fork the worker processes, which inherit the listening sockets.
+        # Each worker gets a unix socket via which the other workers can
+        # pass it connections. The IOLoop must be created after forking.
+        if 'ssl_options' in kwargs:
+            raise ValueError('Cannot run multiple workers with SSL.')
+        n = self._workers or process.cpu_count()
+        channels = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+                    for i in range(n)]
+        self._worker_id = worker_id = process.fork_processes(n)
+        set_worker_id(worker_id)
+        for i, (receiver, sender) in enumerate(channels):
+            if i == worker_id:
+                sender.close()
+            else:
+                receiver.close()
+        self._get_io_loop()
+        self._app.add_transform(CloseConnectionTransform)
+        return WorkerHTTPServer(self._app, worker_id, channels, io_loop=self._loop,
+                                **kwargs)
 
     def _start(self):
         # Ensure that our loop is the current loop for this thread
@@ -142,6 +183,18 @@ class TornadoServer(AbstractServer):
 
     def _close(self):
         self._server.stop()
+        if self._lag_timeout is not None:
+            self._loop.remove_timeout(self._lag_timeout)
+            self._lag_timeout = None
+
+    def _measure_loop_lag(self, expected=None):
+        # Measure how late a periodic callback is called, which indicates
+        # how busy the IOLoop is.
+        now = self._loop.time()
+        if expected is not None:
+            metrics.loop_lag.observe(max(0.0, now - expected))
+        self._lag_timeout = self._loop.call_at(now + 1.0, self._measure_loop_lag,
+                                               now + 1.0)
 
     def call_later(self, delay, callback, *args, **kwargs):
         # We use a wrapper func so that exceptions are processed via our
@@ -176,6 +229,11 @@ class TornadoServer(AbstractServer):
         """ The Tornado HttpServer object being used."""
         return self._server
 
+    @property
+    def worker_id(self):
+        """ The index of this worker process in multi-process mode, or None."""
+        return self._worker_id
+
     @property
     def protocol(self):
         """ Get a string representing served protocol."""
@@ -199,6 +257,112 @@ def port_hash(name):
     return 49152 + (val % 2**14)
 
 
+def get_request_session_id(request_line):
+    """ Get the id of the session that an HTTP request refers to, given
+    its request line (e.g. "GET /flexx/ws/app?session_id=xx HTTP/1.1").
+    Returns an empty string if the request is not for a specific session.
+    """
+    parts = request_line.split(' ')
+    if len(parts) < 2:
+        return ''
+    url = urlparse(parts[1])
+    session_id = parse_qs(url.query).get('session_id', [''])[0]
+    if not session_id:
+        parts = url.path.split('/')  # e.g. /flexx/data/<session_id>/fname
+        if len(parts) > 3 and parts[1] == 'flexx' and parts[2] != 'ws':
+            session_id = '' if parts[3] == 'shared' else parts[3]
+    return session_id
+
+
+class CloseConnectionTransform(OutputTransform):
+    """ Ask the client to close the connection after each response. Used
+    in multi-process mode, because a connection is routed to a worker based
+    on its first request, so it should not be reused for other requests.
+    """
+
+    def transform_first_chunk(self, status_code, headers, chunk, finishing):
+        if status_code != 101:  # don't touch websocket handshakes
+            headers['Connection'] = 'close'
+        return status_code, headers, chunk
+
+
+class WorkerHTTPServer(HTTPServer):
+    """ HTTP server for a worker process in multi-process mode. The
+    workers accept connections on a shared socket. Before a connection is
+    handled, we peek at its request line, and if it is for a session
+    that is owned by another worker, the connection is passed on to that
+    worker via a unix socket.
+    """
+
+    def initialize(self, request_callback, worker_id, channels, **kwargs):
+        super().initialize(request_callback, **kwargs)
+        self._worker_id = worker_id
+        self._channels = channels
+        self._receiver = channels[worker_id][0]
+        self._receiver.setblocking(False)
+        self.io_loop.add_handler(self._receiver.fileno(), self._on_passed_connection,
+                                 IOLoop.READ)
+
+    def stop(self):
+        super().stop()
+        self.io_loop.remove_handler(self._receiver.fileno())
+        self._receiver.close()
+
+    def _handle_connection(self, connection, address):
+        # Wait until the request line is available
+        self.io_loop.add_handler(connection.fileno(),
+                                 lambda fd, events: self._route(connection, address),
+                                 IOLoop.READ)
+
+    def _route(self, connection, address, attempt=0):
+        if attempt == 0:
+            self.io_loop.remove_handler(connection.fileno())
+        try:
+            data = connection.recv(4096, socket.MSG_PEEK)
+        except (socket.error, IOError):
+            data = b''
+        if not data:
+            connection.close()
+            return
+        elif b'\n' not in data and len(data) < 4096 and attempt < 100:
+            # Incomplete request line, check again soon, up to ~1 s
+            self.io_loop.call_later(0.01, self._route, connection, address,
+                                    attempt + 1)
+            return
+        # Hand the connection to the worker that owns the session
+        line = data.split(b'\n', 1)[0].decode('latin-1')
+        worker_id = get_session_worker(get_request_session_id(line))
+        if worker_id is not None and worker_id != self._worker_id and \
+                worker_id < len(self._channels):
+            try:
+                fds = array('i', [connection.fileno()])
+                self._channels[worker_id][1].sendmsg(
+                    [json.dumps(address).encode()],
+                    [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+            except (socket.error, IOError) as err:
+                logger.warn('Could not pass connection to worker %i: %s' %
+                            (worker_id, err))
+            else:
+                connection.close()  # the other worker has its own copy
+                return
+        super()._handle_connection(connection, address)
+
+    def _on_passed_connection(self, fd, events):
+        fd_size = array('i').itemsize
+        while True:
+            try:
+                msg, ancdata, _, _ = self._receiver.recvmsg(
+                    1024, socket.CMSG_LEN(fd_size))
+            except (BlockingIOError, InterruptedError):
+                return
+            for level, type, data in ancdata:
+                if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS:
+                    connection = socket.socket(fileno=array('i', data[:fd_size])[0])
+                    connection.setblocking(False)
+                    address = tuple(json.loads(msg.decode()))
+                    super()._handle_connection(connection, address)
+
+
 class FlexxHandler(RequestHandler):
     """ Base class for Flexx' Tornado request handlers.
     """
@@ -322,6 +486,94 @@ class AppHandler(FlexxHandler):
             self.write(get_page(session).encode())
 
 
+class AssetCache:
+    """ In-memory cache for the encoded source of shared assets. For
+    each asset we keep the utf-8 encoded source, a hash to use as the
+    ETag, and lazily created compressed variants. An entry is renewed
+    when the asset produces a different source string (assets and
+    bundles return the same string object as long as they don't change).
+    """
+
+    ENCODINGS = 'gzip', 'deflate'
+    MIN_COMPRESS_SIZE = 1024
+
+    def __init__(self):
+        self._entries = {}  # name -> (source, hash, variants)
+
+    def _get_entry(self, name, source):
+        entry = self._entries.get(name, None)
+        if entry is None or entry[0] is not source:
+            data = source.encode()
+            entry = source, hashlib.sha1(data).hexdigest(), {'identity': data}
+            self._entries[name] = entry
+        return entry
+
+    def get(self, name, source, accept_encoding=''):
+        """ Get a tuple (data, encoding, etag) for the asset with the
+        given name and source string. The encoding is selected from the
+        given Accept-Encoding header value, and is 'identity' if no
+        compression is applied.
+        """
+        entry = self._entries.get(name, None)
+        hit = entry is not None and entry[0] is source
+        source, hash, variants = entry if hit else self._get_entry(name, source)
+        encoding = 'identity'
+        if len(variants['identity']) >= self.MIN_COMPRESS_SIZE:
+            encoding = select_encoding(accept_encoding, self.ENCODINGS)
+        if encoding not in variants:
+            hit = False
+            variants[encoding] = compress(variants['identity'], encoding)
+        metrics.asset_cache.inc(('hit' if hit else 'miss', ))
+        # A strong ETag must differ between encodings of the same resource
+        etag = hash if encoding == 'identity' else hash + '-' + encoding
+        return variants[encoding], encoding, '"%s"' % etag
+
+    def clear(self):
+        """ Remove all entries from the cache.
+        """
+        self._entries.clear()
+
+
+def select_encoding(accept_encoding, encodings):
+    """ Select the first of the given encodings that is accepted
+    according to the given Accept-Encoding header value. Returns
+    'identity' if none of the encodings is acceptable.
+    """
+    accepted = set()
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.partition(';')
+        name, params = name.strip(), params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name)
+    for encoding in encodings:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return 'identity'
+
+
+def compress(data, encoding):
+    """ Compress the given bytes using 'gzip' or 'deflate'.
+    """
+    if encoding == 'gzip':
+        # Write via GzipFile to set mtime, so that the result is reproducible
+        f = io.BytesIO()
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+        return f.getvalue()
+    elif encoding == 'deflate':
+        return zlib.compress(data, 9)
+    else:
+        raise ValueError('Invalid encoding %r' % encoding)
+
+
+asset_cache = AssetCache()
+
+
 class MainHandler(RequestHandler):
     """ Handler for assets, commands, etc. Basically, everything for
     which te path is clear.
@@ -343,7 +595,8 @@ class MainHandler(RequestHandler):
         # Note: invalid app name can mean its a path relative to the main app
         parts = [p for p in full_path.split('/') if p]
         if not parts:
-            return self.write('Root url for flexx: assets, assetview, data, cmd')
+            return self.write('Root url for flexx: assets, assetview, data, '
+                              'info, metrics, cmd')
         selector = parts[0]
         path = '/'.join(parts[1:])
 
@@ -351,6 +604,8 @@ class MainHandler(RequestHandler):
             self._get_asset(selector, path)  # JS, CSS, or data
         elif selector == 'info':
             self._get_info(selector, path)
+        elif selector == 'metrics':
+            self._get_metrics(selector, path)
         elif selector == 'cmd':
             self._get_cmd(selector, path)  # Execute (or ignore) command
         else:
@@ -383,14 +638,24 @@ class MainHandler(RequestHandler):
                 return self.redirect('/flexx/assetview/%s/%s#L%s' %
                     (session_id or 'shared', fname.replace('/:', ':'), where))
 
-            # Retrieve asset
+            # Retrieve asset, the name may have a content hash
             try:
                 res = asset_provider.get_asset(filename)
+                fingerprint = ''
             except KeyError:
+                filename, fingerprint = split_fingerprint(filename)
+                try:
+                    res = asset_provider.get_asset(filename) if fingerprint else None
+                except KeyError:
+                    res = None
+            if res is None:
                 self.write('Could not load asset %r' % filename)
             else:
+                # Fingerprinted URLs are immutable. On a mismatch, e.g.
+                # after a redeploy, we serve the current version.
+                immutable = bool(fingerprint) and fingerprint == res.content_hash
                 self._guess_mime_type(filename)
-                self.write(res.to_string())
+                self._write_asset(filename, res.to_string(), immutable)
 
         elif selector == 'assetview':
 
@@ -429,23 +694,76 @@ class MainHandler(RequestHandler):
         else:
             raise RuntimeError('Invalid asset type %r' % selector)
 
+    def _write_asset(self, filename, source, immutable=False):
+        """ Write the source of a shared asset, compressed if the client
+        accepts it, and with an ETag so that clients can revalidate their
+        cached version (in which case we reply with 304 Not Modified).
+        Immutable assets (with a fingerprinted URL) can be cached for a year.
+        """
+        accept_encoding = self.request.headers.get('Accept-Encoding', '')
+        data, encoding, etag = asset_cache.get(filename, source, accept_encoding)
+        self.set_header('Etag', etag)
+        if immutable:
+            self.set_header('Cache-Control',
+                            'public, max-age=31536000, immutable')
+        else:
+            self.set_header('Cache-Control', 'public, no-cache')
+        self.set_header('Vary', 'Accept-Encoding')
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        if encoding != 'identity':
+            self.set_header('Content-Encoding', encoding)
+        self.write(data)
+
     def _get_info(self, selector, info):
         """ Provide some rudimentary information about the server.
         Note that this is publicly accesible.
         """
         runtime = time.time() - IMPORT_TIME
         napps = len(manager.get_app_names())
-        nsessions = sum([len(manager.get_connections(x))
-                         for x in manager.get_app_names()])
+        sessions = [s for x in manager.get_app_names()
+                    for s in manager.get_connections(x)]
+        websockets = [s._ws for s in sessions if isinstance(s._ws, WSHandler)]
 
         info = []
         info.append('Runtime: %1.1f s' % runtime)
         info.append('Number of apps: %i' % napps)
-        info.append('Number of sessions: %i' % nsessions)
+        info.append('Number of sessions: %i' % len(sessions))
+        info.append('Bytes waiting to be written: %i' %
+                    sum([ws.write_buffer_size for ws in websockets]))
+        info.append('Commands held back: %i' %
+                    sum([ws.held_commands for ws in websockets]))
 
         info = '\n'.join(['<li>%s</li>' % i for i in info])
         self.write('<ul>' + info + '</ul>')
 
+    def _get_metrics(self, selector, path):
+        """ Provide metrics in the Prometheus text format. Like the info,
+        this is publicly accessible.
+        """
+        metrics.sessions.clear()
+        metrics.ws_buffered.clear()
+        metrics.ws_held.clear()
+        metrics.pending_commands.clear()
+        for name in manager.get_app_names():
+            for state, count in manager.get_session_counts(name).items():
+                metrics.sessions.set((name, state), count)
+            websockets = [s._ws for s in manager.get_connections(name)
+                          if isinstance(s._ws, WSHandler)]
+            metrics.ws_buffered.set((name, ),
+                                    sum([ws.write_buffer_size for ws in websockets]))
+            metrics.ws_held.set((name, ),
+                                sum([ws.held_commands for ws in websockets]))
+            pending = manager.get_pending_sessions(name)
+            metrics.pending_commands.set((name, ),
+                                         sum([s.pending_commands for s in pending]))
+        metrics.sessions_served.set((), manager.total_sessions)
+        metrics.uptime.set((), time.time() - IMPORT_TIME)
+
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(metrics.render())
+
     def _get_cmd(self, selector, path):
         """ Allow control of the server using http, but only from localhost!
         """
@@ -470,14 +788,84 @@ class MainHandler(RequestHandler):
             self.write('unknown command %r' % path)
 
 
+class TimerWheel:
+    """ Scheduler for periodic work on many objects, like the pings and
+    timeout checks of all websocket connections. Instead of using a
+    timer (or coroutine) per task, tasks are put in the slots of a hashed
+    timer wheel. The wheel advances one slot per tick, and calls the
+    tasks in that slot in a single sweep. Tasks that are due in more
+    than one revolution have a count of remaining rounds. The wheel only
+    ticks while it has tasks.
+    """
+
+    def __init__(self, loop, tick=0.1, size=128):
+        self._loop = loop
+        self._tick = tick
+        self._slots = [[] for i in range(size)]
+        self._index = 0  # the slot that was swept last
+        self._count = 0
+        self._running = False
+
+    def __len__(self):
+        return self._count
+
+    def add(self, delay, callback):
+        """ Call the given callback after approximately the given delay
+        (in seconds). If the callback returns a number, it is called again
+        after that many seconds. If it returns None, it is removed.
+        """
+        ticks = max(1, int(round(delay / self._tick)))
+        size = len(self._slots)
+        self._slots[(self._index + ticks) % size].append([(ticks - 1) // size,
+                                                          callback])
+        self._count += 1
+        if not self._running:
+            self._running = True
+            self._loop.call_later(self._tick, self._sweep)
+
+    def _sweep(self):
+        self._index = (self._index + 1) % len(self._slots)
+        entries, self._slots[self._index] = self._slots[self._index], []
+        for entry in entries:
+            if entry[0] > 0:
+                entry[0] -= 1
+                self._slots[self._index].append(entry)
+                continue
+            self._count -= 1
+            try:
+                delay = entry[1]()
+            except Exception as err:
+                logger.exception(err)
+                delay = None
+            if delay is not None:
+                self.add(delay, entry[1])
+        if self._count:
+            self._loop.call_later(self._tick, self._sweep)
+        else:
+            self._running = False
+
+
+_timer_wheels = weakref.WeakKeyDictionary()
+
+def get_timer_wheel(loop=None):
+    """ Get the timer wheel for the given (or current) IOLoop.
+    """
+    loop = loop or IOLoop.current()
+    wheel = _timer_wheels.get(loop, None)
+    if wheel is None:
+        wheel = _timer_wheels[loop] = TimerWheel(loop)
+    return wheel
+
+
 class MessageCounter:
     """ Simple class to count incoming messages and periodically log
     the number of messages per second.
     """
 
+    notify_interval = 3.0  # period on which to log the mps
+
     def __init__(self):
         self._collect_interval = 0.2  # period over which to collect messages
-        self._notify_interval = 3.0  # period on which to log the mps
         self._window_interval = 4.0  # size of sliding window
 
         self._mps = [(time.time(), 0)]  # tuples of (time, count)
@@ -485,7 +873,6 @@ class MessageCounter:
         self._collect_stoptime = 0
 
         self._stop = False
-        self._notify()
 
     def trigger(self):
         t = time.time()
@@ -496,7 +883,12 @@ class MessageCounter:
             self._collect_count = 1
             self._collect_stoptime = t + self._collect_interval
 
-    def _notify(self):
+    def notify(self):
+        """ Log the number of messages per second. Returns the time until
+        the next notification (for the timer wheel), or None if stopped.
+        """
+        if self._stop:
+            return None
         mintime = time.time() - self._window_interval
         self._mps = [x for x in self._mps if x[0] > mintime]
         if self._mps:
@@ -505,15 +897,64 @@ class MessageCounter:
         else:
             n, T = 0, self._collect_interval
         logger.debug('Websocket messages per second: %1.1f' % (n / T))
-
-        if not self._stop:
-            loop = IOLoop.current()
-            loop.call_later(self._notify_interval, self._notify)
+        return self.notify_interval
 
     def stop(self):
         self._stop = True
 
 
+def merge_commands(commands):
+    """ Merge consecutive structured commands of the same kind (e.g.
+    SET_PROPS) into one command. Returns a new list of commands.
+    """
+    merged = []
+    for cmd in commands:
+        if not isinstance(cmd, tuple):
+            merged.append(cmd)
+        elif merged and isinstance(merged[-1], tuple) and merged[-1][0] == cmd[0]:
+            merged[-1][1].extend(cmd[1])
+        else:
+            merged.append((cmd[0], list(cmd[1])))
+    return merged
+
+
+def coalesce_commands(commands, drop_events=False):
+    """ Reduce a list of commands for a client that does not keep up.
+    A property update (SET_PROPS) supersedes earlier updates and mutations
+    (MUTATE) of the same property, so that only the latest value is sent.
+    If drop_events is True, events (EMIT) are dropped too. Returns a new
+    list of commands.
+    """
+    # Get the position of the last update of each property
+    latest = {}
+    for i, cmd in enumerate(commands):
+        if isinstance(cmd, tuple) and cmd[0] == 'SET_PROPS':
+            for j, item in enumerate(cmd[1]):
+                latest[(item[0], item[1])] = i, j
+    # Collect what remains
+    coalesced = []
+    for i, cmd in enumerate(commands):
+        if not isinstance(cmd, tuple):
+            coalesced.append(cmd)
+        elif cmd[0] in ('SET_PROPS', 'MUTATE'):
+            items = [item for j, item in enumerate(cmd[1])
+                     if latest.get((item[0], item[1]), (i, j)) <= (i, j)]
+            if items:
+                coalesced.append((cmd[0], items))
+        elif not (drop_events and cmd[0] == 'EMIT'):
+            coalesced.append(cmd)
+    return merge_commands(coalesced)
+
+
+def json_default(ob):
+    """ Fallback for the binary codec, for objects that define __json__.
+    """
+    try:
+        return ob.__json__()
+    except AttributeError:
+        raise TypeError('Cannot serialize object: %r' % ob)
+
+
 class WSHandler(WebSocketHandler):
     """ Handler for websocket.
     """
@@ -525,6 +966,9 @@ class WSHandler(WebSocketHandler):
                      1003: 'could not accept data',
                      }
 
+    # The max size of the frames in which data (send_data()) is sent
+    DATA_CHUNK_SIZE = 2**18
+
     # --- callbacks
 
     def open(self, path=None):
@@ -535,6 +979,17 @@ class WSHandler(WebSocketHandler):
 
         self._session = None
         self._mps_counter = MessageCounter()
+        self._loop = IOLoop.current()
+        self._command_buffer = []
+        self._command_limit = 0  # coalesce held commands above this length
+        self._holding = False  # whether commands are held back
+        self._released = Event()  # set when commands are no longer held back
+        self._released.set()
+        self._write_buffer_size = 0
+        self._codec = None
+        self._data_queue = deque()
+        self._data_sending = False  # whether _send_data_queue() is running
+        self._data_count = 0
 
         # Don't collect messages to send them more efficiently, just send asap
         # self.set_nodelay(True)
@@ -545,8 +1000,17 @@ class WSHandler(WebSocketHandler):
 
         logger.debug('New websocket connection %s' % path)
         if manager.has_app_name(self.app_name):
-            IOLoop.current().spawn_callback(self.pinger1)
-            IOLoop.current().spawn_callback(self.pinger2)
+            # Periodic tasks are driven by a timer wheel shared by all
+            # connections, so a connection does not need its own timers.
+            self._pongtime = self._pingtime = time.time()
+            self._iters_since_ping = 0
+            self._ping_counter = self._pong_counter = 0
+            self.ping(b'x')
+            self.pinger2()
+            wheel = get_timer_wheel(self._loop)
+            wheel.add(config.ws_timeout / 5, self.pinger1)
+            wheel.add(1.0, self.pinger2)
+            wheel.add(MessageCounter.notify_interval, self._mps_counter.notify)
         else:
             self.close(1003, "Could not associate socket with an app.")
 
@@ -560,11 +1024,17 @@ class WSHandler(WebSocketHandler):
         we should at some point define a real formalized protocol.
         """
         self._mps_counter.trigger()
+        metrics.ws_frames.inc((self.app_name, 'in'))
+        metrics.ws_bytes.inc((self.app_name, 'in'), len(message))
 
         self._pongtime = time.time()
         if self._session is None:
             if message.startswith('hiflexx '):
-                session_id = message.split(' ', 1)[1].strip()
+                # "hiflexx <session_id> [<codec1>,<codec2>,...]"
+                parts = message.split(' ')
+                session_id = parts[1].strip()
+                if len(parts) > 2:
+                    self.set_codec(parts[2].strip().split(','))
                 try:
                     self._session = manager.connect_client(self, self.app_name,
                                                            session_id,
@@ -572,7 +1042,7 @@ class WSHandler(WebSocketHandler):
                 except Exception as err:
                     self.close(1003, "Could not launch app: %r" % err)
                     raise
-                self.write_message("PRINT Flexx server says hi", binary=BINARY)
+                self.command('PRINT Flexx server says hi')
         elif message.startswith('PONG '):
             self.on_pong2(message[5:])
         else:
@@ -589,11 +1059,11 @@ class WSHandler(WebSocketHandler):
         reason = self.close_reason or self.known_reasons.get(code, '')
         logger.debug('Websocket closed: %s (%i)' % (reason, code))
         self._mps_counter.stop()
+        self._released.set()  # stop waiting to send data
         if self._session is not None:
             manager.disconnect_client(self._session)
             self._session = None  # Allow cleaning up
 
-    @gen.coroutine
     def pinger1(self):
         """ Check for timeouts. This helps remove lingering false connections.
 
@@ -601,31 +1071,31 @@ class WSHandler(WebSocketHandler):
         browser side, pongs work even if JS is busy. On the Python side
         we perform a check whether we were really waiting or whether Python
         was too busy to detect the pong.
+
+        Called by the timer wheel. Returns the time until the next check,
+        or None when the connection is closed.
         """
-        self._pongtime = time.time()
-        self._pingtime = pingtime = 0
-
-        while self.close_code is None:
-            dt = config.ws_timeout
-
-            # Ping, but don't spam
-            if pingtime <= self._pongtime:
-                self.ping(b'x')
-                pingtime = self._pingtime = time.time()
-                iters_since_ping = 0
-
-            yield gen.sleep(dt / 5)
-
-            # Check pong status
-            iters_since_ping += 1
-            if iters_since_ping < 5:
-                pass  # we might have missed the pong
-            elif time.time() - self._pongtime > dt:
-                # Delay is so big that connection probably dropped.
-                # Note that a browser sends a pong even if JS is busy
-                logger.warn('Closing connection due to lack of pong')
-                self.close(1000, 'Conection timed out (no pong).')
-                return
+        if self.close_code is not None:
+            return None
+        dt = config.ws_timeout
+
+        # Check pong status
+        self._iters_since_ping += 1
+        if self._iters_since_ping < 5:
+            pass  # we might have missed the pong
+        elif time.time() - self._pongtime > dt:
+            # Delay is so big that connection probably dropped.
+            # Note that a browser sends a pong even if JS is busy
+            logger.warn('Closing connection due to lack of pong')
+            self.close(1000, 'Conection timed out (no pong).')
+            return None
+
+        # Ping, but don't spam
+        if self._pingtime <= self._pongtime:
+            self.ping(b'x')
+            self._pingtime = time.time()
+            self._iters_since_ping = 0
+        return dt / 5
 
     def on_pong(self, data):
         """ Implement the ws's on_pong() method. Called when our ping
@@ -640,7 +1110,6 @@ class WSHandler(WebSocketHandler):
         """
         return self._ping_counter
 
-    @gen.coroutine
     def pinger2(self):
         """ Ticker so we have a signal of sorts to indicate round-trips.
 
@@ -651,14 +1120,16 @@ class WSHandler(WebSocketHandler):
         This uses a ping-pong mechanism implemented *atop* the websocket.
         When JS is working, it is not able to send a pong (which is what we
         want in this case).
+
+        Called by the timer wheel. Returns the time until the next tick,
+        or None when the connection is closed.
         """
-        self._ping_counter = 0
-        self._pong_counter = 0
-        while self.close_code is None:
-            if self._pong_counter >= self._ping_counter:
-                self._ping_counter += 1
-                self.command('PING %i' % self._ping_counter)
-            yield gen.sleep(1.0)
+        if self.close_code is not None:
+            return None
+        if self._pong_counter >= self._ping_counter:
+            self._ping_counter += 1
+            self.command('PING %i' % self._ping_counter)
+        return 1.0
 
     def on_pong2(self, data):
         """ Called when our ping is returned by Flexx.
@@ -669,8 +1140,160 @@ class WSHandler(WebSocketHandler):
 
     # --- methods
 
+    @property
+    def codec(self):
+        """ The codec for binary frames, or None if the client does not
+        support any of our codecs.
+        """
+        return self._codec
+
+    def set_codec(self, names):
+        """ Select a codec from the given names, announced by the client.
+        If there is a match, the client is notified. The codec is used to
+        send data (see ``send_data()``), and also commands if
+        ``config.ws_binary`` is set.
+        """
+        cls = select_codec(names)
+        if cls is not None:
+            self.write_message('CODEC ' + cls.name)
+            self._codec = cls(default=json_default)
+            logger.debug('Using %s codec for websocket' % cls.name)
+
     def command(self, cmd):
-        self.write_message(cmd, binary=BINARY)
+        """ Send a command to the client. Commands issued within one
+        iteration of the event loop are sent together in a single frame.
+        """
+        self._command_buffer.append(cmd)
+        if len(self._command_buffer) == 1:
+            self._loop.add_callback(self.flush_commands)
+        elif self._holding and len(self._command_buffer) > self._command_limit:
+            self._coalesce_commands()
+
+    def flush_commands(self):
+        """ Send the buffered commands. Consecutive structured commands
+        of the same kind (e.g. SET_PROPS) are merged. In text mode,
+        multiple commands are combined in a "MULTI" command that holds a
+        JSON encoded list of commands. In binary mode, the frame holds the
+        encoded list of commands, where structured commands are [kind, items]
+        lists.
+
+        If more than ``config.ws_high_water_mark`` bytes are waiting to be
+        written, the commands are held back until the client catches up,
+        and are meanwhile reduced with ``coalesce_commands()``.
+        """
+        if self._holding or self._write_buffer_size > config.ws_high_water_mark:
+            if not self._holding:
+                logger.debug('Client is slow, holding back commands')
+                self._holding = True
+                self._released.clear()
+            self._coalesce_commands()
+            return
+        commands, self._command_buffer = self._command_buffer, []
+        if not commands or self.ws_connection is None:
+            return
+        commands = merge_commands(commands)
+        if self._codec is not None and config.ws_binary:
+            commands = [list(c) if isinstance(c, tuple) else c for c in commands]
+            self._write(self._codec.encode(commands), True)
+            return
+        commands = [command_to_text(c) for c in commands]
+        if len(commands) == 1:
+            self._write(commands[0])
+        else:
+            self._write('MULTI ' + json.dumps(commands))
+
+    def _coalesce_commands(self):
+        self._command_buffer = coalesce_commands(self._command_buffer,
+                                                 config.ws_drop_events)
+        self._command_limit = 2 * len(self._command_buffer) + 64
+
+    def _write(self, message, binary=False):
+        # Write a message, keeping track of the size of the write buffer
+        size = len(message)
+        metrics.ws_frames.inc((self.app_name, 'out'))
+        metrics.ws_bytes.inc((self.app_name, 'out'), size)
+        future = self.write_message(message, binary=binary)
+        self._write_buffer_size += size
+        future.add_done_callback(lambda f: self._on_written(size))
+        return future
+
+    def _on_written(self, size):
+        self._write_buffer_size -= size
+        if self._holding and self._write_buffer_size <= config.ws_high_water_mark // 2:
+            logger.debug('Client caught up, sending held back commands')
+            self._holding = False
+            self._coalesce_commands()
+            self.flush_commands()
+            self._released.set()
+
+    @property
+    def write_buffer_size(self):
+        """ The (approximate) number of bytes that are waiting to be written
+        to the client.
+        """
+        return self._write_buffer_size
+
+    @property
+    def held_commands(self):
+        """ The number of commands that are held back because the client
+        does not keep up.
+        """
+        return len(self._command_buffer) if self._holding else 0
+
+    def send_data(self, id, data, meta):
+        """ Send a blob of data to the model with the given id, whose
+        ``receive_data()`` is then called in JS. Requires a codec. Large
+        data is sent in chunks. Each chunk is only sent when the previous
+        one has been written to the socket, so that we don't buffer more
+        than needed, and other commands can be sent in between. Returns a
+        Future that resolves to True when all data has been written, or
+        to False if the connection closed before that. While commands are
+        held back (see ``flush_commands()``), the data waits for them.
+        """
+        assert self._codec is not None
+        future = Future()
+        self._data_queue.append((id, memoryview(data).cast('B'), meta, future))
+        if not self._data_sending:
+            self._data_sending = True
+            self._loop.spawn_callback(self._send_data_queue)
+        return future
+
+    @property
+    def pending_data_size(self):
+        """ The number of bytes that are queued by ``send_data()``.
+        Producers can use this to drop or delay data.
+        """
+        return sum(len(item[1]) for item in self._data_queue)
+
+    @gen.coroutine
+    def _send_data_queue(self):
+        size = self.DATA_CHUNK_SIZE
+        try:
+            while self._data_queue:
+                # Send the buffered commands first, so the model exists in
+                # JS. Held back commands go first when the client catches up.
+                self.flush_commands()
+                while self._holding and self.close_code is None:
+                    yield self._released.wait()
+                if self.close_code is not None:
+                    raise WebSocketClosedError()
+                id, data, meta, future = self._data_queue[0]
+                self._data_count += 1
+                key = self._data_count
+                n = max(1, (len(data) + size - 1) // size)
+                for i in range(n):
+                    chunk = data[i * size:(i + 1) * size].tobytes()
+                    item = [key, i, n, id, meta, chunk]
+                    frame = self._codec.encode([['DATA', item]])
+                    yield self._write(frame, True)
+                self._data_queue.popleft()
+                future.set_result(True)
+        except (WebSocketClosedError, StreamClosedError):
+            logger.debug('Connection closed while sending data')
+            while self._data_queue:
+                self._data_queue.popleft()[-1].set_result(False)
+        finally:
+            self._data_sending = False
 
     def close(self, *args):
         try:
@@ -681,6 +1304,7 @@ class WSHandler(WebSocketHandler):
     def close_this(self):
         """ Call this to close the websocket
         """
+        self.flush_commands()
         self.close(1000, 'closed by server')
 
     def check_origin(self, origin):
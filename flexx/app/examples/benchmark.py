@@ -7,6 +7,12 @@ than CPython and for some tests on par with Pypy.
 
 See also http://brythonista.wordpress.com/2015/03/28
 
+Use "python benchmark.py node" to run the PyScript benchmarks in Node.js
+instead of in a browser. This also reports how many calls to the generic
+operator functions of PyScript (e.g. ``op_add``) remain in the code; the
+other operations are translated to native JS operators, because PyScript
+can infer that the operands are numbers or strings.
+
 """
 
 # Measured results, in pystones/second, measured on 05-03-2016,
@@ -24,6 +30,7 @@ RESULTS = [(124863, 'CPython 3.4', 'blue'),
            ]
 
 import sys
+import inspect
 from time import time
 import platform
 from test.pystone import main as pystone_main
@@ -181,6 +188,23 @@ class Benchmarker(app.Model):
             bench_str()
 
 
-b = app.launch(Benchmarker, BACKEND)
-b.benchmark()
-app.run()
+def benchmark_node():
+    from flexx.pyscript import py2js, evaljs
+    
+    code = py2js(inspect.getsource(pystone))
+    code += py2js(convolve) + py2js(bench_str)
+    for name in ('op_add', 'op_mult', 'op_equals', 'truthy'):
+        n = code.count('_pyfunc_%s(' % name)
+        print('Calls to %s in transpiled code: %i' % (name, n))
+    
+    print('\n==== PyScript on Node.js =====\n')
+    code = 'var window = global;\n' + code + '\nmain(); convolve(); bench_str();'
+    print(evaljs(code, print_result=False))
+
+
+if BACKEND == 'node':
+    benchmark_node()
+else:
+    b = app.launch(Benchmarker, BACKEND)
+    b.benchmark()
+    app.run()
@@ -0,0 +1,48 @@
+"""
+Benchmark the time it takes to import flexx.ui, with and without lazy
+generation of the JS code for Model classes (``flexx.config.lazy_js``).
+
+In lazy mode the JS of a class is generated when it is first needed
+(e.g. when a session uses it), so importing only costs the creation
+of the Python classes. The second column shows the time it takes to
+generate the JS for all classes afterwards, i.e. the cost that is
+moved from import time to the first time that the JS is needed.
+
+Set ``FLEXX_PYSCRIPT_CACHE`` to also see the effect of the transpile cache.
+"""
+
+import os
+import sys
+import subprocess
+
+N = 5
+
+CODE = """
+import time
+t0 = time.perf_counter()
+import flexx.ui
+t1 = time.perf_counter()
+from flexx import app
+for cls in app.Model.CLASSES:
+    cls.JS.CODE
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+"""
+
+
+def measure(lazy):
+    env = os.environ.copy()
+    env['FLEXX_LAZY_JS'] = str(int(lazy))
+    env['FLEXX_LOG_LEVEL'] = 'warning'
+    times = []
+    for i in range(N):
+        out = subprocess.check_output([sys.executable, '-c', CODE], env=env)
+        times.append([float(x) for x in out.decode().split()[-2:]])
+    return min(t[0] for t in times), min(t[1] for t in times)
+
+
+if __name__ == '__main__':
+    print('%-12s %12s %12s' % ('mode', 'import (s)', 'all JS (s)'))
+    for lazy in (False, True):
+        t_import, t_js = measure(lazy)
+        print('%-12s %12.3f %12.3f' % ('lazy' if lazy else 'eager', t_import, t_js))
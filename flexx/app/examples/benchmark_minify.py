@@ -0,0 +1,114 @@
+"""
+Benchmark the minification of the full flexx.ui.js bundle, comparing
+``flexx.util.minify`` (per level of ``flexx.config.minify_js``) with the
+previous minifier, which only removed comments and indentation by
+walking the code one character at a time. The previous implementation
+is included below for reference.
+
+The last column shows the time it takes Node.js to parse the result.
+"""
+
+import json
+import time
+
+from flexx import app, ui  # noqa
+from flexx.util.minify import minify
+from flexx.pyscript import evaljs
+
+N = 5
+
+
+def old_minify(code):
+    # The previous implementation of flexx.util.minify.minify()
+    chars = ['\n']
+    class non_local:
+        pass
+    non_local._i = -1
+    
+    def read():
+        non_local._i += 1
+        if non_local._i < len(code):
+            return code[non_local._i]
+    def to_end_of_string(c0):
+        chars.append(c0)
+        while True:
+            c = read()
+            if not c:
+                break
+            chars.append(c)
+            if c == c0 and chars[-2] != '\\':
+                return
+    def to_end_of_line():
+        while True:
+            c = read()
+            if c == '\n' or not c:
+                break
+    def to_end_of_mutiline_comment():
+        lastchar = ''
+        while True:
+            c = read()
+            if not c:
+                break
+            if c == '/' and lastchar == '*':
+                return
+            lastchar = c
+    while True:
+        c = read()
+        if not c:
+            break  # end of code
+        elif c == "'" or c == '"':
+            to_end_of_string(c)
+        elif c == '/' and chars[-1] == '/' and chars[-2] != '\\':
+            chars.pop(-1)
+            to_end_of_line()
+            chars.append('\n')
+        elif c == '*' and chars[-1] == '/':
+            chars.pop(-1)
+            to_end_of_mutiline_comment()
+        else:
+            chars.append(c)
+    chars.pop(0)
+    code = ''.join(chars)
+    lines = []
+    for line in code.splitlines():
+        line = line.rstrip()
+        if line:
+            line2 = line.lstrip(' \t')
+            indent_str = line[:len(line)-len(line2)]
+            for s1, s2 in [('    ', '\t'), ('  ', '\t'), (' ', '')]:
+                indent_str = indent_str.replace(s1, s2)
+            lines.append(indent_str + line2)
+    return '\n'.join(lines)
+
+
+def measure(func, code):
+    times = []
+    for i in range(N):
+        t0 = time.perf_counter()
+        result = func(code)
+        times.append(time.perf_counter() - t0)
+    return result, min(times)
+
+
+def node_parse_time(code):
+    script = ('var t0 = process.hrtime(); new Function(%s); var t = process.hrtime(t0);'
+              'console.log(t[0] + t[1] * 1e-9)')
+    return float(evaljs(script % json.dumps(code), print_result=False))
+
+
+if __name__ == '__main__':
+    app.assets.update_modules()
+    code = app.assets.get_asset('flexx.ui.js').to_string()
+    
+    variants = [('none', lambda c: c),
+                ('previous', old_minify),
+                ('level 0 (indent)', lambda c: minify(c)),
+                ('level 1', lambda c: minify(c, True)),
+                ('level 2', lambda c: minify(c, True, True)),
+                ]
+    print('%-18s %10s %10s %12s' % ('minifier', 'size (kB)', 'time (s)', 'parse (ms)'))
+    for name, func in variants:
+        result, t = measure(func, code)
+        t_parse = node_parse_time(result)
+        print('%-18s %10.1f %10.3f %12.2f' % (name, len(result) / 1024, t,
+                                              t_parse * 1000))
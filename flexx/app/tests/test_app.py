@@ -1,6 +1,9 @@
+import time
+
 from flexx.util.testing import run_tests_if_main, raises
 
 from flexx import app, event
+from flexx.app._app import manager
 
 
 class MyPropClass1(app.Model):
@@ -37,4 +40,98 @@ def test_launching_with_init_args():
     m.session.close()
 
 
+class PooledClass(app.Model):
+    count = 0
+    def init(self):
+        PooledClass.count += 1
+
+
+def test_session_pool():
+    
+    a = app.App(PooledClass)
+    a.serve('pooled', pool_size=2)
+    assert a.pool_size == 2
+    
+    # The pool is filled in the background, one session per iteration
+    pool = manager._session_pools['pooled']
+    manager._refill_session_pools()
+    manager._refill_session_pools()
+    manager._refill_session_pools()
+    assert len(pool) == 2
+    assert PooledClass.count == 2
+    
+    # Pooled sessions are handed out, and only then become pending
+    session = pool[0]
+    session._creation_time = 0
+    assert manager.get_session_by_id(session.id) is None
+    assert manager.create_session('pooled') is session
+    assert manager.get_session_by_id(session.id) is session
+    assert session.status == session.STATUS.PENDING
+    assert time.time() - session._creation_time < 10  # expiry starts now
+    assert len(pool) == 1 and PooledClass.count == 2
+    
+    # And the pool is refilled
+    manager._refill_session_pools()
+    assert len(pool) == 2 and PooledClass.count == 3
+    
+    # Sessions with a specific id are never taken from the pool
+    session = manager.create_session('pooled', 'pooled_session')
+    assert session.id == 'pooled_session' and len(pool) == 2
+    
+    # Without a pool, sessions are created on request
+    b = app.App(PooledClass)
+    b.serve('unpooled')
+    assert b.pool_size == 0
+    manager._refill_session_pools()
+    assert manager._session_pools['unpooled'] == []
+    assert manager.create_session('unpooled').app_name == 'unpooled'
+
+
+class FakeWS:
+    close_code = None
+    def __init__(self):
+        self.commands = []
+    def command(self, cmd):
+        self.commands.append(cmd)
+    def close_this(self):
+        pass
+
+
+def test_session_bookkeeping():
+    
+    a = app.App(PooledClass)
+    a.serve('BookKeeping')
+    assert manager.has_app_name('bookkeeping') == 'BookKeeping'
+    assert manager.has_app_name('BOOKKEEPING') == 'BookKeeping'
+    assert manager.has_app_name('bookkeeping2') is None
+    
+    # Sessions are pending until connected
+    s1 = manager.create_session('BookKeeping')
+    s2 = manager.create_session('BookKeeping')
+    with raises(RuntimeError):
+        manager.connect_client(FakeWS(), 'BookKeeping', 'not_an_id')
+    assert manager.connect_client(FakeWS(), 'BookKeeping', s2.id) is s2
+    assert s2.status == s2.STATUS.CONNECTED
+    with raises(RuntimeError):
+        manager.connect_client(FakeWS(), 'BookKeeping', s2.id)  # not pending
+    assert manager.get_connections('BookKeeping') == [s2]
+    
+    # Old pending sessions are cleared, connected ones are not
+    t = time.time() - manager.pending_timeout - 1
+    manager._pending_expiry[:] = [(t, id, name) for _, id, name in
+                                  manager._pending_expiry]
+    s3 = manager.create_session('BookKeeping')
+    assert manager.get_session_by_id(s1.id) is None
+    assert manager.get_session_by_id(s2.id) is s2
+    assert manager.get_session_by_id(s3.id) is s3
+    with raises(RuntimeError):
+        manager.connect_client(FakeWS(), 'BookKeeping', s1.id)
+    assert len(manager._pending_expiry) == 1
+    
+    # Disconnecting removes the session
+    manager.disconnect_client(s2)
+    assert manager.get_connections('BookKeeping') == []
+    manager.disconnect_client(s2)  # no-op
+
+
 run_tests_if_main()
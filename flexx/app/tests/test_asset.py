@@ -12,7 +12,9 @@ import shutil
 from flexx.util.testing import run_tests_if_main, raises
 
 from flexx.app._asset import solve_dependencies, get_mod_name, module_is_package
+from flexx.app._asset import split_fingerprint
 from flexx.util.logging import capture_log
+import flexx
 from flexx import ui, app
 
 
@@ -95,6 +97,13 @@ def test_asset():
     assert 'foo-' not in code
     assert '\n' not in code  # becasue its a link
     
+    # Fingerprinted links
+    asset = app.Asset('foo.js', 'foo=3\nbar=3')
+    code = asset.to_html('/x/{}', fingerprint=True)
+    assert "src='/x/%s'" % asset.fingerprinted_name in code
+    assert "id='foo.js'" in code
+    assert 'foo=' in asset.to_html('{}', 0, fingerprint=True)
+    
     # Test asset via uri
     fname = 'file:///home/xx/foobar.css'
     with raises(TypeError):
@@ -103,6 +112,41 @@ def test_asset():
         app.Asset(fname)
 
 
+def test_asset_fingerprint():
+    
+    asset1 = app.Asset('foo.js', 'foo=3')
+    asset2 = app.Asset('foo.js', 'foo=4')
+    asset3 = app.Asset('bar.css', 'foo=3')
+    h = asset1.content_hash
+    assert len(h) == 16 and int(h, 16) >= 0
+    assert asset1.content_hash is h  # cached
+    assert asset2.content_hash != h
+    assert asset3.content_hash == h  # only the content matters
+    
+    assert asset1.fingerprinted_name == 'foo.%s.js' % h
+    assert asset3.fingerprinted_name == 'bar.%s.css' % h
+    name = app.Asset('flexx.ui.js', 'x').fingerprinted_name
+    assert name.startswith('flexx.ui.') and name.endswith('.js')
+    
+    assert split_fingerprint(asset1.fingerprinted_name) == ('foo.js', h)
+    assert split_fingerprint(name)[0] == 'flexx.ui.js'
+    assert split_fingerprint('foo.js') == ('foo.js', '')
+    assert split_fingerprint('flexx.ui.js') == ('flexx.ui.js', '')
+    assert split_fingerprint('foo.94d59b003849f.js')[1] == ''  # too short
+    
+    # Bundles renew their hash when their content changes
+    store = {}
+    m1 = app.JSModule('flexx.ui.widgets._button', store)
+    m1.add_variable('Button')
+    bundle = app.Bundle('flexx.ui.js')
+    bundle.add_module(m1)
+    h1 = bundle.content_hash
+    m2 = app.JSModule('flexx.ui.widgets._tree', store)
+    m2.add_variable('TreeWidget')
+    bundle.add_module(m2)
+    assert bundle.content_hash != h1
+
+
 def test_remote_asset():
     
     # Prepare example asset info
@@ -266,6 +310,61 @@ def test_bundle():
         bundle.add_asset(bundle)  # no bundles
 
 
+def test_bundle_caches_string():
+    
+    from flexx import ui
+    
+    store = {}
+    m1 = app.JSModule('flexx.ui.widgets._button', store)
+    m1.add_variable('Button')
+    
+    bundle = app.Bundle('flexx.ui.js')
+    bundle.add_module(m1)
+    code1 = bundle.to_string()
+    assert bundle.to_string() is code1
+    
+    # Adding a module invalidates the cache
+    m2 = app.JSModule('flexx.ui.widgets._tree', store)
+    m2.add_variable('TreeWidget')
+    bundle.add_module(m2)
+    code2 = bundle.to_string()
+    assert code2 is not code1
+    assert '.TreeWidget =' in code2 and '.TreeWidget =' not in code1
+    assert bundle.to_string() is code2
+    
+    # Resetting the cache of a module does too
+    m1._js_cache = None
+    code3 = bundle.to_string()
+    assert code3 is not code2
+    assert code3 == code2
+
+
+def test_bundle_minify():
+    
+    from flexx import ui
+    
+    store = {}
+    m1 = app.JSModule('flexx.ui.widgets._button', store)
+    m1.add_variable('Button')
+    bundle = app.Bundle('flexx.ui.js')
+    bundle.add_module(m1)
+    code0 = bundle.to_string()
+    
+    # The minified code is cached too, as long as the level is the same
+    try:
+        flexx.config.minify_js = 1
+        code1 = bundle.to_string()
+        assert bundle.to_string() is code1
+        flexx.config.minify_js = 2
+        code2 = bundle.to_string()
+        assert bundle.to_string() is code2
+    finally:
+        flexx.config.minify_js = 0
+    assert bundle.to_string() == code0
+    assert len(code2) < len(code1) < len(code0)
+    assert code1.startswith('/*') and '.Button =' not in code1
+
+
 ## Sorting
 
 
@@ -10,11 +10,12 @@ import tempfile
 import shutil
 
 from flexx.util.testing import run_tests_if_main, raises
+from flexx.util.logging import capture_log
 
 from flexx.app._assetstore import assets, AssetStore as _AssetStore
 from flexx.app._session import Session
 
-from flexx import ui, app
+from flexx import ui, app, config
 
 
 N_STANDARD_ASSETS = 3
@@ -47,6 +48,53 @@ def test_asset_store_collect():
     assert '.Model =' not in s.get_asset('flexx.ui.js').to_string()
 
 
+STD_TEST_MODULE = """
+from flexx import app
+
+class StdTestModel(app.Model):
+    class JS:
+        def foo(self, x):
+            return divmod(x, 3)
+"""
+
+
+def test_asset_store_tree_shake_std():
+    
+    from flexx import ui
+    
+    full = AssetStore().get_asset('pyscript-std.js').to_string()
+    assert '_pyfunc_divmod' in full
+    
+    # Only include the std functions used by the known modules
+    config.tree_shake_std = True
+    try:
+        s = AssetStore()
+        s.update_modules()
+        func_names, method_names = s.get_std_names()
+        assert 'op_instantiate' in func_names and 'divmod' not in func_names
+        code = s.get_asset('pyscript-std.js').to_string()
+    finally:
+        config.tree_shake_std = False
+    assert 'var _pyfunc_op_instantiate' in code
+    assert '_pyfunc_divmod' not in code
+    assert len(code) < 0.8 * len(full)
+    
+    # Modules that are collected later and that need more std give a warning
+    dirname = tempfile.mkdtemp()
+    with open(os.path.join(dirname, 'flxtest_std.py'), 'wb') as f:
+        f.write(STD_TEST_MODULE.encode())
+    sys.path.insert(0, dirname)
+    try:
+        import flxtest_std
+        with capture_log('warning') as logs:
+            s.update_modules()
+        assert len(logs) == 1 and 'divmod' in logs[0]
+    finally:
+        sys.path.remove(dirname)
+        shutil.rmtree(dirname)
+        app.Model.CLASSES.remove(flxtest_std.StdTestModel)
+
+
 def test_asset_store_adding_assets():
     
     s = AssetStore()
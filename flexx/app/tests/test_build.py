@@ -0,0 +1,106 @@
+"""
+Tests for the ahead-of-time build (python -m flexx build).
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+from flexx.util.testing import run_tests_if_main
+from flexx.util.logging import capture_log
+
+from flexx.app._assetstore import AssetStore
+from flexx import ui  # noqa
+import flexx
+
+
+# The app uses flexx.ui, like other tests, so that the modules in flexx-core
+# have the same code in the build and in the test process
+APP_CODE = """
+from flexx import app, ui  # noqa
+
+class BuildTestModel(app.Model):
+
+    class JS:
+        
+        def foo(self):
+            return 42
+"""
+
+
+def test_build():
+
+    dirname = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(dirname, 'flexx_build_test_app.py')
+        builddir = os.path.join(dirname, 'build')
+        with open(filename, 'wb') as f:
+            f.write(APP_CODE.encode())
+        
+        # Build in a subprocess, with two workers
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(flexx.__file__))
+        env.pop('FLEXX_BUILD_DIR', None)
+        out = subprocess.check_output([sys.executable, '-m', 'flexx', 'build',
+                                       filename, builddir, '2'],
+                                      env=env, stderr=subprocess.STDOUT).decode()
+        assert 'built' in out
+        
+        # Check manifest and files
+        with open(os.path.join(builddir, 'manifest.json'), 'rb') as f:
+            manifest = json.loads(f.read().decode())
+        assert manifest['module'] == filename
+        info = manifest['assets']['flexx_build_test_app.js']
+        assert info['modules'] == ['flexx_build_test_app']
+        assert info['filename'].startswith('flexx_build_test_app.')
+        with open(os.path.join(builddir, info['filename']), 'rb') as f:
+            assert 'BuildTestModel' in f.read().decode()
+        assert manifest['assets']['flexx-loader.js']['modules'] == []
+        assert os.listdir(os.path.join(builddir, 'pyscript_cache'))
+        
+        # The std lib is tree-shaken
+        assert 'op_instantiate' in manifest['std_names'][0]
+        assert 'divmod' not in manifest['std_names'][0]
+        info = manifest['assets']['pyscript-std.js']
+        with open(os.path.join(builddir, info['filename']), 'rb') as f:
+            code = f.read().decode()
+        assert '_pyfunc_op_instantiate' in code and '_pyfunc_divmod' not in code
+        
+        # Load into a store
+        store = AssetStore()
+        info = manifest['assets']['flexx-core.js']
+        with open(os.path.join(builddir, info['filename']), 'rb') as f:
+            code = f.read().decode()
+        assert store.get_asset('flexx-core.js').to_string() != code
+        store.load_build(builddir)
+        asset = store.get_asset('flexx-core.js')
+        assert asset.to_string() == code
+        assert asset.fingerprinted_name == info['filename']
+        
+        # The prebuilt code is not used if the modules do not match
+        asset.set_prebuilt(['flexx.app._model'], code)
+        assert asset.to_string() != code
+        
+        # Or if the code of a module changed after the build
+        hashes = manifest['assets']['flexx-core.js']['module_hashes']
+        assert sorted(hashes) == info['modules']
+        asset.set_prebuilt(info['modules'], code, hashes)
+        assert asset.to_string() == code
+        hashes = dict(hashes)
+        hashes['flexx.app._model'] = '0' * 16
+        asset.set_prebuilt(info['modules'], code, hashes)
+        with capture_log('warning') as logs:
+            assert asset.to_string() != code
+        assert len(logs) == 1 and 'flexx.app._model' in logs[0]
+        with capture_log('warning') as logs:
+            assert asset.to_string() != code
+        assert not logs  # warn only once
+    
+    finally:
+        shutil.rmtree(dirname)
+
+
+run_tests_if_main()
@@ -0,0 +1,223 @@
+""" Tests for the binary websocket codec
+"""
+
+import json
+import base64
+import struct
+from array import array
+
+from flexx.util.testing import run_tests_if_main, raises
+
+from flexx.app._codec import MsgpackCodec, select_codec, TYPED_ARRAY_TYPES
+from flexx.app._clientcore import MsgpackDecoder, decodeUtf8
+from flexx.pyscript import py2js, evaljs
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+OBJECTS = [None, True, False, 0, 1, 127, 128, 255, 256, 65535, 65536, 2**32 - 1,
+           -1, -32, -33, -128, -129, -32768, -32769, -2**31,
+           0.0, 1.5, -3.25e200,
+           '', 'foo', 'x' * 31, 'x' * 32, 'x' * 300, 'x' * 70000, 'héllo wörld',
+           [], [1, 2, 3], list(range(16)), list(range(70000)),
+           {}, {'a': 1, 'b': [None, {'c': 'd'}]}, dict((str(i), i) for i in range(20)),
+           b'', b'\x00\x01\x02', b'x' * 300, b'x' * 70000,
+           ['SET_PROPS', [['m1', 'foo', 3], ['m2', 'bar', 'spam']]],
+           ]
+
+
+def test_roundtrip():
+    codec = MsgpackCodec()
+    for ob in OBJECTS:
+        assert codec.decode(codec.encode(ob)) == ob
+
+    # Tuples become lists, big ints become floats
+    assert codec.decode(codec.encode((1, 2))) == [1, 2]
+    assert codec.decode(codec.encode(2**40)) == 2**40
+    assert isinstance(codec.decode(codec.encode(2**40)), float)
+    assert isinstance(codec.decode(codec.encode(-2**40)), float)
+
+    # Non-str keys are converted
+    assert codec.decode(codec.encode({3: 4})) == {'3': 4}
+
+    # Compact
+    assert codec.encode(None) == b'\xc0'
+    assert codec.encode(3) == b'\x03'
+    assert codec.encode('foo') == b'\xa3foo'
+    assert codec.encode([1, 2]) == b'\x92\x01\x02'
+
+    with raises(ValueError):
+        codec.decode(codec.encode(3) + b'\x00')  # trailing data
+    with raises(ValueError):
+        codec.decode(b'\xc1')  # never used tag
+
+
+def test_default_and_reviver():
+
+    class Foo:
+        def __json__(self):
+            return {'__type__': 'Foo', 'x': 3}
+
+    codec = MsgpackCodec()
+    with raises(TypeError):
+        codec.encode(Foo())
+
+    revived = []
+    def reviver(d):
+        revived.append(d)
+        return d.get('x', d)
+
+    codec = MsgpackCodec(default=lambda ob: ob.__json__(), reviver=reviver)
+    assert codec.decode(codec.encode([Foo(), {'y': 1}])) == [3, {'y': 1}]
+    assert len(revived) == 2
+
+
+def test_typed_arrays():
+    codec = MsgpackCodec()
+
+    for typecode in 'bBhHiIfd':
+        a = array(typecode, [1, 2, 3])
+        b = codec.decode(codec.encode(a))
+        assert isinstance(b, array)
+        assert b.itemsize == a.itemsize and b.tolist() == a.tolist()
+        # Also as a memoryview
+        b = codec.decode(codec.encode(memoryview(a)))
+        assert b.itemsize == a.itemsize and b.tolist() == a.tolist()
+
+    # The data is sent raw
+    a = array('d', range(1000))
+    data = codec.encode(a)
+    assert len(data) < 8000 + 10
+    assert codec.decode(data).tolist() == a.tolist()
+
+    # Header: ext8 with size, ext type 1, then element type code
+    data = codec.encode(array('B', [7]))
+    assert data == bytes([0xc7, 2, 1, 1, 7])
+
+    assert TYPED_ARRAY_TYPES[7][0] == 'float64'
+
+
+def test_numpy_arrays():
+    if np is None:
+        return
+    codec = MsgpackCodec()
+
+    for dtype in ('int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32',
+                  'float32', 'float64'):
+        a = np.arange(10, dtype=dtype)
+        b = codec.decode(codec.encode(a))
+        assert b.itemsize == a.itemsize and b.tolist() == a.tolist()
+
+    # Non-contiguous and big endian arrays
+    a = np.arange(20, dtype='>f8')[::2]
+    assert codec.decode(codec.encode(a)).tolist() == a.tolist()
+    # 2D arrays are flattened
+    a = np.arange(6, dtype='float32').reshape(2, 3)
+    assert codec.decode(codec.encode(a)).tolist() == a.ravel().tolist()
+
+    # Types that JS does not support are sent as lists
+    a = np.arange(5, dtype='int64')
+    assert codec.decode(codec.encode(a)) == a.tolist()
+
+
+def test_msgpack_compat():
+    if msgpack is None:
+        return
+    codec = MsgpackCodec()
+    for ob in OBJECTS:
+        # Our encoding can be decoded by msgpack
+        assert msgpack.unpackb(codec.encode(ob), raw=False) == ob
+        # And we can decode what msgpack produces
+        assert codec.decode(msgpack.packb(ob, use_bin_type=True)) == ob
+
+    # Typed arrays are an extension type
+    ext = msgpack.unpackb(codec.encode(array('d', [1, 2])))
+    assert ext.code == 1 and len(ext.data) == 17
+
+
+JS_DECODE = """
+var window = global;
+%s
+%s
+var decoder = new MsgpackDecoder(function (d) { d.revived = 1; return d; });
+var results = [];
+for (var b64 of %s) {
+    var buf = Buffer.from(b64, 'base64');
+    var data = buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.length);
+    results.push(decoder.decode(data));
+}
+JSON.stringify(results, function (key, val) {
+    if (ArrayBuffer.isView(val)) {
+        return [val.constructor.name, Array.from(val)];
+    }
+    return val;
+});
+"""
+
+
+def decode_in_js(datas, text_decoder=True):
+    """ Decode the given msgpack data with the MsgpackDecoder of the client.
+    """
+    b64s = [base64.b64encode(d).decode() for d in datas]
+    code = JS_DECODE % (py2js(MsgpackDecoder), py2js(decodeUtf8), json.dumps(b64s))
+    if not text_decoder:
+        code = 'var TextDecoder = undefined;' + code
+    return json.loads(evaljs(code))
+
+
+def revived(ob):
+    # What we expect from the reviver that is used in decode_in_js()
+    if isinstance(ob, dict):
+        ob = dict((key, revived(val)) for key, val in ob.items())
+        ob['revived'] = 1
+    elif isinstance(ob, list):
+        ob = [revived(val) for val in ob]
+    return ob
+
+
+def test_js_decoder():
+    codec = MsgpackCodec()
+
+    obs = [None, True, False, 0, 127, 255, 65535, 2**32 - 1, 2**40,
+           -1, -32, -33, -129, -32769, -2**31, -2**40,
+           1.5, -3.25e200,
+           '', 'foo', 'x' * 32, 'x' * 300, 'x' * 70000, 'h\xe9llo w\xf6rld \u20ac',
+           [[1, [2, []]], {'a': [3, {'b': {}}]}],
+           {'a': {'b': {'c': 'd'}}, 'e': [None, {'f': -4}]},
+           ]
+    datas = [codec.encode(ob) for ob in obs]
+    # We encode floats as float64, but the decoder also supports float32
+    datas.append(b'\xca' + struct.pack('>f', 1.5))
+    datas.append(b'\xca' + struct.pack('>f', -0.25))
+    # Typed arrays
+    datas += [codec.encode(array(typecode, [1, 2, 3])) for typecode in 'bBhHiIfd']
+    datas.append(codec.encode({'x': array('d', [0.5, -1])}))
+    names = ['Int8Array', 'Uint8Array', 'Int16Array', 'Uint16Array',
+             'Int32Array', 'Uint32Array', 'Float32Array', 'Float64Array']
+
+    # Test with TextDecoder and with our own utf-8 decoder
+    for text_decoder in (True, False):
+        results = decode_in_js(datas, text_decoder)
+        assert results[:len(obs)] == [revived(ob) for ob in obs]
+        results = results[len(obs):]
+        assert results[:2] == [1.5, -0.25]
+        assert results[2:-1] == [[name, [1, 2, 3]] for name in names]
+        assert results[-1] == {'x': ['Float64Array', [0.5, -1]], 'revived': 1}
+
+
+def test_select_codec():
+    assert select_codec([]) is None
+    assert select_codec(['foo']) is None
+    assert select_codec(['foo', 'msgpack']) is MsgpackCodec
+    assert MsgpackCodec.name == 'msgpack'
+
+
+run_tests_if_main()
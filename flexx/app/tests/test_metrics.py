@@ -0,0 +1,64 @@
+""" Tests for the metrics of the server
+"""
+
+from flexx.util.testing import run_tests_if_main
+
+from flexx import event
+from flexx.app._metrics import Counter, Gauge, Histogram, metrics
+
+
+def test_counter():
+    c = Counter('foo_total', 'A counter.', ('app', 'direction'))
+    c.inc(('a', 'in'))
+    c.inc(('a', 'in'), 3)
+    c.inc(('b"\\', 'out'), 2.5)
+    assert c.get('a', 'in') == 4
+    assert c.get('a', 'out') is None
+    assert c.render() == ['# HELP foo_total A counter.',
+                          '# TYPE foo_total counter',
+                          'foo_total{app="a",direction="in"} 4',
+                          'foo_total{app="b\\"\\\\",direction="out"} 2.5']
+    c.clear()
+    assert len(c.render()) == 2
+
+
+def test_gauge():
+    g = Gauge('bar', 'A gauge.')
+    g.set((), 3)
+    g.set((), 2.0)
+    assert g.render()[-1] == 'bar 2'
+
+
+def test_histogram():
+    h = Histogram('spam_seconds', 'A histogram.', buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 5):
+        h.observe(value)
+    assert h.render()[2:] == ['spam_seconds_bucket{le="0.1"} 2',
+                              'spam_seconds_bucket{le="1"} 3',
+                              'spam_seconds_bucket{le="+Inf"} 4',
+                              'spam_seconds_sum 5.65',
+                              'spam_seconds_count 4']
+
+
+class Foo(event.HasEvents):
+    
+    @event.prop
+    def foo(self, v=0):
+        return v
+    
+    @event.connect('foo')
+    def on_foo(self, *events):
+        pass
+
+
+def test_handler_duration():
+    count = metrics.handler_duration.get()
+    count = count[2] if count else 0
+    foo = Foo()
+    foo.foo = 3
+    event.loop.iter()
+    assert metrics.handler_duration.get()[2] >= count + 1
+    assert 'flexx_handler_duration_seconds_count' in metrics.render()
+
+
+run_tests_if_main()
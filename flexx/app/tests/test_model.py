@@ -3,13 +3,16 @@
 
 from flexx.util.testing import run_tests_if_main, raises
 
+import sys
 import weakref
 import gc
 import logging
+from array import array
 import tornado
 
-from flexx.app._model import Model, _get_active_models
-from flexx import event, app
+from flexx.app._model import Model, _get_active_models, typed_array
+from flexx.pyscript import py2js, evaljs
+from flexx import event, app, config
 
 class Foo1(Model):
     
@@ -211,6 +214,101 @@ def test_no_duplicate_code():
     assert '.red.' in Foo4.JS.CODE
 
 
+def test_lazy_js():
+    
+    ori = config.lazy_js
+    try:
+        config.lazy_js = False
+        class Lazy1(Model):
+            class JS:
+                def blue(self):
+                    return 1
+        
+        config.lazy_js = True
+        class Lazy2(Lazy1):
+            class JS:
+                def red(self):
+                    return 2
+    finally:
+        config.lazy_js = ori
+    
+    # Eager class has its code, lazy class not yet
+    assert Lazy1.JS.__dict__['__jscode__'] is not None
+    assert Lazy2.JS.__dict__['__jscode__'] is None
+    assert 'CODE' not in dir(Lazy2.JS)
+    
+    # Generated on first access, and then reused
+    code = Lazy2.JS.CODE
+    assert '.red ' in code and '.blue ' not in code
+    assert 'vars_unknown' in code.meta
+    assert Lazy2.JS.CODE is code
+    assert Lazy2.JS.__dict__['__jscode__'] is code
+    
+    # Same output as eager mode
+    assert code == Lazy2._get_js()
+
+
+class ArrayModel(Model):
+    
+    class Both:
+        
+        @event.prop
+        def data(self, v=()):
+            return typed_array(v)
+
+
+def test_typed_array():
+    
+    np = sys.modules.get('numpy', None)
+    
+    # A memoryview of the right type stays a memoryview, but is copied
+    m = memoryview(array('d', [1, 2, 3]))
+    m1 = memoryview(array('d', [1, 2, 3]))
+    m2 = typed_array(m1)
+    assert isinstance(m2, memoryview) and m2 is not m1
+    assert m2.format == 'd' and m2.tolist() == [1, 2, 3]
+    m1[0] = 9
+    assert m2[0] == 1
+    assert typed_array(memoryview(array('f', [1, 2])), 'float32').format == 'f'
+    
+    if np is None:
+        a = typed_array([1, 2, 3])
+        assert isinstance(a, array) and a.typecode == 'd'
+        assert typed_array(range(3), 'float32').typecode == 'f'
+    else:
+        a = typed_array([1, 2, 3])
+        assert isinstance(a, np.ndarray) and a.dtype == np.float64
+        assert a.tolist() == [1.0, 2.0, 3.0]
+        assert typed_array(m).tolist() == [1, 2, 3]
+        # Arrays are copied, also when they have the right type
+        b = np.zeros((10, ), np.float32)
+        b2 = typed_array(b, 'float32')
+        assert b2.dtype == np.float32 and not np.shares_memory(b, b2)
+        assert typed_array(b).dtype == np.float64
+        # Arrays are flattened
+        assert typed_array(np.zeros((2, 3))).shape == (6, )
+    
+    # In JS
+    code = py2js(typed_array)
+    code += 'var window = global;\n'
+    code += 'var a = typed_array([1, 2, 3]), b = typed_array(a);\n'
+    code += 'var c = typed_array(a, "float32");\n'
+    code += '[a.constructor.name, a === b, c.constructor.name, c[2]].join(" ");'
+    assert evaljs(code) == 'Float64Array true Float32Array 3'
+    
+    # An array that is changed in-place and set again is synced
+    session = app.Session('test')
+    a = typed_array([1, 2, 3])
+    m = ArrayModel(session=session, data=a)
+    session._pending_commands[:] = []
+    a[0] = 9
+    m.data = a
+    assert list(m.data) == [9, 2, 3]
+    assert len(session._pending_commands) == 1
+    assert session._pending_commands[0][0] == 'SET_PROPS'
+    session.close()
+
+
 def test_active_models():
     
     ioloop = app.create_server(port=0, new_loop=True).loop
@@ -343,6 +441,88 @@ def test_keep_alive():
     assert foo3_ref() is None
 
 
+class Mutatable(Model):
+    
+    class Both:
+        
+        @event.prop
+        def items(self, v=()):
+            return list(v)
+
+
+def test_mutate_prop():
+    
+    session = app.Session('test')
+    m = Mutatable(session=session, items=[1, 2])
+    session._pending_commands[:] = []
+    
+    # Only the mutation is sent
+    m._mutate_prop('items', 'insert', 2, [3, 4])
+    assert m.items == [1, 2, 3, 4]
+    assert session._pending_commands == [('MUTATE', [[m.id, 'items', 'insert', 2,
+                                                      [3, 4]]])]
+    
+    # Mutations from JS are not sent back
+    session._pending_commands[:] = []
+    session._receive_command('MUTATE_PROP %s items ["remove", 0, 3]' % m.id)
+    m._Model__set_prop_from_js_pending()
+    assert m.items == [4]
+    assert session._pending_commands == []
+    
+    # A pending update is not affected by a later mutation
+    m.items = [1, 2]
+    m._mutate_prop('items', 'insert', 2, [3])
+    assert m.items == [1, 2, 3]
+    assert session._pending_commands == [
+        ('SET_PROPS', [[m.id, 'items', [1, 2]]]),
+        ('MUTATE', [[m.id, 'items', 'insert', 2, [3]]])]
+    
+    session.close()
+
+
+class Coalesced(Model):
+    
+    class Both:
+        
+        @event.prop(coalesce='latest')
+        def count(self, v=0):
+            return int(v)
+        
+        @event.prop(coalesce='span')
+        def items(self, v=()):
+            return list(v)
+
+
+def test_coalesced_prop_sync():
+    
+    session = app.Session('test')
+    m = Coalesced(session=session)
+    session._pending_commands[:] = []
+    
+    # Synced once per iteration, with the latest value
+    for i in range(100):
+        m.count = i
+    assert session._pending_commands == []
+    m._Model__set_prop_to_js_pending()
+    assert session._pending_commands == [('SET_PROPS', [[m.id, 'count', 99]])]
+    
+    # A mutation causes pending props to be synced first
+    session._pending_commands[:] = []
+    m.items = [1, 2]
+    m._mutate_prop('items', 'insert', 2, [3])
+    assert session._pending_commands == [
+        ('SET_PROPS', [[m.id, 'items', [1, 2]]]),
+        ('MUTATE', [[m.id, 'items', 'insert', 2, [3]]])]
+    assert m.items == [1, 2, 3]
+    m._Model__set_prop_to_js_pending()
+    assert len(session._pending_commands) == 2
+    
+    # The policy is also used in JS
+    assert ".count.coalesce = \"latest\";" in Coalesced.JS.CODE
+    
+    session.close()
+
+
 def test_keep_alive_noleak1():
     
     class Foo:
@@ -4,6 +4,7 @@ Python module.
 """
 
 import os
+import re
 import sys
 import time
 import tempfile
@@ -14,6 +15,7 @@ from flexx.util.logging import capture_log
 
 from flexx import ui, app
 from flexx.app._modules import JSModule
+from flexx.pyscript.stdlib import FUNCTIONS, METHODS
 
 tempdirname = os.path.join(tempfile.gettempdir(), 'flexx_module_test')
 
@@ -275,6 +277,32 @@ def test_misc():
     assert 'flexx.app._model' in m.deps
 
 
+def test_std_imports():
+    import flxtest.foo
+    store = {}
+    
+    m = JSModule('flxtest.foo', store)
+    m.add_variable('do_something')
+    assert 'op_instantiate' not in m.std_functions
+    assert '_pyfunc_op_instantiate' not in m.get_js()
+    
+    # Model classes need op_instantiate (also for their base class)
+    m.add_variable('Foo')
+    assert 'op_instantiate' in m.std_functions
+    assert '_pyfunc_op_instantiate = _py._pyfunc_op_instantiate' in m.get_js()
+    
+    # Each module imports all of the std that it uses, and not more
+    for mod in store.values():
+        js = mod.get_js()
+        used = set(re.findall(r'\b_py(?:func|meth)_\w+', js))
+        imported = set(re.findall(r'(_py(?:func|meth)_\w+) = _py\.', js))
+        assert used == imported
+        assert len(mod.std_functions) == len([n for n in used if 'func' in n])
+    m = store['flexx.app._model']
+    assert 0 < len(m.std_functions) < len(FUNCTIONS)
+    assert 0 < len(m.std_methods) < len(METHODS)
+
+
 def test_add_variable():
     import flxtest.foo
     import flxtest.bar
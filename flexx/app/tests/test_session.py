@@ -116,6 +116,55 @@ def test_session_registering_model_classes():
          s._register_model_class(3)
 
 
+def test_get_page_inline_init():
+    
+    from flexx import ui, config
+    from flexx.app._session import get_page
+    
+    store = AssetStore()
+    store.update_modules()
+    
+    s = Session('', store)
+    s._register_model_class(ui.Button)
+    s._send_command('EXEC foo("</script>");')
+    assert len(s._pending_commands) > 2
+    
+    # By default, the commands are sent over the websocket
+    page = get_page(s)
+    assert 'init_commands' not in page
+    assert len(s._pending_commands) > 2
+    
+    ori = config.inline_init
+    config.inline_init = True
+    try:
+        page = get_page(s)
+        assert not s._pending_commands
+        # Assets are linked, other commands are embedded
+        assert '/flexx/assets/shared/flexx.ui._widget' in page
+        assert 'init_commands: ["EXEC foo(\\"<\\/script>\\");"]' in page
+        assert 'DEFINE-' not in page
+        # The page can be served again
+        assert get_page(s) == page
+    finally:
+        config.inline_init = ori
+
+
+
+def test_profile_js_handlers():
+    
+    from flexx import event
+    
+    s = Session('')
+    s.profile_js_handlers(1.5)
+    assert s._pending_commands[-1] == 'EXEC flexx.profile_handlers(1.500000);'
+    
+    with event.HandlerProfiler() as profiler:
+        s._receive_command('PROFILE [["Foo.bar", 2, 3, 0.5, 0.4, {"x": 3}]]')
+    stats, = profiler.get_stats()
+    assert stats.name == 'Foo.bar' and stats.source == 'js'
+    assert stats.calls == 2 and stats.triggers == {'x': 3}
+
+
 ## Prepare module loading tests
 
 from flexx.app._model import new_type
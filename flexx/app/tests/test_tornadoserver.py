@@ -0,0 +1,641 @@
+"""
+Tests for the Tornado server, in particular the serving of assets.
+"""
+
+import re
+import os
+import sys
+import gzip
+import zlib
+import json
+import time
+import socket
+import signal
+import subprocess
+from urllib.request import urlopen
+
+from flexx.util.testing import run_tests_if_main, skipif
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.web import Application
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from tornado.websocket import websocket_connect
+
+from flexx import app, event, config
+from flexx.app._tornadoserver import (MainHandler, WSHandler, AssetCache,
+                                      asset_cache, select_encoding, compress,
+                                      merge_commands, coalesce_commands,
+                                      get_request_session_id, TimerWheel,
+                                      get_timer_wheel)
+from flexx.app._session import get_session_worker
+from flexx.app._assetstore import assets
+from flexx.app._codec import MsgpackCodec
+
+
+def test_select_encoding():
+    encodings = 'gzip', 'deflate'
+    assert select_encoding('', encodings) == 'identity'
+    assert select_encoding('gzip', encodings) == 'gzip'
+    assert select_encoding('deflate, gzip', encodings) == 'gzip'
+    assert select_encoding('gzip;q=0, deflate', encodings) == 'deflate'
+    assert select_encoding('gzip; q=0.5', encodings) == 'gzip'
+    assert select_encoding('br', encodings) == 'identity'
+    assert select_encoding('*', encodings) == 'gzip'
+
+
+def test_compress():
+    data = b'foo bar ' * 1000
+    assert gzip.decompress(compress(data, 'gzip')) == data
+    assert zlib.decompress(compress(data, 'deflate')) == data
+    # Reproducible
+    assert compress(data, 'gzip') == compress(data, 'gzip')
+
+
+def test_merge_commands():
+    assert merge_commands([]) == []
+    assert merge_commands(['EXEC 1']) == ['EXEC 1']
+    
+    commands = [('SET_PROPS', [['a', 'x', 1]]), ('SET_PROPS', [['b', 'y', {'z': 2}]]),
+                'EXEC 1', ('EMIT', [['a', 'foo', {}]]), ('EMIT', [['b', 'bar', []]]),
+                ('SET_PROPS', [['c', 'x', 3]])]
+    merged = merge_commands(commands)
+    assert len(merged) == 4
+    assert merged[0] == ('SET_PROPS', [['a', 'x', 1], ['b', 'y', {'z': 2}]])
+    assert merged[1] == 'EXEC 1'
+    assert merged[2] == ('EMIT', [['a', 'foo', {}], ['b', 'bar', []]])
+    assert merged[3] == ('SET_PROPS', [['c', 'x', 3]])
+    # The original commands are not modified
+    assert commands[0] == ('SET_PROPS', [['a', 'x', 1]])
+
+
+def test_coalesce_commands():
+    assert coalesce_commands([]) == []
+    
+    commands = [('SET_PROPS', [['a', 'x', 1], ['b', 'x', 1]]), 'EXEC 1',
+                ('MUTATE', [['a', 'x', 'insert', 0, [2]],
+                            ['a', 'y', 'insert', 0, [2]]]),
+                ('EMIT', [['a', 'foo', {}]]),
+                ('SET_PROPS', [['a', 'x', 3]]), ('SET_PROPS', [['a', 'y', 4]]),
+                ('MUTATE', [['a', 'y', 'remove', 0, 1]])]
+    
+    # Only the last update of a.x remains, and mutations before it are dropped
+    assert coalesce_commands(commands) == [
+        ('SET_PROPS', [['b', 'x', 1]]), 'EXEC 1',
+        ('EMIT', [['a', 'foo', {}]]),
+        ('SET_PROPS', [['a', 'x', 3], ['a', 'y', 4]]),
+        ('MUTATE', [['a', 'y', 'remove', 0, 1]])]
+    
+    # Optionally, events are dropped
+    assert coalesce_commands(commands, True) == [
+        ('SET_PROPS', [['b', 'x', 1]]), 'EXEC 1',
+        ('SET_PROPS', [['a', 'x', 3], ['a', 'y', 4]]),
+        ('MUTATE', [['a', 'y', 'remove', 0, 1]])]
+    
+    # The original commands are not modified
+    assert len(commands[0][1]) == 2
+
+
+def test_get_request_session_id():
+    assert get_request_session_id('') == ''
+    assert get_request_session_id('GET / HTTP/1.1') == ''
+    assert get_request_session_id('GET /foo/ HTTP/1.1') == ''
+    assert get_request_session_id('GET /foo/?session_id=ab_1 HTTP/1.1') == 'ab_1'
+    assert get_request_session_id('GET /flexx/ws/foo?session_id=ab HTTP/1.1') == 'ab'
+    assert get_request_session_id('GET /flexx/data/ab_2/x.png HTTP/1.1') == 'ab_2'
+    assert get_request_session_id('GET /flexx/data/shared/x.png HTTP/1.1') == ''
+    assert get_request_session_id('GET /flexx/ws/foo HTTP/1.1') == ''
+    
+    assert get_session_worker('') is None
+    assert get_session_worker('abc') is None
+    assert get_session_worker('abc_') is None
+    assert get_session_worker('abc_3') == 3
+    assert get_session_worker('abc_12') == 12
+
+
+def test_timer_wheel():
+    loop = IOLoop()
+    wheel = TimerWheel(loop, tick=0.01, size=8)
+    calls = []
+    
+    def once():
+        calls.append('once')
+    
+    def thrice():
+        calls.append('thrice')
+        if calls.count('thrice') < 3:
+            return 0.02
+    
+    def late():  # more than one revolution of the wheel
+        calls.append('late')
+    
+    def fail():
+        calls.append('fail')
+        raise ValueError('errors do not stop the wheel')
+    
+    for func, delay in [(once, 0.01), (thrice, 0), (late, 0.2), (fail, 0.03)]:
+        wheel.add(delay, func)
+    assert len(wheel) == 4
+    
+    loop.call_later(0.1, loop.stop)
+    loop.start()
+    assert calls == ['once', 'thrice', 'fail', 'thrice', 'thrice']
+    assert len(wheel) == 1
+    
+    loop.call_later(0.2, loop.stop)
+    loop.start()
+    assert calls[-1] == 'late'
+    assert len(wheel) == 0 and not wheel._running
+    
+    # One wheel per loop
+    assert get_timer_wheel(loop) is get_timer_wheel(loop)
+    assert get_timer_wheel(loop) is not get_timer_wheel(IOLoop())
+    loop.close()
+
+
+def test_asset_cache():
+    cache = AssetCache()
+    
+    # Small assets are not compressed
+    data, encoding, etag = cache.get('foo.js', 'var x;', 'gzip')
+    assert data == b'var x;' and encoding == 'identity'
+    
+    # Larger assets are
+    source = 'var x = 3;\n' * 200
+    data1, encoding1, etag1 = cache.get('foo.js', source, '')
+    data2, encoding2, etag2 = cache.get('foo.js', source, 'gzip, deflate')
+    assert encoding1 == 'identity' and encoding2 == 'gzip'
+    assert data1 == source.encode()
+    assert gzip.decompress(data2) == data1
+    assert etag1 != etag2 and etag1 != etag
+    assert etag1.startswith('"') and etag1.endswith('"')
+    
+    # Compressed variants are reused
+    assert cache.get('foo.js', source, 'gzip')[0] is data2
+    
+    # A different source string renews the entry
+    source2 = 'var y = 3;\n' * 200
+    data3, encoding3, etag3 = cache.get('foo.js', source2, 'gzip')
+    assert gzip.decompress(data3) == source2.encode()
+    assert etag3 != etag2
+
+
+class TestAssetHandler(AsyncHTTPTestCase):
+    
+    def get_app(self):
+        return Application([(r"/flexx/(.*)", MainHandler)])
+    
+    def test_asset_caching_headers(self):
+        url = '/flexx/assets/shared/flexx-core.js'
+        code = assets.get_asset('flexx-core.js').to_string()
+        
+        res = self.fetch(url, decompress_response=False)
+        assert res.code == 200
+        assert res.body == code.encode()
+        assert 'Content-Encoding' not in res.headers
+        assert res.headers['Cache-Control'] == 'public, no-cache'
+        etag = res.headers['Etag']
+        
+        # Revalidate
+        res = self.fetch(url, headers={'If-None-Match': etag},
+                         decompress_response=False)
+        assert res.code == 304
+        assert not res.body
+        
+        # Compressed
+        res = self.fetch(url, headers={'Accept-Encoding': 'gzip'},
+                         decompress_response=False)
+        assert res.code == 200
+        assert res.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(res.body) == code.encode()
+        assert res.headers['Etag'] != etag
+        res = self.fetch(url, headers={'Accept-Encoding': 'gzip',
+                                       'If-None-Match': res.headers['Etag']},
+                         decompress_response=False)
+        assert res.code == 304
+        
+        asset_cache.clear()
+    
+    def test_fingerprinted_asset(self):
+        asset = assets.get_asset('reset.css')
+        code = asset.to_string()
+        
+        url = '/flexx/assets/shared/' + asset.fingerprinted_name
+        res = self.fetch(url, decompress_response=False)
+        assert res.code == 200
+        assert res.body == code.encode()
+        assert res.headers['Content-Type'].startswith('text/css')
+        assert res.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+        
+        # A stale fingerprint gets the current version, but must revalidate
+        url = '/flexx/assets/shared/reset.0123456789abcdef.css'
+        res = self.fetch(url, decompress_response=False)
+        assert res.code == 200
+        assert res.body == code.encode()
+        assert res.headers['Cache-Control'] == 'public, no-cache'
+        
+        url = '/flexx/assets/shared/foo.0123456789abcdef.css'
+        res = self.fetch(url, decompress_response=False)
+        assert b'Could not load' in res.body
+        
+        asset_cache.clear()
+    
+    def test_metrics(self):
+        
+        a = app.App(WSModel)
+        a.serve('MetricsApp')
+        app.manager.create_session('MetricsApp')
+        
+        # Run a handler, so that there is a handler duration to report
+        class Counter(event.HasEvents):
+            @event.connect('spam')
+            def on_spam(self, *events):
+                pass
+        counter = Counter()
+        counter.emit('spam', {})
+        event.loop.iter()
+        
+        url = '/flexx/assets/shared/reset.css'
+        for i in range(3):
+            self.fetch(url)
+        
+        res = self.fetch('/flexx/metrics')
+        assert res.code == 200
+        assert res.headers['Content-Type'].startswith('text/plain')
+        text = res.body.decode()
+        assert '# TYPE flexx_sessions gauge' in text
+        assert 'flexx_sessions{app="MetricsApp",state="pending"} 1' in text
+        assert 'flexx_sessions{app="MetricsApp",state="connected"} 0' in text
+        assert re.search(r'flexx_asset_cache_requests_total{result="hit"} [1-9]', text)
+        assert re.search(r'flexx_pending_commands{app="MetricsApp"} [1-9]', text)
+        assert 'flexx_uptime_seconds ' in text
+        assert 'flexx_handler_duration_seconds_count ' in text
+        
+        asset_cache.clear()
+
+
+
+class WSModel(app.Model):
+    
+    class Both:
+        
+        @event.prop
+        def foo(self, v=0):
+            return int(v)
+
+
+class TestWebsocket(AsyncHTTPTestCase):
+    
+    def get_app(self):
+        return Application([(r"/flexx/ws/(.*)", WSHandler)])
+    
+    @gen_test
+    def test_commands_are_batched(self):
+        
+        if not app.manager.has_app_name('WSModel'):
+            app.App(WSModel).serve()
+        session = app.manager.create_session('WSModel')
+        
+        url = 'ws://127.0.0.1:%i/flexx/ws/WSModel' % self.get_http_port()
+        ws = yield websocket_connect(url)
+        ws.write_message('hiflexx ' + session.id)
+        
+        # Collect frames until init is done
+        frames, commands = [], []
+        while 'INIT-DONE' not in commands:
+            frame = yield ws.read_message()
+            frames.append(frame)
+            if frame.startswith('MULTI '):
+                commands.extend(json.loads(frame[6:]))
+            else:
+                commands.append(frame)
+        
+        # The pending commands (module definitions etc.) are sent as one frame
+        assert len(frames) < 4
+        assert len(commands) > 5
+        assert any(c.startswith('DEFINE-JS') for c in commands)
+        
+        # Commands issued in one go end up in a single frame
+        session._exec('1')
+        session._exec('2')
+        session._exec('3')
+        frame = yield ws.read_message()
+        while frame.startswith('PING '):
+            frame = yield ws.read_message()
+        assert json.loads(frame[6:]) == ['EXEC 1', 'EXEC 2', 'EXEC 3']
+        
+        # A single command is sent as-is
+        session._exec('4')
+        frame = yield ws.read_message()
+        while frame.startswith('PING '):
+            frame = yield ws.read_message()
+        assert frame == 'EXEC 4'
+        
+        # Property updates are sent in a single SET_PROPS command
+        m = session.app
+        for i in range(1, 11):
+            m.foo = i
+        frame = yield ws.read_message()
+        while frame.startswith('PING '):
+            frame = yield ws.read_message()
+        assert frame.startswith('SET_PROPS ')
+        items = json.loads(frame[10:])
+        assert items == [[m.id, 'foo', i] for i in range(1, 11)]
+        
+        ws.close()
+    
+    @gen.coroutine
+    def connect(self, codecs=''):
+        """ Connect a client and read frames until init is done.
+        """
+        if not app.manager.has_app_name('WSModel'):
+            app.App(WSModel).serve()
+        session = app.manager.create_session('WSModel')
+        url = 'ws://127.0.0.1:%i/flexx/ws/WSModel' % self.get_http_port()
+        ws = yield websocket_connect(url)
+        ws.write_message(('hiflexx ' + session.id + ' ' + codecs).strip())
+        codec = MsgpackCodec()
+        frames, commands = [], []
+        while 'INIT-DONE' not in commands:
+            frame = yield ws.read_message()
+            frames.append(frame)
+            if isinstance(frame, bytes):
+                commands.extend(codec.decode(frame))
+            elif frame.startswith('MULTI '):
+                commands.extend(json.loads(frame[6:]))
+            else:
+                commands.append(frame)
+        return session, ws, frames, commands
+    
+    @gen_test
+    def test_binary_frames(self):
+        
+        # The codec is negotiated if the client supports it, but commands
+        # are only sent in binary frames if enabled
+        session, ws, frames, commands = yield self.connect('foo,msgpack')
+        assert 'CODEC msgpack' in commands
+        assert all(isinstance(frame, str) for frame in frames)
+        ws.close()
+        
+        ori = config.ws_binary
+        config.ws_binary = True
+        try:
+            session, ws, frames, commands = yield self.connect('foo,msgpack')
+            assert commands[0] == 'CODEC msgpack' or commands[0].startswith('PING')
+            assert isinstance(frames[-1], bytes)
+            assert any(isinstance(c, str) and c.startswith('DEFINE-JS')
+                       for c in commands)
+            
+            # Property updates are structured commands
+            codec = MsgpackCodec()
+            m = session.app
+            for i in range(1, 4):
+                m.foo = i
+            commands = []
+            while not commands:
+                frame = yield ws.read_message()
+                commands = [c for c in codec.decode(frame)
+                            if not (isinstance(c, str) and c.startswith('PING '))]
+            assert commands == [['SET_PROPS', [[m.id, 'foo', i] for i in range(1, 4)]]]
+        finally:
+            config.ws_binary = ori
+        
+        ws.close()
+    
+    @gen_test
+    def test_backpressure(self):
+        
+        session, ws, frames, commands = yield self.connect()
+        handler = session._ws
+        m = session.app
+        assert handler.held_commands == 0
+        
+        # Pretend that the client is slow, commands are held back
+        size = config.ws_high_water_mark + 1
+        handler._write_buffer_size += size
+        for i in range(1, 101):
+            m.foo = i
+            if i == 50:
+                session._exec('1')
+        yield gen.sleep(0.01)
+        assert handler.held_commands >= 2
+        # Property updates are coalesced, also while the commands are held
+        for i in range(101, 1001):
+            m.foo = i
+        assert handler.held_commands < 100
+        held = [c for c in handler._command_buffer if c[0] == 'SET_PROPS']
+        assert held[-1] == ('SET_PROPS', [[m.id, 'foo', 1000]])
+        
+        # The commands are sent when the client catches up
+        handler._on_written(size)
+        assert handler.held_commands == 0
+        frame = yield ws.read_message()
+        while frame.startswith('PING '):
+            frame = yield ws.read_message()
+        commands = json.loads(frame[6:])
+        commands = [c for c in commands if not c.startswith('PING ')]
+        assert commands == ['EXEC 1', 'SET_PROPS [["%s", "foo", 1000]]' % m.id]
+        
+        ws.close()
+    
+    @gen_test
+    def test_send_data(self):
+        
+        # Without a codec, the client retrieves the data with AJAX
+        session, ws, frames, commands = yield self.connect()
+        assert session.app.send_data(b'xx') is None
+        frame = yield ws.read_message()
+        while frame.startswith('PING '):
+            frame = yield ws.read_message()
+        assert 'retrieve_data(' in frame
+        ws.close()
+        
+        # With a codec, data is pushed over the websocket, in chunks
+        session, ws, frames, commands = yield self.connect('msgpack')
+        m = session.app
+        data = bytes(range(256)) * 100
+        ori = WSHandler.DATA_CHUNK_SIZE
+        WSHandler.DATA_CHUNK_SIZE = 10000
+        try:
+            future1 = m.send_data(data, {'foo': 3})
+            future2 = m.send_data(memoryview(b'spam'))
+            assert session._ws.pending_data_size == len(data) + 4
+            codec = MsgpackCodec()
+            items = []
+            while len(items) < 4:
+                frame = yield ws.read_message()
+                if isinstance(frame, bytes):
+                    for kind, item in codec.decode(frame):
+                        assert kind == 'DATA'
+                        items.append(item)
+        finally:
+            WSHandler.DATA_CHUNK_SIZE = ori
+        
+        # key, index, count, id, meta, chunk
+        assert [item[1:3] for item in items] == [[0, 3], [1, 3], [2, 3], [0, 1]]
+        assert b''.join(item[5] for item in items[:3]) == data
+        assert items[0][3] == m.id
+        assert items[0][4] == {'foo': 3, 'byteLength': len(data)}
+        assert items[3][5] == b'spam'
+        assert items[0][0] == items[2][0] != items[3][0]
+        
+        assert (yield future1) is True
+        assert (yield future2) is True
+        assert session._ws.pending_data_size == 0
+        
+        ws.close()
+
+    
+    @gen.coroutine
+    def read_until_exec(self, ws, code):
+        """ Read frames until the given EXEC command, returns the commands
+        and the DATA items before it.
+        """
+        codec = MsgpackCodec()
+        commands, items = [], []
+        while True:
+            frame = yield ws.read_message()
+            if isinstance(frame, bytes):
+                items.extend(item for kind, item in codec.decode(frame))
+                continue
+            if frame.startswith('MULTI '):
+                frame_commands = json.loads(frame[6:])
+            else:
+                frame_commands = [frame]
+            for c in frame_commands:
+                if c == 'EXEC ' + code:
+                    return commands, items
+                elif not c.startswith('PING '):
+                    commands.append((c, len(items)))
+    
+    @gen_test
+    def test_send_data_from_callback(self):
+        
+        session, ws, frames, commands = yield self.connect('msgpack')
+        handler = session._ws
+        m = session.app
+        
+        # Writes that do not finish right away
+        ori_write = handler._write
+        @gen.coroutine
+        def slow_write(message, binary=False):
+            yield gen.moment
+            yield ori_write(message, binary)
+        handler._write = slow_write
+        
+        # Data that is sent when other data is done is sent exactly once
+        futures = []
+        def send_more(f):
+            if not futures:
+                futures.append(handler.send_data(m.id, b'more' * 10, {}))
+        ori = WSHandler.DATA_CHUNK_SIZE
+        WSHandler.DATA_CHUNK_SIZE = 4
+        try:
+            future = handler.send_data(m.id, b'first', {})
+            future.add_done_callback(send_more)
+            assert (yield future) is True
+            assert (yield futures[0]) is True
+        finally:
+            WSHandler.DATA_CHUNK_SIZE = ori
+        yield gen.sleep(0.01)
+        session._exec('done')
+        commands, items = yield self.read_until_exec(ws, 'done')
+        assert [item[1:3] for item in items] == ([[0, 2], [1, 2]] +
+                                                 [[i, 10] for i in range(10)])
+        assert b''.join(item[5] for item in items) == b'first' + b'more' * 10
+        
+        ws.close()
+    
+    @gen_test
+    def test_send_data_waits_for_held_commands(self):
+        
+        session, ws, frames, commands = yield self.connect('msgpack')
+        handler = session._ws
+        m = session.app
+        
+        # Pretend that the client is slow, commands are held back
+        size = config.ws_high_water_mark + 1
+        handler._write_buffer_size += size
+        m.foo = 42
+        yield gen.sleep(0.01)
+        assert handler.held_commands == 1
+        
+        # Data waits for the held commands, e.g. to create a model
+        future = m.send_data(b'spam')
+        yield gen.sleep(0.01)
+        assert not future.done()
+        handler._on_written(size)
+        assert (yield future) is True
+        session._exec('done')
+        commands, items = yield self.read_until_exec(ws, 'done')
+        assert [item[5] for item in items] == [b'spam']
+        assert commands == [('SET_PROPS [["%s", "foo", 42]]' % m.id, 0)]
+        
+        ws.close()
+
+
+WORKERS_SCRIPT = """
+import sys
+from flexx import app
+
+class Foo(app.Model):
+    pass
+
+app.App(Foo).serve()
+app.create_server(port=int(sys.argv[1]), workers=2)
+app.start()
+"""
+
+
+@skipif(sys.platform.startswith('win'), reason='no fork on Windows')
+def test_workers():
+    
+    # Get a free port
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(app.__file__))
+    p = subprocess.Popen([sys.executable, '-c', WORKERS_SCRIPT, str(port)],
+                         env=env, start_new_session=True,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    @gen.coroutine
+    def connect_sessions():
+        replies = []
+        for i in range(10):
+            url = 'http://127.0.0.1:%i/Foo/' % port
+            page = urlopen(url).read().decode()
+            session_id = re.search('session_id: "(.*?)"', page).group(1)
+            url = 'ws://127.0.0.1:%i/flexx/ws/Foo?session_id=%s' % (port, session_id)
+            ws = yield websocket_connect(url)
+            ws.write_message('hiflexx ' + session_id)
+            msg = yield ws.read_message()
+            while msg is not None and msg.startswith('PING '):
+                msg = yield ws.read_message()
+            replies.append((session_id, msg))
+            ws.close()
+        return replies
+    
+    try:
+        for i in range(100):
+            try:
+                urlopen('http://127.0.0.1:%i/flexx/' % port).read()
+                break
+            except IOError:
+                time.sleep(0.1)
+        replies = IOLoop().run_sync(connect_sessions)
+    finally:
+        os.killpg(p.pid, signal.SIGTERM)
+        p.wait()
+    
+    # The worker that serves the page owns the session, and the websocket is
+    # routed to that worker, even if another worker accepted the connection.
+    for session_id, msg in replies:
+        assert get_session_worker(session_id) in (0, 1)
+        assert msg is not None and 'DEFINE-JS' in msg
+
+
+run_tests_if_main()
@@ -365,5 +365,6 @@ from ._loop import loop
 from ._handler import Handler, connect
 from ._emitters import prop, readonly, emitter
 from ._hasevents import HasEvents
+from ._profiler import HandlerProfiler
 
 # from ._hasevents import new_type, with_metaclass
@@ -6,9 +6,14 @@ prop, readonly and emitter.
 import inspect
 
 
+# Ways to coalesce events that are pending for a handler, see
+# HasEvents.set_coalesce() and Handler.set_coalesce()
+COALESCE_MODES = (None, '', 'latest', 'span')
+
+
 # Decorators to apply at a HasEvents class
 
-def prop(func):
+def prop(func=None, coalesce=None):
     """ Decorator to define a settable propery. An event is emitted
     when the property is set, which has values for "old_value" and
     "new_value".
@@ -30,13 +35,19 @@ def prop(func):
     of the method is used to do verification and normalization of the
     value being set. The method's docstring is used as the property's
     docstring.
+    
+    For properties that change at a high rate, the events can be coalesced,
+    e.g. ``@prop(coalesce='latest')``. See
+    :func:`HasEvents.set_coalesce() <flexx.event.HasEvents.set_coalesce>`.
     """
+    if func is None:
+        return lambda func: prop(func, coalesce)
     if not callable(func):
         raise TypeError('prop decorator needs a callable')
-    return Property(func)
+    return Property(func, coalesce=coalesce)
 
 
-def readonly(func):
+def readonly(func=None, coalesce=None):
     """ Decorator to define a readonly property. An event is emitted
     when the property is set, which has values for "old_value" and
     "new_value". To set a readonly property internally, use the
@@ -53,10 +64,13 @@ def readonly(func):
         m = MyObject()
         m._set_prop('bar', 2)  # only for internal use
     
+    Like ``prop``, this decorator accepts a ``coalesce`` argument.
     """
+    if func is None:
+        return lambda func: readonly(func, coalesce)
     if not callable(func):
         raise TypeError('readonly decorator needs a callable')
-    return Readonly(func)
+    return Readonly(func, coalesce=coalesce)
 
 
 def emitter(func):
@@ -112,9 +126,13 @@ class Property(BaseEmitter):
     _SUFFIX = '_value'
     
     def __init__(self, *args, **kwargs):
+        coalesce = kwargs.pop('coalesce', None)
         super().__init__(*args, **kwargs)
         self._defaults = inspect.getargspec(self._func).defaults
         # defaults is a list, so we can see if there is a default (it might be None)
+        if coalesce not in COALESCE_MODES:
+            raise ValueError('Invalid coalesce mode %r.' % coalesce)
+        self._coalesce = coalesce or ''
     
     def __set__(self, instance, value):
         if instance is not None:  # pragma: no cover
@@ -4,6 +4,10 @@ Implementation of handler class and corresponding descriptor.
 
 import weakref
 import inspect
+try:  # pragma: no cover
+    from time import perf_counter
+except ImportError:  # Python < 3.3
+    from time import time as perf_counter
 
 from ._dict import Dict
 from ._loop import loop
@@ -18,6 +22,23 @@ def this_is_js():
     return False
 
 
+def add_handler_observer(func):
+    """ Add a function to be called after each invocation of a handler,
+    with arguments ``(handler, events, duration)``. Intended for tools
+    that collect statistics, e.g. the metrics of ``flexx.app`` and the
+    ``HandlerProfiler``. The observers are stored on the loop, which
+    the JS version has too.
+    """
+    if func not in loop._handler_observers:
+        loop._handler_observers.append(func)
+
+def remove_handler_observer(func):
+    """ Remove a function that was added with ``add_handler_observer()``.
+    """
+    if func in loop._handler_observers:
+        loop._handler_observers.remove(func)
+
+
 def looks_like_method(func):
     if hasattr(func, '__func__'):
         return False  # this is a bound method
@@ -231,6 +252,9 @@ class Handler:
         # Pending events for this handler
         self._scheduled_update = False
         self._pending = []  # pending events
+        self._priority = 1  # the lane of the loop
+        self._coalesce = ''  # coalesce mode, overrides that of the event source
+        self._coalesce_index = {}  # label:type -> list of [source, index]
 
         # Connect
         for index in range(len(self._connections)):
@@ -255,6 +279,29 @@ class Handler:
         return [(c.fullname, [u[1] for u in c.objects])
                 for c in self._connections]
 
+    def set_priority(self, priority):
+        """ Set the priority of this handler: 0 (high), 1 (normal, default)
+        or 2 (low). Pending handlers with a higher priority are invoked
+        first, e.g. to keep the UI responsive when many bulk handlers are
+        pending. Takes effect the next time that an event is received.
+        """
+        if priority not in (0, 1, 2):
+            raise ValueError('Handler priority must be 0, 1 or 2.')
+        self._priority = priority
+
+    def set_coalesce(self, mode):
+        """ Set how the pending events of this handler are coalesced:
+        '' or None (default) to use the mode of the object that emits the
+        event, 'latest' to only keep the latest event per object and event
+        type, or 'span' to keep the latest event, but with the
+        ``old_value`` of the first. The coalesced event takes the place of
+        the first. See :func:`HasEvents.set_coalesce()
+        <flexx.event.HasEvents.set_coalesce>`.
+        """
+        if mode not in ('', None, 'latest', 'span'):
+            raise ValueError('Invalid coalesce mode %r.' % mode)
+        self._coalesce = mode or ''
+
     ## Calling / handling
 
     def _use_once(self, func):
@@ -276,20 +323,52 @@ class Handler:
         self._func_once = self._func
         return res
 
-    def _add_pending_event(self, label, ev):
+    def _add_pending_event(self, label, ev, coalesce=''):
         """ Add an event object to be handled at the next event loop
-        iteration. Called from HasEvents.emit().
+        iteration. Called from HasEvents.emit(). If coalescing applies,
+        a pending event of the same source and type is replaced.
         """
         if not self._scheduled_update:
             # register only once
             self._scheduled_update = True
             if this_is_js():
                 #setTimeout(self._handle_now_callback.bind(self), 0)
-                loop.call_later(self._handle_now_callback.bind(self))
+                loop.call_later(self._handle_now_callback.bind(self), self._priority)
             else:
-                loop.call_later(self._handle_now_callback)
+                loop.call_later(self._handle_now_callback, self._priority)
+        mode = self._coalesce or coalesce
+        if mode and not label.startswith('reconnect_'):
+            key = label + ':' + ev.type
+            entries = self._coalesce_index.get(key, None)
+            if entries is None:
+                entries = []
+                self._coalesce_index[key] = entries
+            for i in range(len(entries)):
+                if entries[i][0] is ev.source:
+                    if 'mutation' in ev:
+                        # Never coalesce mutations, and retain order
+                        entries.pop(i)
+                        break
+                    index = entries[i][1]
+                    if mode == 'span':
+                        ev = self._span_events(self._pending[index][1], ev)
+                    self._pending[index] = (label, ev)
+                    return
+            if 'mutation' not in ev:
+                entries.append([ev.source, len(self._pending)])
         self._pending.append((label, ev))
 
+    def _span_events(self, ev1, ev2):
+        """ Get a copy of ev2 with the old_value of ev1. The events
+        themselves may be shared by other handlers, so we make a new one.
+        """
+        ev = Dict()
+        for key in ev2.keys():
+            ev[key] = ev2[key]
+        if 'old_value' in ev1:
+            ev['old_value'] = ev1['old_value']
+        return ev
+
     def _handle_now_callback(self):
         self._scheduled_update = False
         self.handle_now()
@@ -304,6 +383,7 @@ class Handler:
         # Collect pending events and clear current list
         events, reconnect = self._collect()
         self._pending = []
+        self._coalesce_index = {}
         # Reconnect (dynamism)
         for index in reconnect:
             self._connect_to_event(index)
@@ -312,11 +392,13 @@ class Handler:
         if not len(reconnect2):
             events = events + events2
             self._pending = []
+            self._coalesce_index = {}
         # Handle events
         if len(events):
             if not this_is_js():
                 logger.debug('Handler %s is processing %i events' %
                             (self._name, len(events)))
+            t0 = perf_counter()
             try:
                 self(*events)
             except Exception as err:
@@ -325,6 +407,20 @@ class Handler:
                 else:
                     err.skip_tb = 2
                     logger.exception(err)
+            if len(loop._handler_observers):
+                t1 = perf_counter()
+                for observer in loop._handler_observers:
+                    observer(self, events, t1 - t0)
+
+    def _get_connection_string(self, ev):
+        """ Get the connection string via which the given event was
+        received, or an empty string.
+        """
+        for connection in self._connections:
+            for ob, type in connection.objects:
+                if ob is ev.source and type.split(':')[0] == ev.type:
+                    return connection.fullname
+        return ''
 
     def _collect(self):
         """ Get list of events and reconnect-events from list of pending events.
@@ -355,6 +451,7 @@ class Handler:
         self._connections = []
         while len(self._pending):
             self._pending.pop()  # no list.clear on legacy py
+        self._coalesce_index = {}
 
     def _clear_hasevents_refs(self, ob):
         """ Clear all references to the given HasEvents instance. This is
@@ -4,6 +4,7 @@ generated and handled. It is the object that keeps track of handlers.
 """
 
 import sys
+from array import array
 
 from ._dict import Dict
 from ._handler import HandlerDescriptor, Handler, looks_like_method
@@ -135,6 +136,7 @@ class HasEvents(with_metaclass(HasEventsMeta, object)):
         self.__props_being_set = {}
         self.__props_ever_set = {}
         self.__pending_events = {}
+        self.__coalesce = {}  # event type -> coalesce mode
         
         init_handlers = property_values.pop('_init_handlers', True)
         
@@ -150,6 +152,9 @@ class HasEvents(with_metaclass(HasEventsMeta, object)):
             setattr(self, '_' + name + '_value', None)  # need *something* for value
             func = getattr(self.__class__, name).get_func()
             setattr(self, '_' + name + '_func', func)  # needed in set_prop()
+            coalesce = getattr(self.__class__, name)._coalesce
+            if coalesce:
+                self.__coalesce[name] = coalesce
         for name in self.__properties__:
             dd = getattr(self.__class__, name)._defaults
             if dd:
@@ -303,8 +308,35 @@ class HasEvents(with_metaclass(HasEventsMeta, object)):
         return ev
     
     def _emit(self, ev):
+        coalesce = self.__coalesce.get(ev.type, '')
         for label, handler in self.__handlers.get(ev.type, ()):
-            handler._add_pending_event(label, ev)  # friend class
+            handler._add_pending_event(label, ev, coalesce)  # friend class
+    
+    def set_coalesce(self, type, mode):
+        """ Set how events of the given type are coalesced when several
+        of them are pending for a handler, i.e. when they are emitted
+        within one iteration of the event loop:
+        
+        * '' or None (default): all events are passed to the handler.
+        * 'latest': only the latest event is passed.
+        * 'span': one event is passed, which is the latest event, but
+          with the ``old_value`` of the first event. For properties, a
+          handler thus sees the net change.
+        
+        Events that represent a mutation are never coalesced. For
+        properties, the coalesce mode can also be set via the ``prop``
+        decorator, e.g. ``@prop(coalesce='latest')``. For ``Model``
+        objects, such properties are also synchronised at most once per
+        iteration. Handlers have a ``set_coalesce()`` method too.
+        """
+        if mode not in ('', None, 'latest', 'span'):
+            raise ValueError('Invalid coalesce mode %r.' % mode)
+        self.__coalesce[type] = mode or ''
+    
+    def get_coalesce(self, type):
+        """ Get the coalesce mode for events of the given type.
+        """
+        return self.__coalesce.get(type, '')
     
     def _set_prop(self, prop_name, value, _initial=False):
         """ Set the value of a (readonly) property.
@@ -356,6 +388,79 @@ class HasEvents(with_metaclass(HasEventsMeta, object)):
             self.emit(prop_name, dict(new_value=value2, old_value=old))
             return True
     
+    def _mutate_prop(self, prop_name, mutation, index=0, objects=None):
+        """ Mutate the value of a list- or dict-valued property in-place.
+        Unlike ``_set_prop()``, the value is not normalized and not
+        compared to the old value, so the cost depends only on the size
+        of the mutation. The emitted event has ``mutation``, ``index``
+        and ``objects`` attributes, so that handlers can process only the
+        change. For ``Model`` objects, only the change is synchronised.
+        
+        Parameters:
+            prop_name (str): the name of the property to mutate.
+            mutation (str): 'insert', 'remove' or 'replace' for lists
+                and arrays, or 'update' for dicts.
+            index (int): the index at which to insert, remove or replace
+                elements. Use the length of the list to append.
+            objects: the elements to insert or replace (a list), the
+                number of elements to remove (an int), or the dict to
+                update the value with.
+        """
+        # Checks
+        if not isinstance(prop_name, str):
+            raise TypeError("_mutate_prop's first arg must be str, not %s" %
+                             prop_name.__class__)
+        if prop_name not in self.__properties__:
+            cname = self.__class__.__name__
+            raise AttributeError('%s object has no property %r' % (cname, prop_name))
+        if mutation not in ('insert', 'remove', 'replace', 'update'):
+            raise ValueError('Invalid mutation %r' % mutation)
+        private_name = '_' + prop_name + '_value'
+        old = value = getattr(self, private_name)
+        # Mutate
+        if this_is_js():
+            if mutation == 'update':
+                value.update(objects)
+            else:
+                n, items = 0, objects
+                if mutation == 'remove':
+                    n, items = objects, []
+                elif mutation == 'replace':
+                    n = len(objects)
+                if value.splice:  # a normal array
+                    value.splice.apply(value, [index, n].concat(items))
+                elif mutation == 'replace':  # a typed array, fixed size
+                    value.set(items, index)
+                else:
+                    Cls = value.constructor
+                    value = Cls(len(old) - n + len(items))
+                    value.set(old.subarray(0, index), 0)
+                    value.set(items, index)
+                    value.set(old.subarray(index + n), index + len(items))
+        else:
+            if mutation == 'update':
+                value.update(objects)
+            elif hasattr(value, 'dtype') and mutation != 'replace':
+                import numpy as np  # numpy arrays cannot be resized in-place
+                if mutation == 'insert':
+                    value = np.insert(value, index, objects)
+                else:
+                    value = np.delete(value, slice(index, index + objects))
+            else:
+                if isinstance(value, memoryview):
+                    value = array(value.format, value)
+                if isinstance(value, array) and mutation != 'remove':
+                    objects = array(value.typecode, objects)
+                if mutation == 'insert':
+                    value[index:index] = objects
+                elif mutation == 'remove':
+                    del value[index:index + objects]
+                else:
+                    value[index:index + len(objects)] = objects
+        setattr(self, private_name, value)
+        self.emit(prop_name, dict(new_value=value, old_value=old,
+                                  mutation=mutation, index=index, objects=objects))
+    
     def get_event_types(self):
         """ Get the known event types for this HasEvent object. Returns
         a list of event type names, for which there is a
@@ -6,6 +6,7 @@ import sys
 import json
 
 from flexx.pyscript import JSString, py2js as py2js_
+from flexx.pyscript.stdlib import FUNCTIONS, get_std_info
 from flexx.pyscript.parser2 import get_class_definition
 
 from flexx.event._emitters import BaseEmitter, Property
@@ -13,7 +14,7 @@ from flexx.event._handler import HandlerDescriptor, Handler
 from flexx.event._hasevents import HasEvents
 
 
-Object = Date = console = setTimeout = undefined = None  # fool pyflake
+Object = Date = console = setTimeout = perf_counter = undefined = None  # fool pyflake
 
 reprs = json.dumps
 
@@ -45,6 +46,7 @@ class HasEventsJS:
         self.__props_being_set = {}
         self.__props_ever_set = {}
         self.__pending_events = {}
+        self.__coalesce = {}
         
         # Create properties
         for name in self.__properties__:
@@ -55,6 +57,8 @@ class HasEventsJS:
             func = self['_' + name + '_func']
             creator = self['__create_' + func.emitter_type]
             creator(name)
+            if func.coalesce:
+                self.__coalesce[name] = func.coalesce
             if func.default is not undefined:
                 self._set_prop(name, func.default, True)
         
@@ -162,43 +166,92 @@ class HasEventsJS:
 
 
 class Loop:
+    """ The JS version of the loop. Each priority lane is an array with
+    the index of its first pending call, so that taking a call is O(1).
+    """
     
     def __init__(self):
-        self._pending_calls = []
+        self._lanes = [[], [], []]  # one per priority
+        self._heads = [0, 0, 0]
         self._scheduled = False
+        self._time_budget = 0
+        self._handler_observers = []  # called after each handler invocation
     
-    def call_later(self, func):
+    def call_later(self, func, priority=1):
         """ Call the given function in the next iteration of the "event loop".
         """
-        self._pending_calls.append(func)
+        self._lanes[priority].append(func)
         if not self._scheduled:
             self._scheduled = True
             setTimeout(self.iter, 0)
     
+    def set_time_budget(self, budget):
+        """ Set the maximum time (in seconds) that an iteration may take.
+        """
+        self._time_budget = budget
+    
     def iter(self):
-        """ Do one event loop iteration; process all pending function calls.
+        """ Do one event loop iteration; process all pending function calls,
+        or as many as fit in the time budget.
         """
         self._scheduled = False
-        while len(self._pending_calls):
-            func = self._pending_calls.pop(0)
+        t0 = perf_counter()
+        i = 0
+        while i < 3:
+            lane = self._lanes[i]
+            head = self._heads[i]
+            if head >= len(lane):
+                if head > 0:
+                    self._lanes[i] = []
+                    self._heads[i] = 0
+                i += 1
+                continue
+            func = lane[head]
+            lane[head] = None
+            self._heads[i] = head + 1
             try:
                 func()
             except Exception as err:
                 console.log(err)
+            i = 0  # calls may add calls, possibly to a higher priority lane
+            if self._time_budget > 0 and perf_counter() - t0 > self._time_budget:
+                if not self._scheduled:
+                    self._scheduled = True
+                    setTimeout(self.iter, 0)
+                break
+
+
+def _use_std_function(meta, name):
+    """ Mark a std function (and its dependencies) as used in the meta,
+    for code that is not produced by py2js().
+    """
+    _, function_deps, method_deps = get_std_info(FUNCTIONS[name])
+    meta['std_functions'].update([name] + function_deps)
+    meta['std_methods'].update(method_deps)
 
 
 def get_HasEvents_js():
     """ Get the final code for the JavaScript version of the HasEvents class.
+    The result has a ``meta`` attribute with the std functions and methods
+    that the code uses.
     """
+    # Collect the std functions and methods used by all code pieces
+    meta = {'std_functions': set(), 'std_methods': set()}
+    def py2js_local(*args, **kwargs):
+        code = py2js(*args, **kwargs)
+        for key in meta:
+            meta[key].update(code.meta[key])
+        return code
+    
     # Add the loop
-    jscode = py2js(Loop, 'Loop') + '\nvar loop = new Loop();\n'
+    jscode = py2js_local(Loop, 'Loop') + '\nvar loop = new Loop();\n'
     # Start with our special JS version
-    jscode += py2js(HasEventsJS, 'HasEvents')
+    jscode += py2js_local(HasEventsJS, 'HasEvents')
     # Add the Handler methods
     code = '\n'
     for name, val in sorted(Handler.__dict__.items()):
         if not name.startswith('__') and callable(val):
-            code += py2js(val, 'handler.' + name, indent=1)[4:]
+            code += py2js_local(val, 'handler.' + name, indent=1)[4:]
             code += '\n'
     jscode = jscode.replace('HANDLER_METHODS_HOOK', code)
     # Add the methods from the Python HasEvents class
@@ -206,11 +259,16 @@ def get_HasEvents_js():
     for name, val in sorted(HasEvents.__dict__.items()):
         if name.startswith(('__', '_HasEvents__')) or not callable(val):
             continue
-        code += py2js(val, 'HasEvents.prototype.' + name)
+        code += py2js_local(val, 'HasEvents.prototype.' + name)
         code += '\n'
     jscode += code
     # Almost done
-    jscode = jscode.replace('new Dict()', '{}').replace('new Dict(', '_pyfunc_dict(')
+    jscode = jscode.replace('new Dict()', '{}')
+    if 'new Dict(' in jscode:
+        jscode = jscode.replace('new Dict(', '_pyfunc_dict(')
+        _use_std_function(meta, 'dict')
+    jscode = JSString(jscode)
+    jscode.meta = meta
     return jscode
 
 
@@ -252,6 +310,7 @@ def create_js_hasevents_class(cls, cls_name, base_class='HasEvents.prototype'):
            'or a list/tuple thereof. Not %s -> %r.')
     
     total_code.append('\n'.join(get_class_definition(cls_name, base_class)).rstrip())
+    _use_std_function(meta, 'op_instantiate')
     prefix = '' if cls_name.count('.') else 'var '
     total_code[0] = prefix + total_code[0]
     
@@ -284,6 +343,10 @@ def create_js_hasevents_class(cls, cls_name, base_class='HasEvents.prototype'):
                 default_val = json.dumps(val._defaults[0])
                 t = '%s.prototype.%s.default = %s;'
                 funcs_code.append(t % (cls_name, funcname, default_val))
+            # Coalesce mode?
+            if isinstance(val, Property) and val._coalesce:
+                t = '%s.prototype.%s.coalesce = %s;'
+                funcs_code.append(t % (cls_name, funcname, reprs(val._coalesce)))
             # Add type of emitter
             t = '%s.prototype.%s.emitter_type = %s;'
             emitter_type = val.__class__.__name__
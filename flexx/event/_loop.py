@@ -4,6 +4,11 @@ event loop such as tornado or Qt.
 """
 
 import sys
+try:  # pragma: no cover
+    from time import perf_counter
+except ImportError:  # Python < 3.3
+    from time import time as perf_counter
+from collections import deque
 
 from . import logger
 
@@ -20,37 +25,79 @@ class Loop:
     ``flexx.event`` gets imported, the loop is integrated automatically.
     This object can also be used as a context manager; events get
     processed when the context exits.
+    
+    Pending calls are kept in priority lanes: calls in a higher priority
+    lane are done before those in a lower one. By default, handlers use
+    the normal lane (see ``Handler.set_priority()``). An optional time
+    budget limits how long an iteration can take, so that the host event
+    loop can do its work (e.g. socket I/O) during a storm of events.
     """
     
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_LOW = 2
+    
     def __init__(self):
-        self._pending_calls = []
+        self._lanes = deque(), deque(), deque()  # one per priority
         self._calllaterfunc = lambda x: None
         self._scheduled_update = False
+        self._time_budget = 0
+        self._handler_observers = []  # see add_handler_observer()
     
-    def call_later(self, func):
+    def call_later(self, func, priority=1):
         """ Call the given function in the next iteration of the event loop.
+        The priority can be 0 (high), 1 (normal, default) or 2 (low).
         """
-        self._pending_calls.append(func)
+        self._lanes[priority].append(func)
         if not self._scheduled_update:
             self._scheduled_update = True
             self._calllaterfunc(self.iter)
     
+    def set_time_budget(self, budget):
+        """ Set the maximum time (in seconds) that an iteration may take.
+        When the budget is exceeded, the remaining calls are done in a
+        next iteration, so the host event loop can process other work in
+        between. Zero (default) means no limit. Note that a single call
+        is never interrupted.
+        """
+        self._time_budget = float(budget)
+    
     def iter(self):
-        """ Do one event loop iteration; process all pending function calls.
+        """ Do one event loop iteration; process all pending function calls,
+        or as many as fit in the time budget.
         """
         self._scheduled_update = False
-        while self._pending_calls:
-            func = self._pending_calls.pop(0)
+        budget = self._time_budget
+        t0 = perf_counter()
+        lanes = self._lanes
+        while True:
+            # Calls may add calls, possibly to a higher priority lane
+            for lane in lanes:
+                if lane:
+                    func = lane.popleft()
+                    break
+            else:
+                break
             try:
                 func()
             except Exception as err:
                 logger.exception(err)
+            if budget and perf_counter() - t0 > budget:
+                if any(lanes) and not self._scheduled_update:
+                    self._scheduled_update = True
+                    self._calllaterfunc(self.iter)
+                break
     
     def __enter__(self):
         return self
     
     def __exit__(self, type, value, traceback):
-        self.iter()
+        # Process all pending calls, regardless of the time budget
+        budget, self._time_budget = self._time_budget, 0
+        try:
+            self.iter()
+        finally:
+            self._time_budget = budget
     
     def integrate(self, call_later_func=None, raise_on_fail=True):
         """ Integrate with an existing event loop system.
@@ -0,0 +1,166 @@
+"""
+Profiling of event handlers.
+"""
+
+import time
+
+from ._handler import add_handler_observer, remove_handler_observer
+from . import logger
+
+
+# The profilers that are currently collecting
+_active_profilers = []
+
+
+class HandlerStats:
+    """ Statistics of the invocations of one handler. The ``source`` is
+    'py' or 'js'. The ``triggers`` attribute is a dict that maps the
+    connection strings via which the handler was invoked to a count.
+    """
+
+    def __init__(self, name, source='py'):
+        self.name = name
+        self.source = source
+        self.calls = 0
+        self.events = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.triggers = {}
+
+    def __repr__(self):
+        return ('<HandlerStats %s (%s): %i calls, %1.1f events per call, '
+                '%1.3f s total, %1.3f s max>' % (self.name, self.source, self.calls,
+                                                 self.events_per_call,
+                                                 self.total, self.max))
+
+    @property
+    def events_per_call(self):
+        """ The average number of events per call.
+        """
+        return self.events / self.calls if self.calls else 0.0
+
+    @property
+    def mean(self):
+        """ The average time per call.
+        """
+        return self.total / self.calls if self.calls else 0.0
+
+
+class HandlerProfiler:
+    """ Collect statistics on the invocations of event handlers: the
+    number of calls, events per call, cumulative and maximum time, and
+    the connection strings that triggered them. Handlers are grouped by
+    class name and handler name.
+
+    Can be used as a context manager:
+
+    .. code-block:: py
+
+        with event.HandlerProfiler() as profiler:
+            ...
+        print(profiler.report())
+
+    Parameters:
+        report_interval (float): if nonzero, the slowest handlers are
+            logged (at level info) at most this often (in seconds), as
+            long as handlers are being called.
+        top (int): the number of handlers in a report. Default 10.
+
+    In ``flexx.app``, the handlers that run in JavaScript can also be
+    profiled, see ``Session.profile_js_handlers()``. Their stats are
+    collected by all profilers that are active.
+    """
+
+    def __init__(self, report_interval=0, top=10):
+        self._report_interval = report_interval
+        self._top = top
+        self._stats = {}
+        self._last_report = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def start(self):
+        """ Start collecting stats.
+        """
+        if self not in _active_profilers:
+            _active_profilers.append(self)
+            add_handler_observer(self._on_handler_call)
+            self._last_report = time.time()
+
+    def stop(self):
+        """ Stop collecting stats.
+        """
+        if self in _active_profilers:
+            _active_profilers.remove(self)
+            remove_handler_observer(self._on_handler_call)
+
+    def clear(self):
+        """ Remove all stats that were collected.
+        """
+        self._stats = {}
+
+    def get_stats(self, sort='total'):
+        """ Get a list of HandlerStats objects, sorted (descending) by
+        the given attribute, e.g. 'total', 'max', 'mean' or 'calls'.
+        """
+        return sorted(self._stats.values(),
+                      key=lambda s: getattr(s, sort), reverse=True)
+
+    def report(self, top=None, sort='total'):
+        """ Get a string with a table of the slowest handlers.
+        """
+        top = self._top if top is None else top
+        lines = ['%-40s %-3s %8s %7s %9s %9s  %s' %
+                 ('handler', 'src', 'calls', 'ev/call', 'total ms',
+                  'max ms', 'most common trigger')]
+        for stats in self.get_stats(sort)[:top]:
+            trigger = ''
+            if stats.triggers:
+                trigger = max(stats.triggers, key=stats.triggers.get)
+            lines.append('%-40s %-3s %8i %7.1f %9.1f %9.1f  %s' %
+                         (stats.name[-40:], stats.source, stats.calls,
+                          stats.events_per_call, stats.total * 1000,
+                          stats.max * 1000, trigger))
+        return '\n'.join(lines)
+
+    def _on_handler_call(self, handler, events, duration):
+        ob = handler._ob1()
+        name = handler._name
+        if ob is not None:
+            name = ob.__class__.__name__ + '.' + name
+        triggers = {}
+        for ev in events:
+            trigger = handler._get_connection_string(ev)
+            triggers[trigger] = triggers.get(trigger, 0) + 1
+        self._add(name, 'py', 1, len(events), duration, duration, triggers)
+
+    def _add(self, name, source, calls, events, total, longest, triggers):
+        stats = self._stats.get((name, source), None)
+        if stats is None:
+            stats = self._stats[(name, source)] = HandlerStats(name, source)
+        stats.calls += calls
+        stats.events += events
+        stats.total += total
+        stats.max = stats.max if stats.max > longest else longest
+        for trigger, count in triggers.items():
+            stats.triggers[trigger] = stats.triggers.get(trigger, 0) + count
+
+        interval = self._report_interval
+        if interval and time.time() - self._last_report > interval:
+            self._last_report = time.time()
+            logger.info('Slowest handlers:\n' + self.report())
+
+
+def add_js_handler_stats(stats):
+    """ Add stats of handlers that were invoked in JavaScript to the
+    active profilers. The stats is a list of lists
+    ``[name, calls, events, total, max, triggers]``.
+    """
+    for profiler in _active_profilers:
+        for name, calls, events, total, longest, triggers in stats:
+            profiler._add(name, 'js', calls, events, total, longest, triggers)
@@ -166,6 +166,46 @@ def test_name(Person):
     name.r4.append(name.full_name)
     return name.r4
 
+@run_in_both(Person, "['_set_full_name', 2, 'first_name', 'last_name', 'ok']")
+def test_handler_observers(Person):
+    res = []
+    def observer(handler, events, duration):
+        res.append(handler._name)
+        res.append(len(events))
+        for ev in events:
+            res.append(handler._get_connection_string(ev))
+        if duration >= 0:
+            res.append('ok')
+    
+    name = Person()
+    name._set_full_name.handle_now()
+    loop._handler_observers.append(observer)
+    name.first_name = 'jane'
+    name.last_name = 'foo'
+    name._set_full_name.handle_now()
+    loop._handler_observers.remove(observer)
+    name.first_name = 'x'
+    name._set_full_name.handle_now()
+    return res
+
+@run_in_both(Person, "['normal', 'high', '|', 'high', 'normal']")
+def test_handler_priority(Person):
+    res = []
+    def normal(*events):
+        res.append('normal')
+    def high(*events):
+        res.append('high')
+    
+    name = Person()
+    name.connect(normal, 'first_name')
+    handler = name.connect(high, 'first_name')
+    handler.set_priority(0)  # the initial event was already scheduled
+    loop.iter()
+    res.append('|')
+    name.first_name = 'jane'
+    loop.iter()
+    return res
+
 @run_in_both(Person, "[3, 'bar', [1, 2, 3]]")
 def test_class_attributes(Person):
     name = Person()
@@ -409,6 +449,115 @@ def test_prop_recursion(PropRecursion):
     return []
 
 
+class Collection(event.HasEvents):
+    
+    def __init__(self):
+        self.r = []
+        super().__init__()
+    
+    @event.prop
+    def items(self, v=()):
+        return list(v)
+    
+    @event.prop
+    def info(self, v=None):
+        return dict(v or {})
+    
+    @event.connect('items', 'info')
+    def _log(self, *events):
+        for ev in events:
+            self.r.append(ev.get('mutation', 'set') + str(ev.get('index', '')))
+
+
+@run_in_both(Collection, "[2, 3, 4, 1, 2, " +
+                         "'set set insert0 insert3 replace1 remove0 update0']")
+def test_mutate_prop(Collection):
+    c = Collection()
+    c._log.handle_now()
+    items = c.items
+    c._mutate_prop('items', 'insert', 0, [1, 2, 3])
+    c._mutate_prop('items', 'insert', 3, [4])
+    c._mutate_prop('items', 'replace', 1, [9])
+    c._mutate_prop('items', 'remove', 0, 2)
+    c._mutate_prop('info', 'update', 0, {'a': 1, 'b': 2})
+    c._log.handle_now()
+    assert c.items is items  # in-place
+    return [len(c.items), c.items[0], c.items[1], c.info['a'], c.info['b'],
+            ' '.join(c.r)]
+
+
+@run_in_both(Collection, "['ok-name', 'ok-mutation']")
+def test_mutate_prop_fail(Collection):
+    c = Collection()
+    res = []
+    try:
+        c._mutate_prop('foo', 'insert', 0, [1])
+    except AttributeError:
+        res.append('ok-name')
+    try:
+        c._mutate_prop('items', 'append', 0, [1])
+    except ValueError:
+        res.append('ok-mutation')
+    return res
+
+
+class Counter(event.HasEvents):
+    
+    def __init__(self):
+        self.r = []
+        super().__init__()
+    
+    @event.prop(coalesce='span')
+    def count(self, v=0):
+        return int(v)
+    
+    @event.prop
+    def items(self, v=()):
+        return list(v)
+    
+    @event.connect('count', 'items')
+    def _log(self, *events):
+        for ev in events:
+            if ev.type == 'count':
+                self.r.append(str(ev.old_value) + '-' + str(ev.new_value))
+            elif ev.get('mutation', ''):
+                self.r.append(ev.mutation)
+            else:
+                self.r.append('set' + str(len(ev.old_value)))  # new_value is mutated
+
+
+@run_in_both(Counter, "['0-0 set0 | 0-3 | set1 insert set1 | 4-5 | ok']")
+def test_coalesce(Counter):
+    c = Counter()
+    c._log.handle_now()
+    c.r.append('|')
+    c.count = 1
+    c.count = 2
+    c.count = 3
+    c._log.handle_now()
+    c.r.append('|')
+    # Mutations are never coalesced, and keep their order
+    c.set_coalesce('items', 'latest')
+    c.items = [1]
+    c.items = [1, 2]
+    c._mutate_prop('items', 'insert', 0, [0])
+    c.items = [3]
+    c.items = [4]
+    c._log.handle_now()
+    c.r.append('|')
+    # The mode of the handler overrides that of the source
+    c._log.set_coalesce('latest')
+    c.count = 4
+    c.count = 5
+    c._log.handle_now()
+    c.r.append('|')
+    try:
+        c.set_coalesce('count', 'foo')
+    except ValueError:
+        c.r.append('ok')
+    return [' '.join(c.r)]
+
+
 ## Test HasEvents class
 
 @run_in_both(Person, "[3, 'bar', [1, 2, 3]]")
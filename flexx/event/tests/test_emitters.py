@@ -202,6 +202,43 @@ def test_readonly():
     assert ob.foo is None
 
 
+def test_coalesce():
+    class MyObject(event.HasEvents):
+        
+        @event.prop(coalesce='span')
+        def foo(self, v=1):
+            return int(v)
+        
+        @event.readonly(coalesce='latest')
+        def bar(self, v=1):
+            return int(v)
+        
+        @event.prop
+        def spam(self, v=1):
+            return int(v)
+    
+    m = MyObject()
+    assert m.get_coalesce('foo') == 'span'
+    assert m.get_coalesce('bar') == 'latest'
+    assert m.get_coalesce('spam') == ''
+    m.set_coalesce('spam', 'latest')
+    assert m.get_coalesce('spam') == 'latest'
+    m.set_coalesce('foo', None)
+    assert m.get_coalesce('foo') == ''
+    
+    with raises(ValueError):
+        m.set_coalesce('foo', 'first')
+    with raises(ValueError):
+        event.prop(coalesce='first')(lambda self, v=1: v)
+    with raises(ValueError):
+        m.connect(lambda *events: None, 'foo').set_coalesce('first')
+    
+    # The prop still works
+    m.foo = 3
+    assert m.foo == 3
+    assert MyObject.foo.__doc__.startswith('*property*')
+
+
 def test_emitter():
     
     class MyObject(event.HasEvents):
@@ -374,4 +374,42 @@ def test_disposing_emitter():
     assert foo_ref() is None
 
 
+def test_mutate_prop_arrays():
+    from array import array
+    
+    class Foo(event.HasEvents):
+        @event.prop
+        def data(self, v=None):
+            return v
+    
+    foo = Foo()
+    
+    foo.data = array('d', [1, 2, 3])
+    foo._mutate_prop('data', 'insert', 1, [7, 8])
+    assert foo.data.tolist() == [1, 7, 8, 2, 3]
+    foo._mutate_prop('data', 'remove', 0, 2)
+    assert foo.data.tolist() == [8, 2, 3]
+    foo._mutate_prop('data', 'replace', 2, [9])
+    assert foo.data.tolist() == [8, 2, 9]
+    assert foo.data.typecode == 'd'
+    
+    # Memoryviews become arrays
+    foo.data = memoryview(array('f', [1, 2]))
+    foo._mutate_prop('data', 'insert', 2, [3])
+    assert isinstance(foo.data, array) and foo.data.tolist() == [1, 2, 3]
+    
+    try:
+        import numpy as np
+    except ImportError:
+        return
+    foo.data = np.array([1, 2, 3], 'float32')
+    foo._mutate_prop('data', 'insert', 3, [4, 5])
+    assert foo.data.tolist() == [1, 2, 3, 4, 5]
+    foo._mutate_prop('data', 'remove', 1, 3)
+    assert foo.data.tolist() == [1, 5]
+    foo._mutate_prop('data', 'replace', 0, [6])
+    assert foo.data.tolist() == [6, 5]
+    assert foo.data.dtype == 'float32'
+
+
 run_tests_if_main()
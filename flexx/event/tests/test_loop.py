@@ -1,4 +1,6 @@
 
+import time
+
 from flexx.util.testing import run_tests_if_main, skipif, skip, raises
 
 from flexx import event
@@ -81,4 +83,82 @@ def test_integrate():
     event.loop._calllaterfunc = ori
 
 
+def test_priority():
+    
+    res = []
+    loop = event._loop.Loop()
+    
+    def normal():
+        res.append('n')
+        loop.call_later(lambda: res.append('h2'), 0)
+    
+    loop.call_later(normal)
+    loop.call_later(lambda: res.append('l'), 2)
+    loop.call_later(lambda: res.append('h'), 0)
+    loop.call_later(lambda: res.append('n2'), 1)
+    loop.iter()
+    assert res == ['h', 'n', 'h2', 'n2', 'l']
+    
+    with raises(IndexError):
+        loop.call_later(normal, 3)
+
+
+def test_time_budget():
+    
+    res = []
+    scheduled = []
+    loop = event._loop.Loop()
+    loop.integrate(scheduled.append)
+    scheduled[:] = []
+    
+    def slow():
+        time.sleep(0.01)
+        res.append(1)
+    
+    loop.set_time_budget(0.005)
+    for i in range(3):
+        loop.call_later(slow)
+    assert len(scheduled) == 1
+    
+    # Each iteration does at least one call, and schedules a new iteration
+    loop.iter()
+    assert res == [1]
+    assert len(scheduled) == 2
+    loop.iter()
+    loop.iter()
+    assert res == [1, 1, 1]
+    assert len(scheduled) == 3
+    loop.iter()
+    assert len(scheduled) == 3
+    
+    # The context manager processes all calls
+    with loop:
+        for i in range(3):
+            loop.call_later(slow)
+    assert len(res) == 6
+    assert loop._time_budget == 0.005
+    
+    # No budget
+    loop.set_time_budget(0)
+    for i in range(3):
+        loop.call_later(slow)
+    loop.iter()
+    assert len(res) == 9
+
+
+def test_handler_priority():
+    
+    res = []
+    foo = Foo()
+    h1 = foo.connect(lambda *events: res.append('normal'), 'foo')
+    h2 = foo.connect(lambda *events: res.append('high'), 'foo')
+    h2.set_priority(0)
+    with raises(ValueError):
+        h2.set_priority(3)
+    
+    foo.emit('foo', {})
+    event.loop.iter()
+    assert res == ['high', 'normal']
+
+
 run_tests_if_main()
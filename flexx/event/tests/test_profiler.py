@@ -0,0 +1,107 @@
+""" Tests for the handler profiler
+"""
+
+import time
+import logging
+
+from flexx.util.testing import run_tests_if_main
+
+from flexx import event
+from flexx.event import loop
+from flexx.event._profiler import add_js_handler_stats
+
+
+class Foo(event.HasEvents):
+    
+    @event.prop
+    def foo(self, v=0):
+        return v
+    
+    @event.prop
+    def bar(self, v=0):
+        return v
+    
+    @event.connect('foo', 'bar')
+    def slow_handler(self, *events):
+        time.sleep(0.01)
+    
+    @event.connect('foo')
+    def fast_handler(self, *events):
+        pass
+
+
+def test_profiler():
+    
+    foo = Foo()
+    loop.iter()
+    
+    with event.HandlerProfiler() as profiler:
+        for i in range(3):
+            foo.foo = i + 1
+            loop.iter()
+        foo.foo = 10
+        foo.bar = 10
+        loop.iter()
+    foo.foo = 20
+    loop.iter()  # not profiled
+    
+    stats = profiler.get_stats()
+    assert [s.name for s in stats] == ['Foo.slow_handler', 'Foo.fast_handler']
+    slow, fast = stats
+    assert slow.source == 'py'
+    assert slow.calls == 4 and fast.calls == 4
+    assert slow.events == 5 and slow.events_per_call == 1.25
+    assert slow.triggers == {'foo': 4, 'bar': 1}
+    assert slow.total >= 0.04 and slow.max >= 0.01
+    assert 0 < slow.mean < slow.total
+    assert fast.total < slow.total
+    
+    report = profiler.report(top=1)
+    assert len(report.splitlines()) == 2
+    assert 'Foo.slow_handler' in report and 'foo' in report
+    assert 'fast_handler' in profiler.report()
+    
+    profiler.clear()
+    assert profiler.get_stats() == []
+    assert profiler._on_handler_call not in loop._handler_observers
+
+
+def test_profiler_js_stats():
+    profiler = event.HandlerProfiler()
+    add_js_handler_stats([['Foo.bar', 2, 3, 0.5, 0.4, {'x': 3}]])  # not active
+    assert profiler.get_stats() == []
+    
+    with profiler:
+        add_js_handler_stats([['Foo.bar', 2, 3, 0.5, 0.4, {'x': 3}]])
+        add_js_handler_stats([['Foo.bar', 1, 1, 0.1, 0.1, {'x': 1}]])
+    stats, = profiler.get_stats()
+    assert stats.name == 'Foo.bar' and stats.source == 'js'
+    assert stats.calls == 3 and stats.events == 4
+    assert abs(stats.total - 0.6) < 1e-9 and stats.max == 0.4
+    assert stats.triggers == {'x': 4}
+
+
+def test_profiler_report_interval():
+    
+    messages = []
+    class Handler(logging.Handler):
+        def emit(self, record):
+            messages.append(record.getMessage())
+    handler = Handler()
+    logger = logging.getLogger('flexx.event')
+    logger.addHandler(handler)
+    
+    try:
+        foo = Foo()
+        loop.iter()
+        with event.HandlerProfiler(report_interval=0.001) as profiler:
+            time.sleep(0.01)
+            foo.foo = 3
+            loop.iter()
+    finally:
+        logger.removeHandler(handler)
+    
+    assert any(m.startswith('Slowest handlers:') for m in messages)
+
+
+run_tests_if_main()
@@ -0,0 +1,251 @@
+"""
+On-disk cache for transpiled PyScript. Transpiling is relatively
+expensive, and Flexx transpiles all methods, handlers and properties
+of all Model classes at import time. This cache allows processes to
+reuse the JS produced by earlier processes.
+
+The cache is content-addressed: the key is a hash of the Python code,
+the parser options, the Python version and the source of PyScript
+itself, so that any change to the transpiler invalidates the cache.
+Entries are stored as small JSON files. When the total size exceeds
+the configured maximum, the least recently used entries are removed.
+
+The cache is enabled by setting ``flexx.config.pyscript_cache`` to a
+directory name (a leading "~appdata" is replaced with the Flexx appdata
+dir). The maximum size (in MiB) is set with
+``flexx.config.pyscript_cache_size``.
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+from . import logger
+
+
+META_SETS = ('vars_defined', 'vars_unknown', 'vars_global',
+             'std_functions', 'std_methods')
+
+_signature = None
+
+
+def replace_file(src, dst):
+    """ Rename src to dst, replacing dst if it exists. This is atomic, and
+    thus safe between processes, except on Windows with Python < 3.3.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:  # pragma: no cover - Python < 3.3
+        if sys.platform.startswith('win') and os.path.isfile(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def get_transpiler_signature():
+    """ Get a string that identifies the current version of PyScript.
+    This is a hash of the source code of the PyScript package and the
+    Python version, so that the cache gets invalidated when the
+    transpiler changes.
+    """
+    global _signature
+    if _signature is None:
+        h = hashlib.sha256()
+        h.update(('python %i.%i' % sys.version_info[:2]).encode())
+        dirname = os.path.dirname(os.path.abspath(__file__))
+        try:
+            fnames = sorted(f for f in os.listdir(dirname) if f.endswith('.py'))
+            for fname in fnames:
+                with open(os.path.join(dirname, fname), 'rb') as f:
+                    h.update(f.read())
+        except Exception:  # pragma: no cover - e.g. in a frozen app
+            from .. import __version__
+            h.update(('flexx ' + __version__).encode())
+        _signature = h.hexdigest()
+    return _signature
+
+
+def make_key(pyhash, module_mode, parser_options):
+    """ Get the cache key for a piece of code.
+
+    Parameters:
+        pyhash (bytes): the hash of the Python code (as in ``meta['pyhash']``).
+        module_mode (bool): whether the code is parsed as a module.
+        parser_options (dict): the options given to the Parser.
+    """
+    h = hashlib.sha256(get_transpiler_signature().encode())
+    h.update(pyhash)
+    h.update(('module_mode=%r' % bool(module_mode)).encode())
+    for key in sorted(parser_options):
+        h.update(('%s=%r' % (key, parser_options[key])).encode())
+    return h.hexdigest()
+
+
+class TranspileCache:
+    """ A size-bounded on-disk cache for transpiled code. Maps keys
+    (as produced by ``make_key()``) to a JS string plus the set-valued
+    meta information produced by the parser.
+
+    Parameters:
+        dirname (str): the directory to store the cache files. It is
+            created if it does not exist.
+        max_size (int): the maximum total size of the cache in bytes.
+    """
+
+    def __init__(self, dirname, max_size):
+        self._dirname = dirname
+        self._max_size = int(max_size)
+        self._size = None  # determined lazily
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '<%s at %r with %i hits and %i misses>' % (
+            self.__class__.__name__, self._dirname, self.hits, self.misses)
+
+    @property
+    def dirname(self):
+        """ The directory in which the cache stores its entries.
+        """
+        return self._dirname
+
+    @property
+    def max_size(self):
+        """ The maximum size of the cache in bytes.
+        """
+        return self._max_size
+
+    def _filename(self, key):
+        return os.path.join(self._dirname, key + '.json')
+
+    def get(self, key):
+        """ Get a tuple (jscode, meta) for the given key, or None if the
+        key is not in the cache. The meta is a dict that contains the
+        set-valued meta info of the code.
+        """
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                d = json.loads(f.read().decode())
+            meta = dict((name, set(d[name])) for name in META_SETS)
+            jscode = d['jscode']
+        except Exception:
+            self.misses += 1
+            return None
+        # Mark as recently used, so eviction leaves this entry alone
+        try:
+            os.utime(filename, None)
+        except OSError:  # pragma: no cover
+            pass
+        self.hits += 1
+        return jscode, meta
+
+    def set(self, key, jscode, meta):
+        """ Store the given jscode and (the set-valued fields of the) meta
+        dict under the given key. Failures to write are logged, but
+        otherwise ignored.
+        """
+        d = dict((name, sorted(meta[name])) for name in META_SETS)
+        d['jscode'] = str(jscode)
+        data = json.dumps(d).encode()
+        filename = self._filename(key)
+        tmpname = '%s.%i.tmp' % (filename, os.getpid())
+        try:
+            if not os.path.isdir(self._dirname):
+                os.makedirs(self._dirname)
+            with open(tmpname, 'wb') as f:
+                f.write(data)
+            replace_file(tmpname, filename)
+        except Exception as err:
+            logger.warn('Could not write to PyScript cache: %s' % str(err))
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+            return
+        if self._size is None:
+            self._size = self._get_total_size()
+        else:
+            self._size += len(data)
+        if self._size > self._max_size:
+            self.evict()
+
+    def _get_entries(self):
+        """ Get list of (mtime, size, filename) tuples, oldest first.
+        """
+        entries = []
+        try:
+            fnames = os.listdir(self._dirname)
+        except OSError:
+            return entries
+        for fname in fnames:
+            if not fname.endswith('.json'):
+                continue
+            filename = os.path.join(self._dirname, fname)
+            try:
+                st = os.stat(filename)
+            except OSError:  # pragma: no cover - removed by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, filename))
+        entries.sort()
+        return entries
+
+    def _get_total_size(self):
+        return sum(e[1] for e in self._get_entries())
+
+    def evict(self):
+        """ Remove the least recently used entries until the size of the
+        cache is below 80% of the maximum size.
+        """
+        entries = self._get_entries()
+        size = sum(e[1] for e in entries)
+        target = 0.8 * self._max_size
+        count = 0
+        for mtime, fsize, filename in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(filename)
+            except OSError:  # pragma: no cover
+                continue
+            size -= fsize
+            count += 1
+        self._size = size
+        if count:
+            logger.debug('Evicted %i entries from the PyScript cache.' % count)
+
+    def clear(self):
+        """ Remove all entries from the cache.
+        """
+        for mtime, fsize, filename in self._get_entries():
+            try:
+                os.remove(filename)
+            except OSError:  # pragma: no cover
+                pass
+        self._size = 0
+
+
+_cache = None
+
+
+def get_cache():
+    """ Get the TranspileCache object corresponding to the current config,
+    or None if caching is disabled.
+    """
+    global _cache
+    from .. import config
+    from ..util.config import appdata_dir
+
+    dirname = config.pyscript_cache.strip()
+    if not dirname and config.build_dir.strip():
+        dirname = os.path.join(config.build_dir.strip(), 'pyscript_cache')
+    if not dirname:
+        return None
+    if dirname.startswith('~appdata'):
+        dirname = appdata_dir('flexx') + dirname[len('~appdata'):]
+    dirname = os.path.abspath(os.path.expanduser(dirname))
+    max_size = config.pyscript_cache_size * 2**20
+    if (_cache is None or _cache.dirname != dirname or
+                          _cache.max_size != max_size):
+        _cache = TranspileCache(dirname, max_size)
+    return _cache
@@ -1,14 +1,13 @@
 import os
-import sys
 import types
 import inspect
 import hashlib
-import tempfile
 import subprocess
 
 from . import Parser
 from .stdlib import get_full_std_lib  # noqa
 from .modules import create_js_module
+from .cache import get_cache, make_key
 
 
 class JSString(str):
@@ -48,6 +47,10 @@ def py2js(ob=None, new_name=None, **parser_options):
         multiple classes with the same name are defined. This is a
         consequence of classes not having a corresponding code object (in
         contrast to functions).
+        
+        If ``flexx.config.pyscript_cache`` is set, the resulting JS is
+        cached on disk, so that subsequent processes can skip the
+        transpilation (see ``flexx.pyscript.cache``).
     
     """
     
@@ -95,17 +98,37 @@ def py2js(ob=None, new_name=None, **parser_options):
             raise ValueError('py2js() only accepts non-builtin modules, '
                              'classes and functions.')
         
-        # Get hash, in case we ever want to cache JS accross sessions
+        # Get hash, used to cache JS accross sessions
         h = hashlib.sha256('pyscript version 1'.encode())
         h.update(pycode.encode())
         hash = h.digest()
         
+        # Try getting JS code and meta info from the cache. The parser
+        # produces different code in module mode (see parse_Module).
+        cache = get_cache()
+        cached = None
+        if cache is not None:
+            module_mode = bool(filename) and linenr == 0
+            key = make_key(hash, module_mode, parser_options)
+            cached = cache.get(key)
+        
         # Get JS code
-        if filename:
-            p = Parser(pycode, (filename, linenr), **parser_options)
+        if cached is not None:
+            jscode, meta = cached
         else:
-            p = Parser(pycode, **parser_options)
-        jscode = p.dump()
+            if filename:
+                p = Parser(pycode, (filename, linenr), **parser_options)
+            else:
+                p = Parser(pycode, **parser_options)
+            jscode = p.dump()
+            meta = {}
+            meta['vars_defined'] = set(n for n in p.vars if p.vars[n])
+            meta['vars_unknown'] = set(n for n in p.vars if not p.vars[n])
+            meta['vars_global'] = set(n for n in p.vars if p.vars[n] is False)
+            meta['std_functions'] = p._std_functions
+            meta['std_methods'] = p._std_methods
+            if cache is not None:
+                cache.set(key, jscode, meta)
         if new_name and thetype in ('class', 'def'):
             jscode = js_rename(jscode, ob.__name__, new_name)
         
@@ -119,11 +142,7 @@ def py2js(ob=None, new_name=None, **parser_options):
         jscode.meta['linenr'] = linenr
         jscode.meta['pycode'] = pycode
         jscode.meta['pyhash'] = hash
-        jscode.meta['vars_defined'] = set(n for n in p.vars if p.vars[n])
-        jscode.meta['vars_unknown'] = set(n for n in p.vars if not p.vars[n])
-        jscode.meta['vars_global'] = set(n for n in p.vars if p.vars[n] is False)
-        jscode.meta['std_functions'] = p._std_functions
-        jscode.meta['std_methods'] = p._std_methods
+        jscode.meta.update(meta)
         
         return jscode
     
@@ -178,63 +197,39 @@ def get_node_exe():
     return NODE_EXE
 
 
-_eval_count = 0
-
-def evaljs(jscode, whitespace=True, print_result=True):
+def evaljs(jscode, whitespace=True, print_result=True, timeout=30):
     """ Evaluate JavaScript code in Node.js.
     
+    The code is evaluated in strict mode, in a fresh context, by one of a
+    pool of long-lived Node.js processes (see ``flexx.pyscript.nodepool``).
+    Output from ``console.log()`` in timers that the code sets is included.
+    
     parameters:
         jscode (str): the JavaScript code to evaluate.
         whitespace (bool): if whitespace is False, the whitespace
             is removed from the result. Default True.
         print_result (bool): whether to print the result of the evaluation.
-            Default True. If False, larger pieces of code can be evaluated
-            because we can use file-mode.
+            Default True.
+        timeout (float): the maximum time in seconds that the evaluation,
+            including its timers, may take. Default 30.
     
     returns:
         result (str): the last result as a string.
     """
-    global _eval_count
-    
-    # Prepare command
-    if len(jscode) > 2**14:
-        if print_result:
-            # Strictly speaking, this is a limitation of Windows, but come-on!
-            raise RuntimeError('evaljs() wont send more than 16 kB of code '
-                               'over the command line, but cannot use a file '
-                               'unless print_result is False.')
-        _eval_count += 1
-        fname = 'pyscript_%i_%i.js' % (os.getpid(), _eval_count)
-        filename = os.path.join(tempfile.gettempdir(), fname)
-        with open(filename, 'wb') as f:
-            f.write(jscode.encode())
-        cmd = [get_node_exe(), '--use_strict', filename]
-    else:
-        filename = None
-        p_or_e = ['-p', '-e'] if print_result else ['-e']
-        cmd = [get_node_exe(), '--use_strict'] + p_or_e + [jscode]
-        if sys.version_info[0] < 3:
-            cmd = [c.encode('raw_unicode_escape') for c in cmd]
+    from .nodepool import get_node_pool
     
     # Call node
     try:
-        res = subprocess.check_output(cmd)
-    except Exception as err:
-        if hasattr(err, 'output'):
-            err = err.output.decode()
-        else:
-            err = str(err)
+        res, err = get_node_pool().evaluate(jscode, print_result, True, timeout)
+    except Exception as e:
+        res, err = '', str(e)
+    if err is not None:
+        err = (res + err).strip()
         err = err[:200] + '...' if len(err) > 200 else err
         raise Exception(err)
-    finally:
-        if filename is not None:
-            try:
-                os.remove(filename)
-            except Exception:
-                pass
     
     # Process result
-    res = res.decode().rstrip()
+    res = res.rstrip()
     if print_result and res.endswith('undefined'):
         res = res[:-9].rstrip()
     if not whitespace:
@@ -0,0 +1,246 @@
+"""
+Local type inference for PyScript.
+
+Python operators such as ``+``, ``*`` and ``==`` behave differently from
+their JavaScript counterparts for lists and dicts, so PyScript normally
+translates them to calls to functions in the stdlib. In tight numeric
+loops, these calls are relatively expensive. This module infers for the
+variables in a scope whether they are always a number or a string (or
+a bool), so that the parser can use native JS operators instead.
+
+The inference is local and conservative: it looks at all the places in
+a function (or module) where a variable is assigned. Only if each
+assignment is a literal, an arithmetic operation, the loop variable of a
+``range()`` loop, a call to e.g. ``float()``, ``int()`` or ``len()``,
+or an expression of variables of the same type, the variable gets that
+type. Function arguments get a type only via an annotation, e.g.
+``def foo(x: float):``. The types are:
+
+* 'num': a JS number.
+* 'str': a JS string.
+* 'bool': a JS boolean.
+* None: unknown.
+
+"""
+
+from . import commonast as ast
+
+
+# Builtin functions that PyScript implements, and which return a number or str
+NUMBER_FUNCS = ('int', 'float', 'round', 'abs', 'len', 'ord', 'max', 'min',
+                'time', 'perf_counter')
+STRING_FUNCS = ('str', 'repr', 'chr')
+
+# Annotations that we understand
+ANNOTATIONS = {'int': 'num', 'float': 'num', 'str': 'str', 'bool': 'bool'}
+
+# Operators that always produce a number in JS
+NUMBER_OPS = (ast.Node.OPS.Sub, ast.Node.OPS.Div, ast.Node.OPS.FloorDiv,
+              ast.Node.OPS.Pow, ast.Node.OPS.LShift, ast.Node.OPS.RShift,
+              ast.Node.OPS.BitOr, ast.Node.OPS.BitXor, ast.Node.OPS.BitAnd)
+
+# During inference, variables start out as "pending", i.e. not known yet.
+# This makes it possible to infer e.g. ``i = 0; i = i + 1``.
+PENDING = '?'
+
+
+def join_types(t1, t2):
+    """ Get the type for a value that can be of either type.
+    """
+    if t1 == PENDING:
+        return t2
+    elif t2 == PENDING:
+        return t1
+    return t1 if t1 == t2 else None
+
+
+def get_type(node, lookup):
+    """ Get the type of the result of the given expression node, or None
+    if it cannot be determined. The ``lookup`` function maps a variable
+    name to its type.
+    """
+    if isinstance(node, ast.Num):
+        return 'num' if isinstance(node.value, (int, float)) else None
+    elif isinstance(node, ast.Str):
+        return 'str'
+    elif isinstance(node, ast.NameConstant):
+        return 'bool' if node.value in (True, False) else None
+    elif isinstance(node, ast.Name):
+        return lookup(node.name)
+    elif isinstance(node, ast.UnaryOp):
+        return 'bool' if node.op == node.OPS.Not else 'num'
+    elif isinstance(node, ast.BinOp):
+        if node.op in NUMBER_OPS:
+            return 'num'
+        elif node.op == node.OPS.Mod:
+            return 'str' if isinstance(node.left_node, ast.Str) else 'num'
+        types = get_type(node.left_node, lookup), get_type(node.right_node, lookup)
+        if None in types:
+            return None
+        elif PENDING in types:
+            return PENDING
+        elif node.op == node.OPS.Add:
+            return types[0] if types[0] == types[1] != 'bool' else None
+        elif node.op == node.OPS.Mult:
+            if types == ('num', 'num'):
+                return 'num'
+            elif sorted(types) == ['num', 'str']:
+                return 'str'  # string repetition
+        return None
+    elif isinstance(node, ast.Compare):
+        return 'bool'
+    elif isinstance(node, ast.BoolOp):
+        t = PENDING
+        for value_node in node.value_nodes:
+            t = join_types(t, get_type(value_node, lookup))
+        return t
+    elif isinstance(node, ast.IfExp):
+        return join_types(get_type(node.body_node, lookup),
+                          get_type(node.else_node, lookup))
+    elif isinstance(node, ast.Call) and isinstance(node.func_node, ast.Name):
+        if node.func_node.name in STRING_FUNCS:
+            return 'str'
+        elif node.func_node.name == 'len':
+            return 'num' if len(node.arg_nodes) == 1 else None
+        elif node.func_node.name in NUMBER_FUNCS:
+            return 'num'
+    return None
+
+
+def infer_types(node, lookup):
+    """ Infer the types of the variables that are local to the given
+    FunctionDef, Lambda or Module node. Returns a dict that maps all
+    local names to their type (None if unknown). The ``lookup`` function
+    is used for names in outer scopes.
+    """
+    values = {}  # name -> list of value nodes or types
+    _collect_scope(node, values)
+    
+    types = dict((name, PENDING) for name in values)
+    
+    def local_lookup(name):
+        if name in types:
+            return types[name]
+        return lookup(name)
+    
+    # Iterate until stable. Types only go from PENDING to a type to None
+    changed = True
+    while changed:
+        changed = False
+        for name, name_values in values.items():
+            if types[name] is None:
+                continue
+            t = PENDING
+            for value in name_values:
+                if isinstance(value, ast.Node):
+                    value = get_type(value, local_lookup)
+                t = join_types(t, value)
+                if t is None:
+                    break
+            if t != types[name]:
+                types[name] = t
+                changed = True
+    
+    for name in types:
+        if types[name] == PENDING:
+            types[name] = None  # e.g. only assigned from itself
+    return types
+
+
+def _collect_scope(node, values):
+    if isinstance(node, ast.Module):
+        body_nodes = node.body_nodes
+    else:
+        for arg in node.arg_nodes + node.kwarg_nodes:
+            t = None
+            if isinstance(arg.annotation_node, ast.Name):
+                t = ANNOTATIONS.get(arg.annotation_node.name, None)
+            _add_value(values, arg.name, t)
+        for arg in (node.args_node, node.kwargs_node):
+            if arg is not None:
+                _add_value(values, arg.name, None)
+        if isinstance(node, ast.Lambda):
+            body_nodes = [node.body_node]
+        else:
+            body_nodes = node.body_nodes
+    for sub_node in body_nodes:
+        _collect(sub_node, values)
+
+
+def _collect(node, values):
+    """ Collect the values assigned to names in the scope of the node.
+    """
+    if isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Lambda)):
+        # Another scope, but it may declare names of this scope nonlocal
+        if not isinstance(node, ast.Lambda):
+            _add_value(values, node.name, None)
+        for sub_node in _iter_nodes(node):
+            if isinstance(sub_node, (ast.Global, ast.Nonlocal)):
+                for name in sub_node.names:
+                    _add_value(values, name, None)
+        return
+    elif isinstance(node, ast.Assign):
+        for target in node.target_nodes:
+            _add_target(values, target, node.value_node)
+    elif isinstance(node, ast.AugAssign):
+        if isinstance(node.target_node, ast.Name):
+            value = ast.BinOp(node.op, node.target_node, node.value_node)
+            _add_value(values, node.target_node.name, value)
+    elif isinstance(node, ast.For):
+        iter = node.iter_node
+        if (isinstance(node.target_node, ast.Name) and
+                isinstance(iter, ast.Call) and
+                isinstance(iter.func_node, ast.Name) and
+                iter.func_node.name in ('range', 'xrange')):
+            _add_value(values, node.target_node.name, 'num')
+        else:
+            _add_target(values, node.target_node, None)
+    elif isinstance(node, ast.Comprehension):
+        _add_target(values, node.target_node, None)
+    elif isinstance(node, ast.WithItem):
+        if node.as_node is not None:
+            _add_target(values, node.as_node, None)
+    elif isinstance(node, ast.ExceptHandler):
+        if node.name:
+            _add_value(values, node.name, None)
+    elif isinstance(node, ast.Import):
+        for name, alias in node.names:
+            _add_value(values, alias or name.split('.')[0], None)
+    elif isinstance(node, (ast.Global, ast.Nonlocal)):
+        for name in node.names:
+            _add_value(values, name, None)
+    
+    for sub_node in _iter_children(node):
+        _collect(sub_node, values)
+
+
+def _add_target(values, target, value):
+    if isinstance(target, ast.Name):
+        _add_value(values, target.name, value)
+    elif isinstance(target, (ast.Tuple, ast.List)):
+        for element_node in target.element_nodes:
+            _add_target(values, element_node, None)
+    elif isinstance(target, ast.Starred):
+        _add_target(values, target.value_node, None)
+
+
+def _add_value(values, name, value):
+    values.setdefault(name, []).append(value)
+
+
+def _iter_children(node):
+    for name in node.__slots__:
+        if name.endswith('_node'):
+            sub_node = getattr(node, name)
+            if sub_node is not None:
+                yield sub_node
+        elif name.endswith('_nodes'):
+            for sub_node in getattr(node, name):
+                yield sub_node
+
+
+def _iter_nodes(node):
+    for sub_node in _iter_children(node):
+        yield sub_node
+        for sub_sub_node in _iter_nodes(sub_node):
+            yield sub_sub_node
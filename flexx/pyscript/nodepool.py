@@ -0,0 +1,289 @@
+"""
+A pool of long-lived Node.js processes to evaluate JavaScript code in.
+
+Starting Node.js takes much longer than evaluating a typical snippet
+of code, so ``evaljs()`` sends the code to a worker process that keeps
+running. Each worker reads requests (one JSON object per line) from
+stdin, evaluates the code in a fresh context (using Node's ``vm``
+module) that has the same globals as Node.js, and writes the result to
+stdout. The output of ``console.log()`` is collected, also when called
+from timers that the code sets. A request finishes when there are no
+more pending timers.
+
+An evaluation that takes longer than its timeout results in an error.
+Workers that crash or hang are replaced automatically.
+"""
+
+import os
+import json
+import atexit
+import threading
+import subprocess
+import multiprocessing
+
+try:
+    from queue import Queue, Empty
+except ImportError:  # pragma: no cover - Python 2.7
+    from Queue import Queue, Empty
+
+
+# The code for the worker. Note that this runs in Node.js.
+WORKER_CODE = r"""
+var vm = require('vm');
+var stream = require('stream');
+var readline = require('readline');
+
+// The Node.js globals (e.g. TextDecoder and URL) that are not defined in a
+// fresh context. The JS builtins (e.g. Array) are defined in each context.
+var builtins = new Set(vm.runInNewContext('Object.getOwnPropertyNames(this)'));
+var node_globals = Object.getOwnPropertyNames(global).filter(function (name) {
+    return !builtins.has(name) && ['global', 'GLOBAL', 'root'].indexOf(name) < 0;
+});
+
+function evaluate(req, respond) {
+    var output = [];
+    var timers = new Set();
+    var finished = false;
+    var error = null;
+    var deadline = null;
+
+    function finish() {
+        if (finished) { return; }
+        finished = true;
+        clearTimeout(deadline);
+        timers.forEach(function (timer) { timer.clear(); });
+        respond({id: req.id, output: output.join(''), error: error});
+    }
+    function fail(err) {
+        error = (err && err.stack) ? String(err.stack) : String(err);
+        finish();
+    }
+    function check() {
+        // Finish if there are no timers, after promises have resolved
+        if (!finished && timers.size === 0) {
+            setImmediate(function () { if (timers.size === 0) { finish(); } });
+        }
+    }
+    function make_timer(setter, clearer, repeat) {
+        return function (func, ms) {
+            var args = Array.prototype.slice.call(arguments, 2);
+            var timer = {};
+            var handle = setter(function () {
+                if (finished) { return; }
+                if (!repeat) { timers.delete(timer); }
+                try {
+                    func.apply(null, args);
+                } catch (err) {
+                    fail(err);
+                    return;
+                }
+                check();
+            }, ms);
+            timer.clear = function () { timers.delete(timer); clearer(handle); };
+            timers.add(timer);
+            return timer;
+        };
+    }
+    function clear(timer) {
+        if (timer && timer.clear) { timer.clear(); check(); }
+    }
+
+    var out = new stream.Writable({write: function (chunk, encoding, callback) {
+        output.push(chunk.toString());
+        callback();
+    }});
+    var sandbox = {
+        console: new console.Console(out, process.stderr),
+        setTimeout: make_timer(setTimeout, clearTimeout, false),
+        setInterval: make_timer(setInterval, clearInterval, true),
+        setImmediate: make_timer(setImmediate, clearImmediate, false),
+        clearTimeout: clear, clearInterval: clear, clearImmediate: clear,
+        require: require, process: process, Buffer: Buffer,
+    };
+    node_globals.forEach(function (name) {
+        if (!sandbox.hasOwnProperty(name)) {
+            Object.defineProperty(sandbox, name,
+                                  Object.getOwnPropertyDescriptor(global, name));
+        }
+    });
+    sandbox.global = sandbox;
+    var context = vm.createContext(sandbox);
+
+    var code = req.strict ? "'use strict';" + req.code : req.code;
+    var options = {filename: 'evaljs'};
+    if (req.timeout > 0) {
+        options.timeout = req.timeout * 1000;
+        deadline = setTimeout(function () {
+            fail(new Error('Evaluation timed out after ' + req.timeout + ' s.'));
+        }, req.timeout * 1000);
+    }
+    try {
+        var result = vm.runInContext(code, context, options);
+        if (req.print_result) { sandbox.console.log(result); }
+    } catch (err) {
+        fail(err);
+        return;
+    }
+    check();
+}
+
+var rl = readline.createInterface({input: process.stdin, terminal: false});
+rl.on('line', function (line) {
+    evaluate(JSON.parse(line), function (res) {
+        process.stdout.write(JSON.stringify(res) + '\n');
+    });
+});
+rl.on('close', function () { process.exit(0); });
+"""
+
+
+class NodeWorker:
+    """ A Node.js process that evaluates code that it receives over stdin.
+    """
+
+    def __init__(self, node_exe):
+        self._count = 0
+        self._responses = Queue()
+        self._process = subprocess.Popen([node_exe, '-e', WORKER_CODE],
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE)
+        t = threading.Thread(target=self._read, args=(self._process.stdout, ))
+        t.daemon = True
+        t.start()
+
+    def _read(self, stdout):
+        # Runs in a thread. Note that iterating over the file would use
+        # a read-ahead buffer on Python 2.7, delaying the responses.
+        for line in iter(stdout.readline, b''):
+            self._responses.put(line)
+        self._responses.put(None)  # EOF
+
+    def is_alive(self):
+        """ Get whether the process is running.
+        """
+        return self._process.poll() is None
+
+    def close(self):
+        """ Stop the process.
+        """
+        if self.is_alive():
+            try:
+                self._process.kill()
+                self._process.wait()
+            except Exception:  # pragma: no cover
+                pass
+        for f in (self._process.stdin, self._process.stdout):
+            try:
+                f.close()
+            except Exception:  # pragma: no cover
+                pass
+
+    def evaluate(self, code, print_result=True, strict=True, timeout=30):
+        """ Evaluate the given code. Returns a tuple (output, error),
+        where error is None if the evaluation succeeded. Raises
+        RuntimeError if the worker crashed or did not respond in time,
+        in which case the process is closed.
+        """
+        self._count += 1
+        request = dict(id=self._count, code=code, print_result=print_result,
+                       strict=strict, timeout=timeout)
+        try:
+            self._process.stdin.write(json.dumps(request).encode() + b'\n')
+            self._process.stdin.flush()
+            # The worker applies the timeout, we wait a bit longer
+            line = self._responses.get(timeout=timeout + 5 if timeout else None)
+        except Empty:
+            self.close()
+            raise RuntimeError('Node.js worker did not respond within %s s.' %
+                               timeout)
+        except (IOError, OSError) as err:
+            self.close()
+            raise RuntimeError('Could not send code to Node.js worker: %s' % err)
+        if line is None:
+            self.close()
+            raise RuntimeError('Node.js worker exited with code %s.' %
+                               self._process.wait())
+        response = json.loads(line.decode())
+        assert response['id'] == self._count
+        return response['output'], response['error']
+
+
+class NodePool:
+    """ A pool of Node.js workers. Workers are started when needed, up
+    to the given size, so that code can be evaluated in multiple threads
+    at the same time.
+    """
+
+    def __init__(self, node_exe, size=4):
+        self._node_exe = node_exe
+        self._size = size
+        self._idle = []
+        self._count = 0  # number of workers, idle or busy
+        self._condition = threading.Condition()
+
+    def evaluate(self, code, print_result=True, strict=True, timeout=30):
+        """ Evaluate code in one of the workers. See ``NodeWorker.evaluate()``.
+        """
+        worker = self._acquire()
+        try:
+            return worker.evaluate(code, print_result, strict, timeout)
+        finally:
+            self._release(worker)
+
+    def close(self):
+        """ Stop all idle workers.
+        """
+        with self._condition:
+            while self._idle:
+                self._idle.pop().close()
+                self._count -= 1
+
+    def _acquire(self):
+        with self._condition:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.is_alive():
+                        return worker
+                    worker.close()  # it crashed while idle
+                    self._count -= 1
+                if self._count < self._size:
+                    self._count += 1
+                    break
+                self._condition.wait()
+        try:
+            return NodeWorker(self._node_exe)
+        except Exception:
+            with self._condition:
+                self._count -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, worker):
+        with self._condition:
+            if worker.is_alive():
+                self._idle.append(worker)
+            else:
+                worker.close()
+                self._count -= 1
+            self._condition.notify()
+
+
+_pool = None
+_pool_pid = None
+
+def get_node_pool():
+    """ Get the pool of Node.js workers that ``evaljs()`` uses.
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():  # new pool in a forked process
+        from .functions import get_node_exe
+        _pool = NodePool(get_node_exe(), min(4, multiprocessing.cpu_count()))
+        _pool_pid = os.getpid()
+    return _pool
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
@@ -64,6 +64,10 @@ class NameSpace(dict):
       specified by the string.
     """
     
+    def __init__(self):
+        dict.__init__(self)
+        self.types = {}  # inferred types of local variables, see inference.py
+    
     def set_nonlocal(self, key):
         """ Explicitly declare a name as nonlocal/global """
         self[key] = False  # also if already exists
@@ -132,6 +132,26 @@ usual.
     a = a or [1]  # a is now [1]
 
 
+Native operators
+----------------
+
+To support lists and dicts, operations like ``+``, ``*`` and ``==``
+are translated to calls to functions in the stdlib. For variables that
+PyScript can infer to always be a number or string (e.g. from literals,
+``range()`` loops, ``float()`` and ``len()``, or annotations), the
+native JS operators are used, which makes numeric code faster.
+
+.. pyscript_example::
+
+    def weighted_sum(values, weight: float):
+        total = 0.0
+        for i in range(len(values)):
+            total += float(values[i]) * weight
+        if total == 0:
+            return values  # we know nothing about values
+        return total * 2
+
+
 Function calls
 --------------
 
@@ -162,6 +182,7 @@ import re
 
 from . import commonast as ast
 from . import stdlib
+from .inference import get_type, infer_types
 from .parser0 import Parser0, JSError, unify, reprs  # noqa
 
 
@@ -256,6 +277,18 @@ class Parser1(Parser0):
         # they're present in Call arguments, but we parse them there.
         raise JSError('Starred args are not supported.')
     
+    def _get_var_type(self, name):
+        """ Get the inferred type of a variable, or None. """
+        for nstype, nsname, ns in reversed(self._stack):
+            if nstype != 'class' and name in ns.types:
+                return ns.types[name]
+    
+    def _get_type(self, node):
+        """ Get the inferred type of an expression node: 'num', 'str',
+        'bool', or None if unknown.
+        """
+        return get_type(node, self._get_var_type)
+    
     ## Expressions
     
     def parse_Expr(self, node):
@@ -281,13 +314,16 @@ class Parser1(Parser0):
         left = unify(self.parse(node.left_node))
         right = unify(self.parse(node.right_node))
         
+        # Note that we can use the native operators if we know the types
         if node.op == node.OPS.Add:
             C = ast.Num, ast.Str
-            if not (isinstance(node.left_node, C) or isinstance(node.right_node, C)):
+            if not (isinstance(node.left_node, C) or isinstance(node.right_node, C)
+                    or self._get_type(node) in ('num', 'str')):
                 return self.use_std_function('op_add', [left, right])
         elif node.op == node.OPS.Mult:
             C = ast.Num
-            if not (isinstance(node.left_node, C) and isinstance(node.right_node, C)):
+            if not ((isinstance(node.left_node, C) and isinstance(node.right_node, C))
+                    or self._get_type(node) == 'num'):
                 return self.use_std_function('op_mult', [left, right])
         elif node.op == node.OPS.Pow:
             return ["Math.pow(", left, ", ", right, ")"]
@@ -333,6 +369,8 @@ class Parser1(Parser0):
         """ Wraps an operation in a truthy call, unless its not necessary. """
         eq_name = stdlib.FUNCTION_PREFIX + 'op_equals'
         test = ''.join(self.parse(node))
+        if self._get_type(node) is not None:
+            return unify(test)  # a number, string or bool
         if (False or test.endswith('.length') or test.startswith('!') or
                      test.isnumeric() or test == 'true' or test == 'false' or
                      test.count('==') or test.count(eq_name) or
@@ -357,6 +395,11 @@ class Parser1(Parser0):
         right = unify(self.parse(node.right_node))
         
         if node.op in (node.COMP.Eq, node.COMP.NotEq):
+            t = self._get_type(node.left_node)
+            if t is not None and t == self._get_type(node.right_node):
+                # Values of the same primitive type can be compared natively
+                op = '===' if node.op == node.COMP.Eq else '!=='
+                return "%s %s %s" % (left, op, right)
             code = self.use_std_function('op_equals', [left, right])
             if node.op == node.COMP.NotEq:
                 code = '!' + code
@@ -538,10 +581,16 @@ class Parser1(Parser0):
         target = ''.join(self.parse(node.target_node))
         value = ''.join(self.parse(node.value_node))
         
+        # Can we use the native operator?
+        native = False
+        if isinstance(node.target_node, ast.Name):
+            t = self._get_type(ast.BinOp(node.op, node.target_node, node.value_node))
+            native = t == 'num' or (t == 'str' and node.op == node.OPS.Add)
+        
         nl = self.lf()
-        if node.op == node.OPS.Add:
+        if node.op == node.OPS.Add and not native:
             return [nl, target, '=', self.use_std_function('op_add', [target, value])]
-        elif node.op == node.OPS.Mult:
+        elif node.op == node.OPS.Mult and not native:
             return [nl, target, '=', self.use_std_function('op_mult', [target, value])]
         elif node.op == node.OPS.Pow:
             return [nl, target, " = Math.pow(", target, ", ", value, ")"]
@@ -634,6 +683,7 @@ class Parser1(Parser0):
             for line in docstring.splitlines():
                 code.append(self.lf('// ' + line))
             code.append('\n')
+        self.vars.types = infer_types(node, self._get_var_type)
         for child in node.body_nodes:
             code += self.parse(child)
         return code
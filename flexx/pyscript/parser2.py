@@ -216,6 +216,7 @@ from . import commonast as ast
 from . import stdlib
 from . import logger
 from .parser1 import Parser1, JSError, unify, reprs  # noqa
+from .inference import infer_types
 
 
 RAW_DOC_WARNING = ('Function %s only has a docstring, which used to be '
@@ -817,6 +818,7 @@ class Parser2(Parser1):
         pre_code, code = code, []
         self._indent += 1
         self.push_stack('function', '' if lambda_ else node.name)
+        self.vars.types = infer_types(node, self._get_var_type)
         
         # Add argnames to known vars
         for name in argnames:
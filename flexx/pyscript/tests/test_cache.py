@@ -0,0 +1,139 @@
+""" Tests for the PyScript transpile cache
+"""
+
+import os
+import time
+import shutil
+import tempfile
+
+from flexx.util.testing import run_tests_if_main
+
+from flexx import config
+from flexx.pyscript import py2js
+from flexx.pyscript.cache import TranspileCache, make_key, get_cache
+
+
+def get_tempdir():
+    dirname = os.path.join(tempfile.gettempdir(),
+                           'flexx_pyscript_cache_test_%i' % os.getpid())
+    if os.path.isdir(dirname):
+        shutil.rmtree(dirname)
+    return dirname
+
+
+def test_make_key():
+    key1 = make_key(b'xx', False, {})
+    key2 = make_key(b'xx', False, {'indent': 1})
+    key3 = make_key(b'xx', True, {})
+    key4 = make_key(b'yy', False, {})
+    assert len(set([key1, key2, key3, key4])) == 4
+    assert make_key(b'xx', False, {}) == key1
+    # Order of options does not matter
+    key5 = make_key(b'xx', False, {'indent': 1, 'docstrings': False})
+    key6 = make_key(b'xx', False, {'docstrings': False, 'indent': 1})
+    assert key5 == key6
+
+
+def test_cache_get_set():
+    dirname = get_tempdir()
+    cache = TranspileCache(dirname, 2**20)
+    assert 'TranspileCache' in repr(cache)
+
+    key = make_key(b'xx', False, {})
+    assert cache.get(key) is None
+    assert cache.misses == 1
+
+    meta = dict(vars_defined=set(['a']), vars_unknown=set(['b', 'c']),
+                vars_global=set(), std_functions=set(['range']),
+                std_methods=set(), filename='not stored')
+    cache.set(key, 'var a = b + c;', meta)
+    assert os.path.isdir(dirname)
+
+    jscode, meta2 = cache.get(key)
+    assert cache.hits == 1
+    assert jscode == 'var a = b + c;'
+    assert meta2['vars_unknown'] == set(['b', 'c'])
+    assert meta2['std_functions'] == set(['range'])
+    assert 'filename' not in meta2
+
+    cache.clear()
+    assert cache.get(key) is None
+    shutil.rmtree(dirname)
+
+
+def test_cache_set_fail():
+    dirname = get_tempdir()
+    cache = TranspileCache(dirname, 2**20)
+    meta = dict(vars_defined=set(), vars_unknown=set(), vars_global=set(),
+                std_functions=set(), std_methods=set())
+
+    # Make writing fail, by putting a directory where the entry should go
+    key = make_key(b'xx', False, {})
+    os.makedirs(os.path.join(dirname, key + '.json'))
+    cache.set(key, 'var a;', meta)
+    assert cache.get(key) is None
+    # The temporary file is cleaned up
+    assert os.listdir(dirname) == [key + '.json']
+    shutil.rmtree(dirname)
+
+
+def test_cache_eviction():
+    dirname = get_tempdir()
+    cache = TranspileCache(dirname, 10000)
+    meta = dict(vars_defined=set(), vars_unknown=set(), vars_global=set(),
+                std_functions=set(), std_methods=set())
+
+    keys = []
+    for i in range(20):
+        key = make_key(str(i).encode(), False, {})
+        keys.append(key)
+        cache.set(key, 'x' * 1000, meta)
+        # Make sure the mtimes differ
+        t = time.time() - 1000 + i
+        os.utime(os.path.join(dirname, key + '.json'), (t, t))
+
+    assert cache._get_total_size() <= 10000
+    # The oldest entries are gone, the newest are still there
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) is not None
+    shutil.rmtree(dirname)
+
+
+def test_py2js_uses_cache():
+    dirname = get_tempdir()
+    ori_dir = config.pyscript_cache
+    config.pyscript_cache = dirname
+    try:
+        cache = get_cache()
+        assert cache.dirname == dirname
+
+        def foo(x):
+            return range(x) + bar
+
+        js1 = py2js(foo, docstrings=False)
+        assert cache.misses == 1 and cache.hits == 0
+        js2 = py2js(foo, docstrings=False)
+        assert cache.hits == 1
+        js3 = py2js(foo, 'spam', docstrings=False)
+        assert cache.hits == 2
+
+        assert js1 == js2
+        assert 'spam' in js3 and 'foo' not in js3
+        for key in ('vars_unknown', 'std_functions', 'std_methods', 'linenr',
+                    'filename', 'pycode', 'pyhash'):
+            assert js1.meta[key] == js2.meta[key]
+        assert 'bar' in js2.meta['vars_unknown']
+        assert 'range' in js2.meta['std_functions']
+
+        # Other parser options means other key
+        py2js(foo, docstrings=True)
+        assert cache.misses == 2
+
+    finally:
+        config.pyscript_cache = ori_dir
+        shutil.rmtree(dirname)
+
+    assert get_cache() is None
+
+
+run_tests_if_main()
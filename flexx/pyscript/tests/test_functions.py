@@ -29,6 +29,42 @@ def test_evaljs():
     assert evaljs('var x = {}; x.doesnotexist') == ''  # strip undefined
 
 
+def test_evaljs_pool():
+    
+    # Output of timers is included, code is isolated and strict
+    code = 'setTimeout(function () {console.log("b")}, 10); console.log("a"); 3'
+    assert evaljs(code) == 'a\n3\nb'
+    evaljs('var y = 3; global.z = 4')
+    assert evaljs('typeof y === "undefined" && typeof z === "undefined"') == 'true'
+    with raises(Exception):
+        evaljs('undeclared = 3')
+    
+    # The globals of Node.js are available, and builtins are of the context
+    for name in ('TextDecoder', 'TextEncoder', 'URL', 'URLSearchParams', 'Buffer',
+                 'require', 'setTimeout', 'queueMicrotask'):
+        assert evaljs('typeof %s' % name) == 'function'
+    assert evaljs('typeof process') == 'object'
+    code = 'new TextDecoder().decode(new TextEncoder().encode("\\u20ac"))'
+    assert evaljs(code) == '\u20ac'
+    code = '[] instanceof Array && Object.getPrototypeOf({}) === Object.prototype'
+    assert evaljs(code) == 'true'
+    
+    # Large code can be evaluated, also when printing the result
+    assert evaljs('var a = "%s"; a.length' % ('x' * 40000)) == '40000'
+    
+    # Errors, timeouts and crashes do not break the pool
+    with raises(Exception) as err:
+        evaljs('setTimeout(function () {throw new Error("oops")}, 1)')
+    assert 'oops' in str(err.value)
+    with raises(Exception):
+        evaljs('while (true) {}', timeout=0.5)
+    with raises(Exception):
+        evaljs('setInterval(function () {}, 10)', timeout=0.5)
+    with raises(Exception):
+        evaljs('process.exit(1)')
+    assert evaljs('3+4') == '7'
+
+
 def test_evalpy():
     assert evalpy('[3, 4]') == '[ 3, 4 ]'
     assert evalpy('[3, 4]', False) == '[3,4]'
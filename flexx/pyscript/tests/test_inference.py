@@ -0,0 +1,102 @@
+from flexx.util.testing import run_tests_if_main
+
+from flexx.pyscript import py2js, evalpy
+from flexx.pyscript import commonast as ast
+from flexx.pyscript.inference import infer_types
+
+
+def types_of(code):
+    root = ast.parse(code)
+    return infer_types(root.body_nodes[0], lambda name: None)
+
+
+def test_infer_types():
+
+    # Literals, calls and operators
+    t = types_of('def f():\n  a = 3\n  b = "x"\n  c = True\n  d = float(q)\n'
+                 '  e = len(q)\n  f = str(q)\n  g = -q\n  h = a < q\n  i = q - 1')
+    assert t['a'] == 'num' and t['b'] == 'str' and t['c'] == 'bool'
+    assert t['d'] == 'num' and t['e'] == 'num' and t['f'] == 'str'
+    assert t['g'] == 'num' and t['h'] == 'bool' and t['i'] == 'num'
+    
+    # Loop-carried variables
+    t = types_of('def f(n):\n  x = 0\n  s = ""\n  for i in range(n):\n'
+                 '    x += i * 2\n    s = s + "a"\n')
+    assert t == dict(n=None, x='num', s='str', i='num')
+    
+    # Annotations, but only those that we know
+    t = types_of('def f(a: int, b: float, c: str, d: list, e, *f):\n  pass')
+    assert t == dict(a='num', b='num', c='str', d=None, e=None, f=None)
+    
+    # Conflicting or unknown assignments
+    t = types_of('def f(q):\n  a = 3\n  a = "x"\n  b = q\n  c = [1]\n  d = 3\n'
+                 '  d += q\n  e = None')
+    assert t == dict(q=None, a=None, b=None, c=None, d=None, e=None)
+    
+    # Names that are assigned in other ways are unknown
+    t = types_of('def f():\n  a, b = 1, 2\n  for c in x: pass\n'
+                 '  d = [e for e in range(3)]\n  e = 3\n'
+                 '  with x as g: pass\n  try: pass\n  except Exception as h: pass')
+    for name in 'abcdegh':
+        assert t[name] is None
+    
+    # Names that nested functions declare nonlocal are unknown
+    t = types_of('def f():\n  a = 3\n  b = 3\n  def g():\n    nonlocal a\n'
+                 '    a = "x"\n    b = "x"\n  return g')
+    assert t == dict(a=None, b='num', g=None)
+
+
+def test_native_ops():
+
+    code = py2js('def f(n):\n  x = 0\n  for i in range(n):\n'
+                 '    x += i * 2.5\n    if x == 3 or i: pass\n  return x + n')
+    assert 'op_mult' not in code
+    assert 'op_equals' not in code
+    assert 'truthy' not in code
+    assert 'x += ' in code
+    assert 'op_add(x, n)' in code  # n is unknown
+    
+    # Annotations
+    code = py2js('def f(a: float, b: float):\n  return a * b + 1, a == b')
+    assert 'op_' not in code
+    
+    # Strings and lists
+    code = py2js('def f():\n  a = "x"\n  a += "y"\n  b = [1]\n  return a + a, b + b')
+    assert 'op_add(a, a)' not in code
+    assert 'op_add(b, b)' in code
+    code = py2js('def f():\n  a = "x"\n  n = 3\n  a *= n\n  return a * n')
+    assert code.count('op_mult(a, n)') == 2  # string repetition
+    
+    # Outer scope is used for nested functions, but not for class scope
+    code = py2js('def f():\n  a = 3\n  def g():\n    return a + a\n  return g')
+    assert 'op_add' not in code
+    code = py2js('a = 3\nclass Foo:\n  a = [3]\n  def g(self):\n    return a + a')
+    assert 'op_add' not in code
+    code = py2js('class Foo:\n  a = 3\n  def g(self):\n    return a + a')
+    assert 'op_add' in code
+
+
+def test_semantics():
+    # The results must be the same as in Python
+    
+    code = 'def f(n):\n  x = 0\n  for i in range(n):\n    x += i * 2\n  return x\n'
+    assert evalpy(code + 'f(5)') == '20'
+    
+    code = 'def f(s: str):\n  t = ""\n  for i in range(3):\n    t += s\n  return t\n'
+    assert evalpy(code + 'f("ab")') == 'ababab'
+    
+    code = 'a = 0\nb = ""\nprint(bool(a), bool(b), a == 0, b == "", a != 1)'
+    assert evalpy(code) == 'false false true true true'
+    
+    code = 'def f():\n  a = 1\n  b = 1.0\n  return a == b\nf()'
+    assert evalpy(code) == 'true'
+
+
+def test_str_of_float():
+    # Known difference with Python that predates type inference: JS has no
+    # separate float type, so str(1.0) gives '1' instead of '1.0'.
+    code = 'def f():\n  a = 1\n  b = 1.0\n  return str(a) == str(b)\nf()'
+    assert evalpy(code) == 'true'
+
+
+run_tests_if_main()
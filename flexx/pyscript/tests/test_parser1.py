@@ -94,8 +94,9 @@ class TestExpressions:
     
     def test_raw_js_overloading(self):
         # more RawJS tests in test_parser3.py
-        s1 = 'a=3; b=4; c=1; a + b - c'
-        s2 = 'a=3; b=4; c=1; RawJS("a + b") - c'
+        # (a is a list element, so that its type cannot be inferred)
+        s1 = 'a=[3][0]; b=4; c=1; a + b - c'
+        s2 = 'a=[3][0]; b=4; c=1; RawJS("a + b") - c'
         assert evalpy(s1) == '6'
         assert evalpy(s2) == '6'
         assert 'pyfunc' in py2js(s1)
@@ -9,6 +9,7 @@ from time import time
 import psutil
 
 from flexx import app, ui, event
+from flexx.pyscript import window
 
 nsamples = 16
 
@@ -98,24 +99,27 @@ class Monitor(ui.Widget):
             self.info.text = ('There are %i connected clients.<br />' % n[0] +
                               'And in total we served %i connections.<br />' % n[1])
             
-            # Prepare plots
-            times = self.cpu_plot.xdata.copy()
+            # Prepare plots (the plot data are typed arrays, copy to a list)
+            times = self._to_list(self.cpu_plot.xdata)
             times.append(time() - self.start_time)
             times = times[-self.nsamples:]
             self.cpu_plot.xdata = times
             self.mem_plot.xdata = times
             
             # cpu data
-            usage = self.cpu_plot.ydata
+            usage = self._to_list(self.cpu_plot.ydata)
             usage.append(ev.cpu)
             usage = usage[-self.nsamples:]
             self.cpu_plot.ydata = usage
             
             # mem data
-            usage = self.mem_plot.ydata
+            usage = self._to_list(self.mem_plot.ydata)
             usage.append(ev.mem)
             usage = usage[-self.nsamples:]
             self.mem_plot.ydata = usage
+        
+        def _to_list(self, a):
+            return window.Array.prototype.slice.call(a)
 
 
 if __name__ == '__main__':
@@ -4,9 +4,8 @@ Example that demonstrates sending binray data from Python to JS. The
 ``Model.send_data()`` mechanism can be a powerful tool to send
 (scientific) data, especially for large amounts of data. The method
 accepts bytes or a URL ("http://" or "https://") where the
-data can be retrieved. At his point AJAX is used to retrieve the data.
-In the future we might push the data over a dedicated binary websocket
-for greater performance.
+data can be retrieved. Blobs are pushed over the websocket (in binary
+frames) if the client supports it, and retrieved with AJAX otherwise.
 
 If you find that you have a property that is a large list of numbers, maybe
 that should be considered data instead of a property. 
@@ -40,14 +40,17 @@ Interactive example:
             @event.connect('slider1.value', 'slider2.value')
             def __update_amplitude(self, *events):
                 freq, phase = self.slider1.value, self.slider2.value
+                xdata = self.plot.xdata  # a Float64Array
                 ydata = []
-                for x in self.plot.xdata:
+                for i in range(len(xdata)):
+                    x = xdata[i]
                     ydata.append(window.Math.sin(freq*x*2*window.Math.PI+phase))
                 self.plot.ydata = ydata
 """
 
 from ...pyscript import window
 from ... import event
+from ...app import typed_array
 from ._canvas import CanvasWidget
 
 
@@ -62,13 +65,17 @@ class PlotWidget(CanvasWidget):
             
         @event.prop
         def xdata(self, v=()):
-            """ A list of values for the x-axis. """
-            return [float(f) for f in v]
+            """ The values for the x-axis. Can be set with a list or a
+            numpy array. Stored as a float64 array (see ``app.typed_array()``),
+            which is a ``Float64Array`` in JS. """
+            return typed_array(v)
         
         @event.prop
         def ydata(self, v=()):
-            """ A list of values for the y-axis. """
-            return [float(f) for f in v]
+            """ The values for the y-axis. Can be set with a list or a
+            numpy array. Stored as a float64 array (see ``app.typed_array()``),
+            which is a ``Float64Array`` in JS. """
+            return typed_array(v)
         
         @event.prop
         def yrange(self, v=None):
@@ -142,8 +149,8 @@ class PlotWidget(CanvasWidget):
             w, h = self.node.clientWidth, self.node.clientHeight
             
             # Get range
-            x1, x2 = min(xx), max(xx)
-            y1, y2 = min(yy), max(yy)
+            x1, x2 = self._get_range(xx)
+            y1, y2 = self._get_range(yy)
             #
             if xx:
                 x1 -= (x2-x1) * 0.02
@@ -171,8 +178,11 @@ class PlotWidget(CanvasWidget):
                 lpad += 20
             scale_x = (w-lpad-rpad) / (x2-x1)
             scale_y = (h-bpad-tpad) / (y2-y1)
-            sxx = [lpad + (x-x1)*scale_x for x in xx]
-            syy = [bpad + (y-y1)*scale_y for y in yy]
+            # Loop by index; the data are typed arrays
+            sxx, syy = [], []
+            for i in range(min(len(xx), len(yy))):
+                sxx.append(lpad + (xx[i]-x1)*scale_x)
+                syy.append(bpad + (yy[i]-y1)*scale_y)
             
             # Define ticks
             x_ticks = self._get_ticks(scale_x, x1, x2)
@@ -269,6 +279,18 @@ class PlotWidget(CanvasWidget):
                     ctx.arc(x, h-y, ms/2, 0, 2*window.Math.PI)
                     ctx.fill()
         
+        def _get_range(self, values):
+            # Like min() and max(), but these would hit the limit on the
+            # number of function arguments for large arrays
+            v1, v2 = window.Infinity, -window.Infinity
+            for i in range(len(values)):
+                v = values[i]
+                if v < v1:
+                    v1 = v
+                if v > v2:
+                    v2 = v
+            return v1, v2
+        
         def _get_ticks(self, scale, t1, t2, min_tick_dist=40):
             # Get tick unit
             for tick_unit in self._tick_units:
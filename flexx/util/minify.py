@@ -1,117 +1,394 @@
 """
 JavaScript minification tools.
+
+The code is split into tokens in a single pass using a regular
+expression. Strings, regular expression literals and template literals
+are recognized as such, so that their contents is left alone.
 """
 
-def minify(code, remove_whitespace=False):
-    """ Very basic minification of JavaScript code. Will likely support
-    more advanced minifcation in the future.
+import re
+
+
+# Tokens. Words are identifiers, keywords and numbers. Punctuation runs
+# like "});" are kept together, except for slashes (division or regexp).
+TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+) |
+    (?P<comment>//[^\n\r]*|/\*[\s\S]*?\*/) |
+    (?P<string>'(?:[^'\\\n]|\\[\s\S])*'|"(?:[^"\\\n]|\\[\s\S])*") |
+    (?P<template>`) |
+    (?P<slash>/) |
+    (?P<word>(?:[\w$]|\\u[0-9a-fA-F]{4}|\\u\{[0-9a-fA-F]+\})+) |
+    (?P<punct>[^\w$\s'"`/\\]+) |
+    (?P<other>.)
+    """, re.VERBOSE)
+
+REGEXP_RE = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-zA-Z]*')
+
+# Words after which a slash starts a regexp rather than a division
+REGEXP_KEYWORDS = set('return typeof instanceof in of new delete void throw case '
+                      'do else yield await'.split())
+
+RESERVED = set("""
+    break case catch class const continue debugger default delete do else enum
+    export extends false finally for function if implements import in
+    instanceof interface let new null package private protected public return
+    static super switch this throw true try typeof var void while with yield
+    await async of get set arguments eval undefined NaN Infinity
+    """.split())
+
+# A newline can be removed after these chars, or before these chars, without
+# changing how automatic semicolon insertion applies.
+CONTINUE_AFTER = set('{([,;:=+-*/%&|^!~?<>')
+CONTINUE_BEFORE = set(')]},;.:?=*%&|^<>')
+
+# Words that can be followed by "(...) {" and are not a method definition
+CONTROL_KEYWORDS = set('if for while switch catch with function'.split())
+
+is_word_char = re.compile(r'[\w$\\]').match
+
+
+def minify(code, remove_whitespace=False, mangle=False):
+    """ Minify JavaScript code. Comments are always removed.
     
     Parameters:
         code (str) : the JavaScript code to minify.
         remove_whitespace (bool) : if True, removes all non-functional
             whitespace. Otherwise remove all trailing whitespace and
             indents using tabs to preserve space. Default False.
+        mangle (bool) : if True, rename local variables (and arguments)
+            of functions to short names. Functions that use ``eval`` or
+            ``with``, or constructs that make the renaming ambiguous (e.g.
+            classes and arrow functions) are left alone. Default False.
+    """
+    tokens = tokenize(code)
+    if mangle:
+        tokens = _mangle(tokens)
+    return _join(tokens, remove_whitespace)
+
+
+def tokenize(code):
+    """ Split JavaScript code into a list of (kind, text) tuples. The
+    kinds are 'ws', 'comment', 'string', 'template', 'regexp', 'word',
+    'punct' and 'other'.
+    """
+    tokens = []
+    prev = None  # last significant token
+    pos = 0
+    n = len(code)
+    match = TOKEN_RE.match
+    while pos < n:
+        m = match(code, pos)
+        kind = m.lastgroup
+        end = m.end()
+        if kind == 'slash':
+            kind = 'punct'
+            if _regexp_allowed(prev):
+                m = REGEXP_RE.match(code, pos)
+                if m is not None:
+                    kind, end = 'regexp', m.end()
+        elif kind == 'template':
+            end = _skip_template(code, end)
+        token = kind, code[pos:end]
+        tokens.append(token)
+        if kind != 'ws' and kind != 'comment':
+            prev = token
+        pos = end
+    return tokens
+
+
+def _regexp_allowed(prev):
+    if prev is None:
+        return True
+    kind, text = prev
+    if kind == 'word':
+        return text in REGEXP_KEYWORDS
+    elif kind == 'punct':
+        # After a postfix ++ or --, a slash is a division. A prefix ++ or
+        # -- cannot be followed by a regexp.
+        return text[-1] not in ')]}' and not text.endswith(('++', '--'))
+    return False  # string, template, regexp
+
+
+def _skip_template(code, i):
+    # Get the end of a template literal that starts before index i
+    n = len(code)
+    while i < n:
+        c = code[i]
+        if c == '\\':
+            i += 2
+        elif c == '`':
+            return i + 1
+        elif c == '$' and code.startswith('{', i + 1):
+            i = _skip_braces(code, i + 2)
+        else:
+            i += 1
+    raise ValueError('Unterminated template literal in JavaScript code.')
+
+
+def _skip_braces(code, i):
+    # Get the end of a ${...} expression in a template literal
+    depth = 1
+    n = len(code)
+    while i < n:
+        c = code[i]
+        if c == '`':
+            i = _skip_template(code, i + 1)
+            continue
+        elif c in '\'"':
+            m = TOKEN_RE.match(code, i)
+            if m.lastgroup == 'string':
+                i = m.end()
+                continue
+        elif c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    raise ValueError('Unterminated template literal in JavaScript code.')
+
+
+def _join(tokens, remove_whitespace):
+    """ Join tokens into code, dropping comments and reducing whitespace.
+    """
+    parts = []
+    prev_kind, prev = None, ''
+    ws = ''
+    for kind, text in tokens:
+        if kind == 'ws':
+            ws += text
+            continue
+        elif kind == 'comment':
+            # A multiline comment counts as a newline
+            if text[1] == '*' and '\n' in text:
+                ws += '\n'
+            elif not ws:
+                ws = ' '
+            continue
+        if ws and parts:
+            if remove_whitespace:
+                parts.append(_get_separator(prev_kind, prev, kind, text, ws))
+            elif '\n' in ws:
+                parts.append('\n' + _tabbify(ws.rsplit('\n', 1)[1]))
+            else:
+                parts.append(ws)
+        parts.append(text)
+        prev_kind, prev = kind, text
+        ws = ''
+    return ''.join(parts)
+
+
+def _tabbify(indent):
+    for s1, s2 in [('    ', '\t'), ('  ', '\t'), (' ', '')]:
+        indent = indent.replace(s1, s2)
+    return indent
+
+
+def _get_separator(prev_kind, prev, kind, text, ws):
+    # Get the minimal whitespace to put between two tokens
+    if '\n' in ws:
+        if text.startswith(('++', '--')) or prev.endswith(('++', '--')):
+            return '\n'  # restricted productions
+        elif not ((prev_kind == 'punct' and prev[-1] in CONTINUE_AFTER) or
+                  (kind == 'punct' and text[0] in CONTINUE_BEFORE)):
+            return '\n'
+    last, first = prev[-1], text[0]
+    if is_word_char(last) and is_word_char(first):
+        return ' '
+    elif prev_kind == 'word' and prev[0].isdigit() and first == '.':
+        return ' '  # e.g. "1 .toString()"
+    elif prev_kind == 'punct' and (last + first in ('++', '--', '//', '/*', '<!') or
+                                   (last == '-' and first == '>')):
+        return ' '
+    elif last == '/' and first == '/':
+        return ' '  # e.g. a regexp after a division
+    elif ord(last) > 127 or ord(first) > 127:
+        return ' '  # unicode identifiers
+    return ''
+
+
+# %% Mangling
+
+
+def _mangle(tokens):
+    """ Rename local variables in functions.
     """
-    code = remove_comments(code)
-    if remove_whitespace:
-        code = remove_all_whitespace(code)
-    else:
-        code = remove_trailing_whitespace(code)
-        code = remove_empty_lines(code)
-        code = tabbify(code)
-    return code
-
-def remove_comments(code):
-    chars = ['\n']
-    class non_local:
-        pass
-    non_local._i = -1
+    # Split punctuation runs into single chars, to make analysis simpler
+    toks = []
+    for kind, text in tokens:
+        if kind == 'punct' and len(text) > 1:
+            toks.extend([('punct', c) for c in text])
+        elif kind != 'comment':
+            toks.append((kind, text))
+    # Get significant tokens, padded so we can look one token around
+    sig = [i for i, t in enumerate(toks) if t[0] != 'ws']
+    kinds = ['punct'] + [toks[i][0] for i in sig] + ['punct']
+    texts = [';'] + [toks[i][1] for i in sig] + [';']
+    # Process functions, outer ones first
+    closing = _get_closing(texts)
+    functions = _get_functions(texts, closing)
+    for start, body_start, end in functions.values():
+        _mangle_function(kinds, texts, closing, functions, start, body_start, end)
+    # Put back into the tokens
+    for j, i in enumerate(sig):
+        toks[i] = kinds[j + 1], texts[j + 1]
+    return toks
+
+
+def _get_closing(texts):
+    # Map the index of each opening bracket to that of its closing bracket
+    closing = {}
+    stack = []
+    for i, text in enumerate(texts):
+        if text in '([{':
+            stack.append(i)
+        elif text in ')]}' and stack:
+            closing[stack.pop()] = i
+    return closing
+
+
+def _get_functions(texts, closing):
+    # Map the index of each "function" keyword to the (start, body_start,
+    # end) indices of the params and body of that function.
+    functions = {}
+    for i, text in enumerate(texts):
+        if text == 'function':
+            j = i + 1
+            while j < len(texts) and texts[j] != '(':
+                j += 1
+            k = closing.get(j, -2) + 1
+            if k < len(texts) and texts[k] == '{' and k in closing:
+                functions[i] = j, k, closing[k]
+    return functions
+
+
+def _mangle_function(kinds, texts, closing, functions, start, body_start, end):
     
-    def read():
-        non_local._i += 1
-        if non_local._i < len(code):
-            return code[non_local._i]
-    def to_end_of_string(c0):
-        chars.append(c0)
-        while True:
-            c = read()
-            if not c:
+    names = set(texts[i] for i in range(start, end + 1) if kinds[i] == 'word')
+    if names.intersection(('eval', 'with', 'class')):
+        return
+    
+    # Collect params
+    declared = {}  # name -> None, like an ordered set
+    for i in range(start + 1, body_start - 1):
+        if kinds[i] == 'word':
+            declared[texts[i]] = None
+        elif texts[i] != ',':
+            return  # default values or destructuring
+    
+    # Walk the body to collect declared names and names that are not safe
+    # to rename (e.g. because they may be used as a label or property)
+    unsafe = set()
+    var_names = set()  # indices of names in var statements
+    nested_end = -1  # end of the nested function that we are in
+    brackets = []
+    for i in range(body_start + 1, end):
+        kind, text = kinds[i], texts[i]
+        if kind == 'template' and '${' in text:
+            return
+        elif kind == 'punct':
+            if text in '([{':
+                brackets.append(text)
+            elif text in ')]}' and brackets:
+                brackets.pop()
+            elif text == '>' and texts[i - 1] == '=':
+                return  # arrow function
+            continue
+        elif kind != 'word':
+            continue
+        prev, nxt = texts[i - 1], texts[i + 1]
+        in_braces = bool(brackets) and brackets[-1] == '{'
+        if text == 'function':
+            if i > nested_end:
+                if kinds[i + 1] == 'word' and prev in (';', '{', '}'):
+                    declared[nxt] = None  # a function declaration
+                if i in functions:
+                    nested_end = functions[i][2]
+        elif text == 'var':
+            for j in _var_names(kinds, texts, i, end):
+                var_names.add(j)
+                if i > nested_end:
+                    declared[texts[j]] = None
+        elif prev == '.' and texts[i - 2] != '.':
+            pass  # property (but not a spread)
+        elif nxt == ':':
+            if not (prev in ('{', ',') or prev in ('?', 'case')):
+                unsafe.add(text)  # could be a label
+        elif prev in ('break', 'continue'):
+            unsafe.add(text)
+        elif in_braces and prev in ('{', ',') and nxt in (',', '}'):
+            if i not in var_names:
+                unsafe.add(text)  # could be a shorthand property
+        elif (nxt == '(' and text not in CONTROL_KEYWORDS and
+                prev not in ('function', '*') and
+                texts[closing.get(i + 1, 0) + 1] == '{'):
+            return  # a method definition
+    
+    # Determine new names, the most used names get the shortest
+    to_rename = [name for name in declared if name not in unsafe and
+                 name not in RESERVED and not name[0].isdigit()]
+    counts = dict((name, 0) for name in to_rename)
+    for i in range(start, end + 1):
+        if texts[i] in counts:
+            counts[texts[i]] += 1
+    to_rename.sort(key=lambda name: -counts[name])
+    new_names = _generate_names(names)
+    mapping = {}
+    for name in to_rename:
+        new_name = next(new_names)
+        if len(new_name) < len(name):
+            mapping[name] = new_name
+    if not mapping:
+        return
+    
+    # Rename
+    for i in range(start, end + 1):
+        if kinds[i] == 'word' and texts[i] in mapping:
+            prev, nxt = texts[i - 1], texts[i + 1]
+            if prev == '.' and texts[i - 2] != '.':
+                continue  # property
+            elif nxt == ':' and prev in ('{', ','):
+                continue  # object key
+            texts[i] = mapping[texts[i]]
+
+
+def _var_names(kinds, texts, i, end):
+    # Get the indices of the names declared by the var statement at index i
+    indices = []
+    depth = 0
+    expect_name = True
+    for j in range(i + 1, end):
+        kind, text = kinds[j], texts[j]
+        if expect_name:
+            if kind != 'word':
                 break
-            chars.append(c)
-            if c == c0 and chars[-2] != '\\':
-                return
-    def to_end_of_line():
-        while True:
-            c = read()
-            if c == '\n' or not c:
+            indices.append(j)
+            expect_name = False
+        elif text in '([{':
+            depth += 1
+        elif text in ')]}':
+            depth -= 1
+            if depth < 0:
                 break
-    def to_end_of_mutiline_comment():
-        lastchar = ''
-        while True:
-            c = read()
-            if not c:
+        elif depth == 0:
+            if text == ',':
+                expect_name = True
+            elif text in (';', 'in', 'of'):
                 break
-            if c == '/' and lastchar == '*':
-                return
-            lastchar = c
-    while True:
-        c = read()
-        if not c:
-            break  # end of code
-        elif c == "'" or c == '"':
-            to_end_of_string(c)
-        elif c == '/' and chars[-1] == '/' and chars[-2] != '\\':
-            chars.pop(-1)
-            to_end_of_line()
-            chars.append('\n')
-        elif c == '*' and chars[-1] == '/':
-            chars.pop(-1)
-            to_end_of_mutiline_comment()
-        else:
-            chars.append(c)
-    chars.pop(0)
-    return ''.join(chars)
-
-def remove_all_whitespace(code):
-    raise RuntimeError('full whitespace removal for minification is currently broken')
-    # todo: this is broken
-    code = code.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
-    space_safe = ' =+-/*&|(){},.><:;'
-    chars = ['\n']
-    class non_local:
-        pass
-    non_local._i = -1
-    
-    def read():
-        non_local._i += 1
-        if non_local._i < len(code):
-            return code[non_local._i]
+            elif kind != 'punct' and (kinds[j - 1] != 'punct' or
+                                      texts[j - 1] in ')]'):
+                break  # a new statement, by automatic semicolon insertion
+    return indices
+
+
+def _generate_names(used):
+    # Generate short names that are not reserved and not in used
+    chars1 = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_$'
+    chars2 = chars1 + '0123456789'
+    names = list(chars1)
     while True:
-        c = read()
-        if not c:
-            break  # end of code
-        if c in ' ':
-            if chars[-1] not in space_safe:
-                chars.append(c)
-        elif c in space_safe and chars[-1] == ' ':
-            chars[-1] = c  # replace last char
-        else:
-            chars.append(c)
-    chars.pop(0)
-    return ''.join(chars)
-    
-def remove_empty_lines(code):
-    return '\n'.join([line for line in code.splitlines() if line])
-
-def remove_trailing_whitespace(code):
-    return '\n'.join([line.rstrip() for line in code.splitlines()])
-
-def tabbify(code):
-    lines = []
-    for line in code.splitlines():
-        line2 = line.lstrip(' \t')
-        indent_str = line[:len(line)-len(line2)]
-        for s1, s2 in [('    ', '\t'), ('  ', '\t'), (' ', '')]:
-            indent_str = indent_str.replace(s1, s2)
-        lines.append(indent_str + line2)
-    return '\n'.join(lines)
+        for name in names:
+            if name not in used and name not in RESERVED:
+                yield name
+        names = [name + c for name in names for c in chars2]
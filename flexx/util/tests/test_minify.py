@@ -0,0 +1,104 @@
+from flexx.util.testing import run_tests_if_main, raises
+
+from flexx.util.minify import minify, tokenize
+from flexx.pyscript import evaljs, py2js
+
+
+def test_tokenize():
+
+    kinds = lambda code: [t[0] for t in tokenize(code) if t[0] != 'ws']
+    
+    assert kinds('a = "x" + 3;') == ['word', 'punct', 'string', 'punct', 'word',
+                                     'punct']
+    assert kinds('a = /x/g') == ['word', 'punct', 'regexp']
+    assert kinds('a = b / c / d') == ['word', 'punct', 'word', 'punct', 'word',
+                                      'punct', 'word']
+    assert kinds('return /x/;') == ['word', 'regexp', 'punct']
+    assert kinds('f(x) / 2') == ['word', 'punct', 'word', 'punct', 'punct', 'word']
+    assert kinds('x++ / 2 / y') == ['word', 'punct', 'punct', 'word', 'punct', 'word']
+    assert kinds('x-- /2/ y') == ['word', 'punct', 'punct', 'word', 'punct', 'word']
+    assert kinds('x = `a ${ {b: "}"}.b } c`') == ['word', 'punct', 'template']
+    assert kinds('// x\n/* y */') == ['comment', 'comment']
+    
+    # Tokens make up the code
+    code = 'var a = [1, 2.5e3, "x\\"y", /[/]/]; // z'
+    assert ''.join(t[1] for t in tokenize(code)) == code
+    
+    with raises(ValueError):
+        tokenize('x = `abc')
+
+
+def test_minify_comments_and_whitespace():
+
+    code = 'var a = "// no comment";  // comment\n\n    b = /* c */ a;\n'
+    assert minify(code) == 'var a = "// no comment";\n\tb =  a;'
+    assert minify(code, True) == 'var a="// no comment";b=a;'
+    
+    # Contents of strings, regexps and templates is untouched
+    code = 'x = "a  b" + \'/*c*/\' + /\\/ +d/.source + `e  ${ f }`'
+    assert minify(code, True) == 'x="a  b"+\'/*c*/\'+/\\/ +d/.source+`e  ${ f }`'
+    
+    # Whitespace that matters
+    assert minify('var x = a + +b - -c', True) == 'var x=a+ +b- -c'
+    assert minify('a = 1 .toString()', True) == 'a=1 .toString()'
+    assert minify('a = b / /c/.x', True) == 'a=b/ /c/.x'
+    assert minify('typeof x === "y"', True) == 'typeof x==="y"'
+    
+    # Newlines that matter, due to automatic semicolon insertion
+    assert minify('a = 1\nb = 2', True) == 'a=1\nb=2'
+    assert minify('a = b\n++c', True) == 'a=b\n++c'
+    assert minify('return\nx', True) == 'return\nx'
+    assert minify('a = /* x\ny */ b', True) == 'a=b'
+    assert minify('a = b /* x\ny */ c', True) == 'a=b\nc'
+    assert minify('a = [1,\n2\n]\n.length', True) == 'a=[1,2].length'
+
+
+def test_minify_mangle():
+
+    code = """
+    function foo(alpha, beta) {
+        var gamma = alpha + beta, delta = {alpha: gamma, beta: 2};
+        function bar(x) { return x.alpha + delta.beta; }
+        return bar(delta) + (Math.gamma || 3);
+    }
+    """
+    js = minify(code, True, True)
+    assert js.startswith('function foo(')
+    for name in ('alpha', 'beta', 'gamma', 'delta', 'bar'):
+        assert name + ',' not in js and name + ')' not in js
+    assert '.alpha' in js and 'alpha:' in js and 'Math.gamma' in js
+    assert evaljs(js + 'foo(1, 2)') == evaljs(code + 'foo(1, 2)') == '8'
+    
+    # Functions that could see locals in a way that we cannot track are
+    # left alone, but other functions are not
+    for pre in ('eval("x")', 'with (y) {}', 'var f = () => x', 'var t = `${x}`'):
+        code = 'function foo(xx) {%s; var yy = xx; return yy;}' % pre
+        assert 'xx' in minify(code, True, True)
+        count = minify(code, True, True).count('xx')
+        code += 'function bar(xx) {return xx;}'
+        assert minify(code, True, True).count('xx') == count
+    
+    # A slash after a postfix ++ is a division, so names after it are renamed
+    code = ('function foo(longname, other) {var x = longname++ / 2 + other / 3;'
+            ' return x;}')
+    js = minify(code, True, True)
+    assert 'longname' not in js and 'other' not in js
+    assert evaljs(js + 'foo(4, 6)') == evaljs(code + 'foo(4, 6)') == '4'
+    
+    # Labels and method definitions
+    code = 'function foo(xx) {xx: for (;;) {break xx;}}'
+    assert minify(code, True, True).count('xx') == 3
+    code = 'function foo(xx) {var yy = {get zz() {var xx = 3;}}; return xx}'
+    assert minify(code, True, True).count('xx') == 3
+    code = 'function foo(xx, yy) {return {xx, yy: yy};}'
+    assert minify(code, True, True).count('xx') == 2
+    
+    # Transpiled code still works
+    code = py2js('def foo(n):\n  total = 0\n  for i in range(n):\n'
+                 '    total += len([j for j in range(i)])\n  return total\n')
+    js = minify(code, True, True)
+    assert len(js) < len(minify(code, True)) < len(code)
+    assert evaljs(js + 'foo(5)') == evaljs(code + 'foo(5)') == '10'
+
+
+run_tests_if_main()